@@ -10,7 +10,17 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Nothing here is used at runtime; left out to shrink the bundle and what
+    # the app has to unpack and scan at launch. numpy.testing (and with it
+    # unittest) is only pulled in by numpy's hooks.
+    excludes=[
+        'benchmark', 'synthetic_corpus',
+        'numpy.testing', 'numpy.f2py', 'numpy.distutils', 'unittest', 'doctest', 'pydoc', 'pdb',
+        'lib2to3', 'distutils', 'setuptools', 'pkg_resources',
+        'IPython', 'matplotlib', 'scipy', 'pandas',
+        'PIL.ImageQt', 'PyQt5', 'PyQt6', 'PySide2', 'PySide6',
+        'tkinter.test', 'test',
+    ],
     noarchive=False,
     optimize=0,
 )
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import PIL
+
+from scan_cache import CACHE_DIR
+from synthetic_corpus import load_corpus, parse_size, DEFAULT_SIZE
+from thumbnail_cache import make_thumbnail
+from sheet_music_classifier import is_sheet_music
+from compiler_core import (find_image_files, get_image_date, compile_folder, update_compilation, OUTPUT_BUILDERS,
+                           DEFAULT_DPI)
+from decode_manager import open_image
+from page_optimizer import normalize_mode, resample_to_dpi
+from binarization import binarize_page
+
+# Generated once and reused while the corpus settings stay the same
+CORPUS_DIR = os.path.join(CACHE_DIR, "benchmark_corpus")
+CORPUS_COUNT = 60
+
+# Each benchmark runs this many times and the fastest run counts, which
+# filters out most scheduling noise
+REPEATS = 3
+
+# A benchmark regresses when it is this much slower than the baseline
+# (0.25 = 25% slower)
+DEFAULT_THRESHOLD = 0.25
+
+# Slowdowns smaller than this never count; sub-millisecond timings (the
+# directory listing, header reads) jitter by more than the threshold
+MIN_REGRESSION_SECONDS = 0.005
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+BENCHMARK_NAMES = ('find_image_files', 'get_image_date', 'is_sheet_music', 'make_thumbnail',
+                   'binarize', 'compile_docx', 'compile_pdf', 'append_docx')
+
+def _best_time(func, repeats):
+    """(fastest time, what the last run returned) of repeats runs of func"""
+    best = result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _compile(output_format, image_data, workers):
+    """What compile_from_preview runs on its worker thread, minus the GUI"""
+    def run():
+        with tempfile.TemporaryDirectory() as work_dir:
+            output_path = os.path.join(work_dir, f"benchmark.{output_format}")
+            OUTPUT_BUILDERS[output_format](image_data, output_path, workers=workers)
+            return {'output_bytes': os.path.getsize(output_path)}
+    return run
+
+def _output_pages(image_paths):
+    """The pages as the binarize stage sees them: flattened and downsampled to the default dpi"""
+    pages = []
+    for image_path in image_paths:
+        with open_image(image_path) as image:
+            pages.append(resample_to_dpi(normalize_mode(image), DEFAULT_DPI))
+    return pages
+
+def _binarize_case(image_paths):
+    """
+    The binarize benchmark: (func, items, pixels) over the pages decoded
+    and downsampled up front, so only the binarization itself is timed
+    """
+    pages = _output_pages(image_paths)
+    return (lambda: [binarize_page(page) for page in pages], len(pages),
+            sum(page.width * page.height for page in pages))
+
+def _append(image_data, workers):
+    """
+    What watch does when screenshots arrive: compile the first half of the
+    pages, add the rest to the folder and append them with
+    update_compilation. Raises if they do not end up in the same document.
+    """
+    image_paths = [image_path for _, image_path in image_data]
+    half = len(image_paths) // 2
+
+    def run():
+        with tempfile.TemporaryDirectory() as work_dir:
+            source = os.path.join(work_dir, "source")
+            output = os.path.join(work_dir, "output")
+            os.makedirs(source)
+            for image_path in image_paths[:half]:
+                shutil.copy2(image_path, source)
+            first_path, _, _, _ = compile_folder(source, output, workers=workers, keep_duplicates=True)
+            for image_path in image_paths[half:]:
+                shutil.copy2(image_path, source)
+            output_path, added, _ = update_compilation(source, output, workers=workers, keep_duplicates=True)
+            if output_path != first_path or added != len(image_paths) - half:
+                raise RuntimeError(f"update_compilation appended {added} of {len(image_paths) - half} pages "
+                                   f"to {output_path} instead of {first_path}")
+            return {'output_bytes': os.path.getsize(output_path)}
+    return run
+
+def benchmark_cases(corpus_dir, images, workers=None, only=None):
+    """
+    Return {name: (func, items, pixels)} for everything that is timed (or
+    just the benchmarks named in only): the functions run once per image
+    are given the whole corpus, the compile, append and binarize benchmarks
+    the sheet music pages in capture order. pixels is the number of pixels
+    processed where throughput is reported in megapixels/s, otherwise None.
+    func may return a dict of results to record next to its time: the
+    compile and append benchmarks report the size of the document they
+    wrote as output_bytes.
+    """
+    image_paths = [image_path for image_path, _ in images]
+    sheets = [(get_image_date(image_path), image_path) for image_path, kind in images if kind == 'sheet']
+    cases = {
+        'find_image_files': (lambda: find_image_files(corpus_dir), len(image_paths), None),
+        'get_image_date': (lambda: [get_image_date(image_path) for image_path in image_paths], len(image_paths),
+                           None),
+        'is_sheet_music': (lambda: [is_sheet_music(image_path) for image_path in image_paths], len(image_paths),
+                           None),
+        'make_thumbnail': (lambda: [make_thumbnail(image_path) for image_path in image_paths], len(image_paths),
+                           None),
+        'compile_docx': (_compile('docx', sheets, workers), len(sheets), None),
+        'compile_pdf': (_compile('pdf', sheets, workers), len(sheets), None),
+        'append_docx': (_append(sheets, workers), len(sheets), None),
+    }
+    if not only or 'binarize' in only:
+        # Decoding the pages takes a while and holds them all in memory; only when needed
+        cases['binarize'] = _binarize_case([image_path for _, image_path in sheets])
+    return {name: cases[name] for name in BENCHMARK_NAMES
+            if name in cases and (not only or name in only)}
+
+def run_benchmarks(corpus_dir=CORPUS_DIR, count=CORPUS_COUNT, size=DEFAULT_SIZE, repeats=REPEATS,
+                   workers=None, only=None, progress=None):
+    """
+    Time every benchmark (or those named in only) on the synthetic corpus
+    in corpus_dir, generating it first if needed. progress, if given, is
+    called with each benchmark's name before it runs.
+    Returns the results as a JSON-serializable dict.
+    """
+    images = load_corpus(corpus_dir, count, size)
+    results = {}
+    for name, (func, items, pixels) in benchmark_cases(corpus_dir, images, workers, only).items():
+        if progress:
+            progress(name)
+        seconds, extra = _best_time(func, repeats)
+        results[name] = {'seconds': round(seconds, 6), 'items': items,
+                         'ms_per_item': round(1000 * seconds / max(items, 1), 3)}
+        if isinstance(extra, dict):
+            results[name].update(extra)
+        if pixels is not None:
+            results[name]['megapixels_per_second'] = round(pixels / 1e6 / seconds, 2) if seconds > 0 else None
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'corpus': {'count': count, 'size': list(size)},
+        'repeats': repeats,
+        'workers': workers,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count(), 'pillow': PIL.__version__, 'numpy': np.__version__},
+        'results': results,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two run_benchmarks results. Returns (name, baseline_seconds,
+    current_seconds, ratio, regressed) for every benchmark in both; ratio
+    is current / baseline time, and regressed means it exceeds 1 + threshold
+    and the benchmark got at least MIN_REGRESSION_SECONDS slower.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['seconds']
+        after = result['seconds']
+        ratio = after / before if before > 0 else 1.0
+        rows.append((name, before, after, ratio,
+                     ratio > 1 + threshold and after - before >= MIN_REGRESSION_SECONDS))
+    return rows
+
+def compare_sizes(current, baseline):
+    """
+    (name, baseline_bytes, current_bytes, ratio) for every benchmark that
+    recorded output_bytes in both results; the inputs are the same corpus,
+    so a change comes from the writer or the page preparation
+    """
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name, {}).get('output_bytes')
+        after = result.get('output_bytes')
+        if before is None or after is None:
+            continue
+        rows.append((name, before, after, after / before if before > 0 else 1.0))
+    return rows
+
+def _save(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark",
+                                     description="Time scanning, classification, thumbnails, binarization and compiling "
+                                                 "on a synthetic corpus and compare against a baseline")
+    parser.add_argument("--corpus", default=CORPUS_DIR,
+                        help=f"folder for the generated corpus (default: {CORPUS_DIR})")
+    parser.add_argument("-n", "--count", type=int, default=CORPUS_COUNT,
+                        help=f"number of images in the corpus (default: {CORPUS_COUNT})")
+    parser.add_argument("--size", type=parse_size, default=DEFAULT_SIZE,
+                        help="page size as WIDTHxHEIGHT (default: %dx%d)" % DEFAULT_SIZE)
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help=f"runs per benchmark, the fastest counts (default: {REPEATS})")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes for compiling (default: one per core)")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARK_NAMES, metavar="NAME",
+                        help=f"run only these benchmarks ({', '.join(BENCHMARK_NAMES)})")
+    parser.add_argument("-o", "--output", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help=f"baseline results to compare against (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed slowdown before failing, as a fraction (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.corpus, args.count, args.size, args.repeats, args.workers, args.only,
+                             progress=lambda name: print(f"Running {name}...", file=sys.stderr))
+    for name, result in results['results'].items():
+        rate = f", {result['megapixels_per_second']:.1f} MP/s" if result.get('megapixels_per_second') else ""
+        size = f", {result['output_bytes'] / 1024:.1f} KB" if 'output_bytes' in result else ""
+        print(f"{name:18} {result['seconds']:9.4f}s  {result['ms_per_item']:9.2f} ms/item  "
+              f"({result['items']} items{rate}{size})")
+    if args.output:
+        _save(results, args.output)
+
+    if args.update_baseline:
+        _save(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    if baseline.get('corpus') != results['corpus']:
+        print(f"Baseline corpus {baseline.get('corpus')} differs from this run's {results['corpus']}; "
+              "not comparing", file=sys.stderr)
+        return 2
+
+    rows = compare(results, baseline, args.threshold)
+    print(f"\nCompared with {args.baseline} (threshold +{args.threshold:.0%}):")
+    for name, before, after, ratio, regressed in rows:
+        print(f"{name:18} {before:9.4f}s -> {after:9.4f}s  {ratio - 1:+7.1%}{'  REGRESSION' if regressed else ''}")
+    size_rows = compare_sizes(results, baseline)
+    if size_rows:
+        print("\nOutput size:")
+    for name, before, after, ratio in size_rows:
+        print(f"{name:18} {before / 1024:9.1f} KB -> {after / 1024:9.1f} KB  {ratio - 1:+7.1%}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import numpy as np
+from PIL import Image
+
+from compiler_core import BINARIZE_METHODS as METHODS, DEFAULT_BINARIZE_METHOD as DEFAULT_METHOD
+
+# Sauvola's sensitivity to local contrast and the dynamic range of the
+# standard deviation for 8-bit pages; the higher k keeps the gray-paper
+# noise and antialiasing fringe out of the ink on photographed pages
+SAUVOLA_K = 0.34
+SAUVOLA_R = 128.0
+
+# The local window is this fraction of the page width (about 0.19" at the
+# 7.5" print width), a few staff spaces: wider than noteheads and beams,
+# narrower than the shading of a photographed page
+WINDOW_FRACTION = 1 / 40
+MIN_WINDOW = 15
+
+# Largest window whose sum of squared 8-bit values fits in 32 bits, which
+# the integral images are computed in
+MAX_WINDOW = 255
+
+def window_for(width):
+    """Odd Sauvola window size for a page width in pixels"""
+    window = max(MIN_WINDOW, int(width * WINDOW_FRACTION))
+    return min(MAX_WINDOW, window | 1)
+
+def otsu_thresholds(gray):
+    """
+    Otsu's threshold of every page in gray (an (..., height, width) uint8
+    array): the level that best separates the histogram into ink and
+    paper. Returns an array with the leading shape of gray.
+    """
+    pages = gray.reshape(-1, gray.shape[-2] * gray.shape[-1])
+    # One bincount for the whole batch: page i's histogram occupies bins i*256..i*256+255
+    offsets = (np.arange(len(pages), dtype=np.intp) * 256)[:, None]
+    histograms = np.bincount((pages + offsets).ravel(), minlength=len(pages) * 256)
+    histograms = histograms.reshape(len(pages), 256).astype(np.float64)
+
+    levels = np.arange(256, dtype=np.float64)
+    weight = np.cumsum(histograms, axis=1)  # Pixels at or below each level
+    total = weight[:, -1:]
+    mass = np.cumsum(histograms * levels, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Between-class variance (up to a constant factor) for each split
+        variance = (mass[:, -1:] * weight / total - mass) ** 2 / (weight * (total - weight))
+    variance = np.nan_to_num(variance, nan=0.0, posinf=0.0)
+    return variance.argmax(axis=1).reshape(gray.shape[:-2])
+
+def _box_means(values, window):
+    """
+    Mean of values (uint32) over a window x window box around each pixel
+    (clipped at the page edges), for every page at once, from an integral
+    image: four lookups per pixel whatever the window size. The integral
+    is kept in uint32 and allowed to wrap around; a box's sum is still
+    exact because it is below 2**32 (see MAX_WINDOW).
+    """
+    height, width = values.shape[-2:]
+    integral = np.zeros(values.shape[:-2] + (height + 1, width + 1), dtype=np.uint32)
+    np.cumsum(values, axis=-2, dtype=np.uint32, out=integral[..., 1:, 1:])
+    np.cumsum(integral[..., 1:, 1:], axis=-1, dtype=np.uint32, out=integral[..., 1:, 1:])
+
+    half = window // 2
+    rows = np.arange(height)
+    top, bottom = np.clip(rows - half, 0, height), np.clip(rows + half + 1, 0, height)
+    cols = np.arange(width)
+    left, right = np.clip(cols - half, 0, width), np.clip(cols + half + 1, 0, width)
+
+    strips = np.take(integral, bottom, axis=-2) - np.take(integral, top, axis=-2)
+    del integral
+    means = (np.take(strips, right, axis=-1) - np.take(strips, left, axis=-1)).astype(np.float32)
+    # Dividing by the box area, rows and columns separately (the area is their product)
+    means *= (1 / (bottom - top)).astype(np.float32)[:, None]
+    means *= (1 / (right - left)).astype(np.float32)
+    return means
+
+def sauvola_thresholds(gray, window=None, k=SAUVOLA_K, r=SAUVOLA_R):
+    """
+    Per-pixel Sauvola thresholds mean * (1 + k * (std / r - 1)) of gray, an
+    (..., height, width) uint8 array, with the local mean and standard
+    deviation taken over window x window boxes. On plain paper the
+    threshold sits just below the local background, so shading and gray
+    paper drop out while strokes stay dark.
+    """
+    window = min(MAX_WINDOW, window or window_for(gray.shape[-1]))
+    values = gray.astype(np.uint32)
+    mean = _box_means(values, window)
+    np.square(values, out=values)
+    variance = _box_means(values, window)
+    del values
+    variance -= np.square(mean)
+    np.maximum(variance, 0, out=variance)
+    thresholds = np.sqrt(variance, out=variance)
+    # mean * (1 + k * (std / r - 1)), in place
+    thresholds *= k / r
+    thresholds += 1 - k
+    thresholds *= mean
+    return thresholds
+
+def ink_masks(gray, method=DEFAULT_METHOD):
+    """
+    True where gray, an (..., height, width) uint8 array of one or more
+    pages, is ink, thresholded with method (see METHODS)
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown binarization method: {method} (expected one of {', '.join(METHODS)})")
+    if method == 'otsu':
+        return gray <= otsu_thresholds(gray)[..., None, None]
+    return gray <= sauvola_thresholds(gray)
+
+def binarize_page(image, method=DEFAULT_METHOD):
+    """A mode '1' copy of image: black ink on white paper, see ink_masks"""
+    gray = np.asarray(image if image.mode == 'L' else image.convert('L'))
+    return Image.fromarray(~ink_masks(gray, method))
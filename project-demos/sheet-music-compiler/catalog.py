@@ -0,0 +1,325 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import namedtuple, OrderedDict
+from datetime import datetime, timedelta
+
+from page_source import source_path
+from scan_cache import CACHE_DIR, ScanCache
+import tracing
+
+# Rows fetched per query while paging through a date range
+PAGE_SIZE = 200
+
+# Pages of rows kept in memory per CatalogRange; the grid shows a few dozen
+# screenshots at a time
+PAGES_IN_MEMORY = 8
+
+CatalogEntry = namedtuple("CatalogEntry", ["date_time", "path", "width", "height", "score", "dhash"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    date_time TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    score REAL,
+    dhash TEXT
+);
+CREATE INDEX IF NOT EXISTS images_by_time ON images (date_time, path);
+CREATE INDEX IF NOT EXISTS images_by_root ON images (root);
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    indexed_at REAL
+);
+"""
+
+def _entry(row):
+    date_time, path, width, height, score, dhash = row
+    return CatalogEntry(datetime.fromisoformat(date_time), path, width, height, score,
+                        None if dhash is None else int(dhash, 16))
+
+def _range_clause(start, end):
+    """WHERE clause and parameters for start <= date_time < end (either may be None)"""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("date_time >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append("date_time < ?")
+        params.append(end.isoformat())
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+class Catalog:
+    """
+    Persistent index of the screenshots in any number of source folders
+    (searched recursively): capture date, pixel size, sheet-music score and
+    perceptual hash of every image, ordered by capture time. Unlike
+    ScanCache, entries stay until their file is deleted, so a date range
+    of a years-long archive can be listed without touching the files.
+    """
+    def __init__(self, db_path=None):
+        if db_path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            db_path = os.path.join(CACHE_DIR, "catalog.sqlite3")
+        self.db_path = db_path
+        # Indexing runs on a worker thread while the grid's thumbnail threads page through results
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.snapshot_ids = itertools.count(1)
+        # Snapshots of ranges that were garbage collected; their tables are
+        # dropped by the next snapshot(), which holds the lock
+        self.stale_snapshots = []
+
+    def roots(self):
+        """The source folders in the catalog"""
+        with self.lock:
+            return [path for (path,) in self.conn.execute("SELECT path FROM roots ORDER BY path")]
+
+    def add_root(self, folder):
+        """Add a source folder; its images are listed by the next index()"""
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO roots (path, indexed_at) VALUES (?, NULL)",
+                              (os.path.abspath(folder),))
+            self.conn.commit()
+
+    def remove_root(self, folder):
+        """Drop a source folder and its images from the catalog"""
+        folder = os.path.abspath(folder)
+        with self.lock:
+            self.conn.execute("DELETE FROM images WHERE root = ?", (folder,))
+            self.conn.execute("DELETE FROM roots WHERE path = ?", (folder,))
+            self.conn.commit()
+
+    @tracing.traced
+    def index(self, folders=None, cache=None, workers=None, progress=None):
+        """
+        Bring the catalog up to date with folders (default: every root),
+        adding them as roots. Only new and changed files (by size and
+        mtime) are read and analyzed, with the ScanCache if given; entries of
+        deleted files are removed.
+        progress, if given, is called with (done, total, description).
+        Returns (images_updated, images_removed).
+        """
+        from compiler_core import find_image_entries, scan_image_infos, analyze_screenshots
+
+        folders = [os.path.abspath(folder) for folder in (folders or self.roots())]
+        updated = removed = 0
+        for folder in folders:
+            self.add_root(folder)
+            if not os.path.isdir(folder):
+                # Unplugged drive or moved folder: keep its entries until it is removed
+                continue
+            entries = [(os.path.abspath(image_path), stat_result)
+                       for image_path, stat_result in find_image_entries(folder, recursive=True)]
+            # Every entry under the folder, whichever root it was indexed with:
+            # a file in overlapping roots is only reread when it changes
+            with self.lock:
+                known = {path: (size, mtime_ns, root) for path, size, mtime_ns, root in self.conn.execute(
+                    "SELECT path, size, mtime_ns, root FROM images WHERE path >= ? AND path < ?",
+                    (folder + os.sep, folder + chr(ord(os.sep) + 1)))}
+            changed = [(image_path, stat_result) for image_path, stat_result in entries
+                       if known.get(image_path, ())[:2] != (stat_result.st_size, stat_result.st_mtime_ns)]
+            listed = {image_path for image_path, _ in entries}
+            # Entries of another root that this one does not list (e.g. in a hidden
+            # folder it skips) are left to that root unless their file is gone
+            deleted = [(path,) for path, (_, _, root) in known.items() if path not in listed
+                       and (root == folder or not os.path.exists(source_path(path)))]
+
+            def report(stage):
+                if progress is None:
+                    return None
+                name = os.path.basename(folder)
+                return lambda done, total: progress(done, total,
+                                                    f"Indexing {name}: {stage} ({done} of {total})...")
+            infos = scan_image_infos(changed, cache=cache, prune=False, progress=report("reading dates"))
+            analyses = analyze_screenshots([image_path for image_path, _, _, _ in infos], cache=cache,
+                                           workers=workers, progress=report("analyzing"))
+            stats = dict(changed)
+            rows = []
+            for image_path, date_time, width, height in infos:
+                score, dhash = analyses[image_path]
+                # Hashes are wider than SQLite integers, so they are stored as hex
+                rows.append((image_path, folder, stats[image_path].st_size, stats[image_path].st_mtime_ns,
+                             date_time.isoformat(), width, height, score,
+                             None if dhash is None else format(dhash, 'x')))
+            with self.lock:
+                self.conn.executemany(
+                    "INSERT INTO images (path, root, size, mtime_ns, date_time, width, height, score, dhash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET size = excluded.size, "
+                    "mtime_ns = excluded.mtime_ns, date_time = excluded.date_time, width = excluded.width, "
+                    "height = excluded.height, score = excluded.score, dhash = excluded.dhash", rows)
+                self.conn.executemany("DELETE FROM images WHERE path = ?", deleted)
+                self.conn.execute("UPDATE roots SET indexed_at = ? WHERE path = ?", (time.time(), folder))
+                self.conn.commit()
+            updated += len(rows)
+            removed += len(deleted)
+        return updated, removed
+
+    def count(self, start=None, end=None):
+        """Number of images captured in [start, end)"""
+        where, params = _range_clause(start, end)
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM images" + where, params).fetchone()[0]
+
+    def snapshot(self, start=None, end=None):
+        """
+        Copy the entries of [start, end) in capture order into a temporary
+        table, unaffected by later indexing, whose row ids are their
+        positions (from 1). Returns (table name, number of entries).
+        """
+        with self.lock:
+            while self.stale_snapshots:
+                self.conn.execute(f"DROP TABLE IF EXISTS temp.{self.stale_snapshots.pop()}")
+            name = f"range_{next(self.snapshot_ids)}"
+            where, params = _range_clause(start, end)
+            self.conn.execute(f"CREATE TEMP TABLE {name} (date_time TEXT, path TEXT, width INTEGER, "
+                              "height INTEGER, score REAL, dhash TEXT)")
+            length = self.conn.execute(
+                f"INSERT INTO temp.{name} SELECT date_time, path, width, height, score, dhash FROM images"
+                + where + " ORDER BY date_time, path", params).rowcount
+            self.conn.commit()
+        return name, length
+
+    def snapshot_page(self, name, offset=0, limit=PAGE_SIZE):
+        """CatalogEntry rows offset..offset+limit of a snapshot"""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT date_time, path, width, height, score, dhash FROM temp.{name} "
+                "WHERE rowid > ? AND rowid <= ? ORDER BY rowid", (offset, offset + limit)).fetchall()
+        return [_entry(row) for row in rows]
+
+    def snapshot_analyses(self, name):
+        """(score, dhash) of every entry of a snapshot in order, without the paths"""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT score, dhash FROM temp.{name} ORDER BY rowid").fetchall()
+        return [(score, None if dhash is None else int(dhash, 16)) for score, dhash in rows]
+
+    def date_bounds(self):
+        """(first, last) capture time in the catalog, or (None, None) when it is empty"""
+        with self.lock:
+            first, last = self.conn.execute("SELECT MIN(date_time), MAX(date_time) FROM images").fetchone()
+        if first is None:
+            return None, None
+        return datetime.fromisoformat(first), datetime.fromisoformat(last)
+
+    def close(self):
+        self.conn.close()
+
+class CatalogRange:
+    """
+    The (date_time, image_path) pairs of one date range as a read-only
+    sequence, for the selection grid: rows are fetched from the catalog a
+    page at a time as they are indexed, and only the most recently used
+    pages are kept. The range is a snapshot taken when it is created
+    (see Catalog.snapshot): images indexed, changed or deleted later do
+    not move its indices, so a selection made in the grid still refers to
+    the pages it showed.
+    """
+    def __init__(self, catalog, start=None, end=None, page_size=PAGE_SIZE, pages_in_memory=PAGES_IN_MEMORY):
+        self.catalog = catalog
+        self.start = start
+        self.end = end
+        self.page_size = page_size
+        self.pages_in_memory = pages_in_memory
+        self.pages = OrderedDict()  # page number -> list of CatalogEntry
+        self.lock = threading.Lock()
+        self.table, self.length = catalog.snapshot(start, end)
+        weakref.finalize(self, catalog.stale_snapshots.append, self.table)
+
+    def __len__(self):
+        return self.length
+
+    def entry(self, index):
+        """The CatalogEntry at index"""
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("catalog range index out of range")
+        number, offset = divmod(index, self.page_size)
+        with self.lock:
+            page = self.pages.get(number)
+            if page is not None:
+                self.pages.move_to_end(number)
+        if page is None:
+            page = self.catalog.snapshot_page(self.table, number * self.page_size, self.page_size)
+            with self.lock:
+                self.pages[number] = page
+                while len(self.pages) > self.pages_in_memory:
+                    self.pages.popitem(last=False)
+        return page[offset]
+
+    def __getitem__(self, index):
+        entry = self.entry(index)
+        return entry.date_time, entry.path
+
+    def __iter__(self):
+        for offset in range(0, self.length, self.page_size):
+            for entry in self.catalog.snapshot_page(self.table, offset, self.page_size):
+                yield entry.date_time, entry.path
+
+    def analyses(self):
+        """(score, dhash) of every image in the range, in order"""
+        return self.catalog.snapshot_analyses(self.table)
+
+def parse_date(text):
+    """A YYYY-MM-DD (or YYYY-MM-DD HH:MM) date, for date range options"""
+    return datetime.fromisoformat(text.strip())
+
+def date_range(first_day=None, last_day=None):
+    """[start, end) covering the days first_day..last_day inclusive (either may be None)"""
+    start = datetime.combine(first_day, datetime.min.time()) if first_day else None
+    end = datetime.combine(last_day, datetime.min.time()) + timedelta(days=1) if last_day else None
+    return start, end
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="catalog", description="Index screenshot folders and list them by date")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index_parser = subparsers.add_parser("index", help="add folders (searched recursively) and update the catalog")
+    index_parser.add_argument("folders", nargs="*", help="folders to add (default: the folders already indexed)")
+    index_parser.add_argument("-j", "--workers", type=int, default=None,
+                              help="worker processes for analysis (default: one per core)")
+    list_parser = subparsers.add_parser("list", help="list the images captured in a date range")
+    list_parser.add_argument("--from", dest="first_day", type=parse_date, help="first day (YYYY-MM-DD)")
+    list_parser.add_argument("--to", dest="last_day", type=parse_date, help="last day (YYYY-MM-DD), included")
+    list_parser.add_argument("--limit", type=int, default=None, help="list at most this many images")
+    parser.add_argument("--db", help="catalog database (default: ~/.sheet_music_compiler/catalog.sqlite3)")
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(args.db)
+    try:
+        if args.command == "index":
+            cache = ScanCache()
+            try:
+                start = time.perf_counter()
+                updated, removed = catalog.index(args.folders, cache=cache, workers=args.workers)
+            finally:
+                cache.close()
+            print(f"Indexed {len(catalog.roots())} folder(s) in {time.perf_counter() - start:.2f}s: "
+                  f"{updated} images added or updated, {removed} removed, {catalog.count()} in total")
+        else:
+            images = CatalogRange(catalog, *date_range(args.first_day and args.first_day.date(),
+                                                       args.last_day and args.last_day.date()))
+            limit = len(images) if args.limit is None else min(args.limit, len(images))
+            for i in range(limit):
+                entry = images.entry(i)
+                score = "-" if entry.score is None else f"{entry.score:.2f}"
+                print(f"{entry.date_time:%Y-%m-%d %H:%M:%S}  {entry.width}x{entry.height}  {score:>4}  {entry.path}")
+            print(f"{len(images)} images", file=sys.stderr)
+    finally:
+        catalog.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
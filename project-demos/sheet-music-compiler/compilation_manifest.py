@@ -0,0 +1,94 @@
+import json
+import os
+
+# Written next to each compiled document: Sheet_Music_Compilation_X.docx.manifest.json
+MANIFEST_SUFFIX = '.manifest.json'
+
+class CompilationManifest:
+    """
+    Record of the source files a compiled document was built from, so new
+    screenshots can be appended to it later without reprocessing the ones
+    it already has. Each file is keyed by absolute path with its size and
+    mtime (to spot changed files), its perceptual hash (to skip repeats of
+    included pages) and whether it was included as a page.
+    """
+    def __init__(self, document_path, source_folder, page_count=0, files=None):
+        self.document_path = os.path.abspath(document_path)
+        self.source_folder = os.path.abspath(source_folder)
+        self.page_count = page_count
+        self.files = files or {}
+
+    @property
+    def path(self):
+        return self.document_path + MANIFEST_SUFFIX
+
+    @property
+    def output_format(self):
+        return os.path.splitext(self.document_path)[1].lstrip('.').lower()
+
+    @classmethod
+    def load(cls, document_path):
+        """Read the manifest of document_path, or None if it has none (or it is unreadable)"""
+        try:
+            with open(document_path + MANIFEST_SUFFIX, encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(document_path, data['source_folder'], data['page_count'], data['files'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self):
+        """Write the manifest atomically"""
+        partial_path = self.path + '.partial'
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump({'source_folder': self.source_folder, 'page_count': self.page_count,
+                       'files': self.files}, f)
+        os.replace(partial_path, self.path)
+
+    def is_current(self, image_path, stat_result):
+        """True if image_path was already processed and has not changed since"""
+        record = self.files.get(image_path)
+        return (record is not None and record['size'] == stat_result.st_size
+                and record['mtime_ns'] == stat_result.st_mtime_ns)
+
+    def record(self, image_path, stat_result, dhash=None, included=True):
+        self.files[image_path] = {'size': stat_result.st_size, 'mtime_ns': stat_result.st_mtime_ns,
+                                  'dhash': None if dhash is None else format(dhash, 'x'),
+                                  'included': included}
+
+    def unhashed_pages(self):
+        """Included files recorded without a hash (by compilations that skipped the analysis)"""
+        return [image_path for image_path, record in self.files.items()
+                if record['included'] and not record['dhash']]
+
+    def set_hash(self, image_path, dhash):
+        if dhash is not None:
+            self.files[image_path]['dhash'] = format(dhash, 'x')
+
+    def included_hashes(self):
+        """Perceptual hashes of the pages already in the document"""
+        return [int(record['dhash'], 16) for record in self.files.values()
+                if record['included'] and record['dhash']]
+
+def latest_compilation(output_folder, source_folder, output_format):
+    """
+    The manifest of the most recently written document in output_folder
+    that was compiled from source_folder in output_format, or None.
+    """
+    source_folder = os.path.abspath(source_folder)
+    candidates = []
+    try:
+        with os.scandir(output_folder) as it:
+            for entry in it:
+                if entry.name.endswith(MANIFEST_SUFFIX):
+                    document_path = entry.path[:-len(MANIFEST_SUFFIX)]
+                    if os.path.exists(document_path):
+                        candidates.append((os.path.getmtime(document_path), document_path))
+    except FileNotFoundError:
+        return None
+
+    for _, document_path in sorted(candidates, reverse=True):
+        manifest = CompilationManifest.load(document_path)
+        if (manifest is not None and manifest.source_folder == source_folder
+                and manifest.output_format == output_format):
+            return manifest
+    return None
@@ -0,0 +1,699 @@
+import os
+import sys
+import time
+import argparse
+import struct
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from scan_cache import ScanCache
+from image_header import read_header
+from compilation_manifest import CompilationManifest, latest_compilation
+from sessions import SESSION_GAP, find_sessions
+import page_source
+import tracing
+
+# Everything here works without a display. numpy, Pillow and python-docx are
+# only imported inside the functions that need them, so importing this
+# module (and with it, starting the app) does not pay for them.
+
+# Default print resolution; sheet music stays crisp at 200 dpi. Defined here
+# rather than in page_optimizer so the CLI defaults do not import numpy
+DEFAULT_DPI = 200
+
+# Ways pages can be binarized (see binarization); named here for the same
+# reason. sauvola thresholds each pixel against its surroundings, otsu uses
+# one threshold per page
+BINARIZE_METHODS = ('sauvola', 'otsu')
+DEFAULT_BINARIZE_METHOD = 'sauvola'
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.gif'}
+
+# Files listed as sources: images plus documents whose pages are images
+SOURCE_EXTENSIONS = IMAGE_EXTENSIONS | page_source.PDF_EXTENSIONS
+
+# Header reads are I/O bound (and slow on network drives), so use plenty of threads
+SCAN_THREADS = min(32, (os.cpu_count() or 1) * 4)
+
+@tracing.traced
+def find_image_entries(folder, recursive=False):
+    """
+    List the image files in folder with a single directory pass.
+    Returns (image_path, stat_result) pairs; extensions match case-insensitively.
+    Multi-page TIFFs and PDFs are listed as one page reference per page
+    (see page_source); only their page directories are read, no page is
+    decoded. With recursive, subfolders are listed too (hidden folders and
+    symlinked folders are skipped).
+    """
+    entries = []
+    folders = [folder]
+    while folders:
+        with os.scandir(folders.pop()) as it:
+            for entry in it:
+                try:
+                    if recursive and entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            folders.append(entry.path)
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in SOURCE_EXTENSIONS:
+                        continue
+                    if entry.is_file():
+                        entries.extend(page_source.expand_entry(entry.path, entry.stat()))
+                except OSError:
+                    # Vanished or unreadable between listing and stat
+                    continue
+    tracing.count("files_listed", len(entries))
+    return entries
+
+def find_image_files(folder):
+    """Find all image files in the specified folder"""
+    return [image_path for image_path, _ in find_image_entries(folder)]
+
+def read_image_info(image_path, stat_result=None):
+    """
+    Return (date_time, width, height) from the image header (EXIF
+    DateTimeOriginal/DateTime) or the file modification time.
+    Pixel data is never decoded. Pages of a multi-page file share its date
+    and have their own size.
+    """
+    width = height = None
+    path = page_source.source_path(image_path)
+    try:
+        if page_source.is_page_ref(image_path):
+            width, height = page_source.image_size(image_path)
+        if not page_source.is_pdf(path):
+            header_width, header_height, exif_date = read_header(path)
+            width, height = width or header_width, height or header_height
+            if exif_date:
+                return datetime.strptime(exif_date, '%Y:%m:%d %H:%M:%S'), width, height
+    except (OSError, ValueError, struct.error):
+        pass
+    
+    # Fall back to file modification time
+    if stat_result is None:
+        stat_result = os.stat(path)
+    return datetime.fromtimestamp(stat_result.st_mtime), width, height
+
+def get_image_date(image_path):
+    """Extract date/time from image metadata or file modification time"""
+    return read_image_info(image_path)[0]
+
+def _read_entry_info(entry):
+    image_path, stat_result = entry
+    return read_image_info(image_path, stat_result)
+
+def _collect_infos(results, done, total, progress):
+    infos = []
+    for info in results:
+        infos.append(info)
+        if progress:
+            progress(done + len(infos), total)
+    return infos
+
+@tracing.traced
+def scan_image_infos(entries, cache=None, map_func=None, progress=None, prune=True):
+    """
+    Resolve (image_path, date_time, width, height) for every (image_path,
+    stat_result) entry from find_image_entries. Headers are read on a
+    thread pool unless map_func is given. With a ScanCache, files whose
+    size and mtime are unchanged are answered from the cache and never
+    opened, and (with prune) cache entries for files of the folder that are
+    not in entries are dropped; pass prune=False when entries is only part
+    of the folder.
+    progress, if given, is called with (resolved, total) as headers are read.
+    """
+    entries = [(os.path.abspath(image_path), stat_result) for image_path, stat_result in entries]
+    
+    hits = cache.get_many(entries) if cache is not None else {}
+    misses = [entry for entry in entries if entry[0] not in hits]
+    tracing.count("scan_cache_hits", len(hits))
+    tracing.count("headers_read", len(misses))
+    if progress:
+        progress(len(hits), len(entries))
+    
+    if map_func is None:
+        with ThreadPoolExecutor(max_workers=SCAN_THREADS) as pool:
+            infos = _collect_infos(pool.map(_read_entry_info, misses), len(hits), len(entries), progress)
+    else:
+        infos = _collect_infos(map_func(_read_entry_info, misses), len(hits), len(entries), progress)
+    
+    fresh = [(image_path, stat_result, date_time, width, height)
+             for (image_path, stat_result), (date_time, width, height) in zip(misses, infos)]
+    
+    image_infos = [(image_path, entry.date_time, entry.width, entry.height) for image_path, entry in hits.items()]
+    image_infos.extend((image_path, date_time, width, height) for image_path, _, date_time, width, height in fresh)
+    
+    if cache is not None:
+        cache.put_many(fresh)
+        cache.touch(list(hits))
+        if prune:
+            seen = {image_path for image_path, _ in entries}
+            for folder in {os.path.dirname(image_path) for image_path in seen}:
+                cache.prune(folder, seen)
+    
+    return image_infos
+
+def scan_images(entries, cache=None, map_func=None, progress=None, prune=True):
+    """
+    Resolve (date_time, image_path) for every (image_path, stat_result)
+    entry; see scan_image_infos.
+    """
+    return [(date_time, image_path) for image_path, date_time, _, _
+            in scan_image_infos(entries, cache=cache, map_func=map_func, progress=progress, prune=prune)]
+
+@tracing.traced
+def analyze_screenshots(image_paths, cache=None, workers=None, pool=None, progress=None):
+    """
+    Return {image_path: (score, dhash)} with the sheet-music confidence
+    (0..1) and perceptual hash of each path (both None if unreadable),
+    reusing cached results for unchanged files and analyzing the rest in
+    batches on a process pool.
+    progress, if given, is called with (analyzed, to_analyze) after each batch.
+    """
+    results = {}
+    if cache is not None:
+        items = [(image_path, page_source.source_stat(image_path)) for image_path in image_paths]
+        for image_path, entry in cache.get_many(items).items():
+            if entry.score is not None and entry.dhash is not None:
+                results[image_path] = (entry.score, entry.dhash)
+    
+    from sheet_music_classifier import analyze_images
+    
+    pending = [image_path for image_path in image_paths if image_path not in results]
+    tracing.count("analysis_cache_hits", len(results))
+    fresh = list(zip(pending, analyze_images(pending, workers=workers, pool=pool, progress=progress)))
+    results.update(fresh)
+    
+    if cache is not None:
+        cache.put_classification([(image_path, is_sheet_music_score(score), score, dhash)
+                                  for image_path, (score, dhash) in fresh])
+    
+    return results
+
+def is_sheet_music_score(score):
+    """True for a classifier score that counts as sheet music (None = unreadable)"""
+    from sheet_music_classifier import SHEET_MUSIC_THRESHOLD
+    return score is not None and score >= SHEET_MUSIC_THRESHOLD
+
+@tracing.traced
+def find_duplicates(image_data, analyses, included_hashes=()):
+    """
+    Map the index of every repeated screenshot in image_data (already in
+    chronological order) to the index of the copy that is kept, using the
+    perceptual hashes from analyze_screenshots. included_hashes are the
+    hashes of pages already in a document; repeats of those map to a
+    negative index.
+    """
+    from duplicates import duplicate_groups
+    
+    included_hashes = list(included_hashes)
+    hashes = included_hashes + [analyses[image_path][1] for _, image_path in image_data]
+    offset = len(included_hashes)
+    return {i - offset: first - offset for i, first in duplicate_groups(hashes).items() if i >= offset}
+
+@tracing.traced
+def build_document(image_data, output_path, progress=None, crop=False, dpi=DEFAULT_DPI, workers=None,
+                   append_after=0, stats=None, binarize=None):
+    """
+    Assemble the Word document for the given (date_time, image_path) pairs
+    and save it to output_path. Pages are written to disk as they are
+    processed, so memory use does not grow with the page count.
+    With append_after (the number of pages it already has), the pages are
+    added to the end of the existing document at output_path instead; only
+    the new pages are processed.
+    progress, if given, is called with (page_number, total_pages) before
+    each page is added; an exception raised from it (e.g. CompileCancelled)
+    stops the build and removes the partial file.
+    Unless dpi is 0/None and crop and binarize are off, every page first
+    goes through the page_optimizer stage (crop to the staves, downsample
+    to dpi at the 7.5" page width, binarize to 1 bit with the binarize
+    method if given, reduce colors, re-encode), in parallel across cores.
+    Files are read ahead of the workers and pages written in order as they
+    finish (see pipeline.run_pipeline); stats, a PipelineStats, collects
+    how busy each stage was.
+    """
+    from docx_stream import StreamingDocxWriter
+    
+    if dpi or crop or binarize:
+        from page_optimizer import optimize_pages
+        pages = optimize_pages([image_path for _, image_path in image_data],
+                               dpi=dpi, crop=crop, workers=workers, stats=stats, binarize=binarize)
+    else:
+        # The original files are embedded; reading them still overlaps with writing
+        from pipeline import run_pipeline
+        pages = run_pipeline([image_path for _, image_path in image_data], stats=stats)
+    
+    # Create Word document (streamed to disk page by page)
+    if append_after:
+        doc = StreamingDocxWriter(output_path, base_path=output_path)
+        doc.replace_text(f'Total pages: {append_after}', f'Total pages: {append_after + len(image_data)}')
+    else:
+        doc = StreamingDocxWriter(output_path)
+        doc.add_heading('Sheet Music Compilation', 0)
+        doc.add_paragraph(f'Compiled on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
+        doc.add_paragraph(f'Total pages: {len(image_data)}')
+        doc.add_paragraph('')
+    
+    try:
+        # Add images to document in chronological order
+        for i, ((date_time, image_path), (picture, error)) in enumerate(zip(image_data, pages)):
+            if progress:
+                progress(i + 1, len(image_data))
+            
+            try:
+                # Add page number
+                doc.add_heading(f'Page {append_after + i + 1}', level=2)
+                
+                if error:
+                    raise ValueError(error)
+                
+                # Add the image
+                with tracing.span("add_picture", bytes=len(picture)):
+                    doc.add_picture(picture, 7.5, name=os.path.basename(image_path))  # Larger for sheet music
+                
+                # Add some space
+                doc.add_paragraph('')
+                
+            except Exception as e:
+                doc.add_paragraph(f'Error loading page: {page_source.display_name(image_path)} - {str(e)}')
+    except BaseException:
+        # Never leave a half-written document behind, and stop pending pages
+        doc.abort()
+        pages.close()
+        raise
+    
+    with tracing.span("save_document"):
+        return doc.close()
+
+@tracing.traced
+def build_pdf(image_data, output_path, progress=None, crop=False, dpi=DEFAULT_DPI, workers=None,
+              append_after=0, stats=None, binarize=None):
+    """
+    PDF counterpart of build_document: same title block and 'Page N'
+    headings, one page per image. Pages are prepared in parallel (near
+    black-and-white pages become 1-bit CCITT G4 images) and appended to the
+    file as they arrive. With append_after, the pages are added to the
+    existing PDF as an incremental update.
+    """
+    from pdf_writer import PdfWriter
+    from page_optimizer import optimize_pages, optimize_pdf_page
+    
+    pages = optimize_pages([image_path for _, image_path in image_data],
+                           dpi=dpi, crop=crop, workers=workers, prepare=optimize_pdf_page, stats=stats,
+                           binarize=binarize)
+    
+    pdf = PdfWriter(output_path, append=bool(append_after))
+    try:
+        if append_after:
+            pdf.replace_text(f'Total pages: {append_after}', f'Total pages: {append_after + len(image_data)}')
+        else:
+            pdf.add_text_page([('Sheet Music Compilation', 28, True),
+                               (f'Compiled on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', 12, False),
+                               (f'Total pages: {len(image_data)}', 12, False)])
+        
+        for i, ((date_time, image_path), (image, error)) in enumerate(zip(image_data, pages)):
+            if progress:
+                progress(i + 1, len(image_data))
+            
+            page_number = append_after + i + 1
+            if error:
+                pdf.add_text_page([(f'Page {page_number}', 14, True),
+                                   (f'Error loading page: {page_source.display_name(image_path)} - {error}', 10, False)])
+            else:
+                with tracing.span("add_image_page", bytes=len(image.data)):
+                    pdf.add_image_page(f'Page {page_number}', image)
+    except BaseException:
+        pdf.abort()
+        pages.close()
+        raise
+    
+    with tracing.span("save_pdf"):
+        return pdf.close()
+
+class CompileCancelled(Exception):
+    """Raised from a progress callback to stop scanning or compiling"""
+
+# Output format -> function that writes it
+OUTPUT_BUILDERS = {'docx': build_document, 'pdf': build_pdf}
+
+def compilation_filename(extension='docx'):
+    """Timestamped file name used for every compiled document"""
+    return f"Sheet_Music_Compilation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+def session_filename(session, extension='docx'):
+    """File name for the document of one session, after its first capture time"""
+    return f"Sheet_Music_Session_{session[0][0].strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+@tracing.traced
+def select_pages(entries, cache=None, workers=None, sheet_music_only=False, keep_duplicates=False,
+                 included_hashes=(), prune=True):
+    """
+    Resolve the dates of (image_path, stat_result) entries and pick the
+    pages to compile, in chronological order: images that don't look like
+    sheet music are dropped with sheet_music_only, and repeated screenshots
+    (of each other or of included_hashes) unless keep_duplicates is set.
+    Returns (image_data, analyses) with analyses as from analyze_screenshots
+    for every scanned image, filtered or not: their hashes go into the
+    manifest so a later update_compilation can skip repeats of any page.
+    """
+    # Header reads only need threads; decoding for analysis goes to a process pool
+    image_data = scan_images(entries, cache=cache, prune=prune)
+    image_data.sort(key=lambda x: x[0])
+    
+    analyses = analyze_screenshots([image_path for _, image_path in image_data], cache=cache, workers=workers)
+    if sheet_music_only or not keep_duplicates:
+        image_data = filter_pages(image_data, analyses, sheet_music_only, keep_duplicates, included_hashes)
+    return image_data, analyses
+
+def filter_pages(image_data, analyses, sheet_music_only=False, keep_duplicates=False, included_hashes=()):
+    """
+    Drop the images of image_data (chronological) that don't look like sheet
+    music with sheet_music_only, and repeated screenshots unless
+    keep_duplicates is set, using analyses from analyze_screenshots.
+    """
+    duplicates = {} if keep_duplicates else find_duplicates(image_data, analyses, included_hashes)
+    return [item for i, item in enumerate(image_data)
+            if i not in duplicates
+            and (not sheet_music_only or is_sheet_music_score(analyses[item[1]][0]))]
+
+def _record_files(manifest, entries, image_data, analyses):
+    """Add every scanned file to the manifest, marking the ones that became pages"""
+    included = {image_path for _, image_path in image_data}
+    for image_path, stat_result in entries:
+        manifest.record(image_path, stat_result, analyses.get(image_path, (None, None))[1],
+                        included=image_path in included)
+
+@tracing.traced
+def compile_folder(source_folder, output_folder, workers=None, sheet_music_only=False, cache=None,
+                   crop=False, dpi=DEFAULT_DPI, output_format='docx', keep_duplicates=False, stitch=False,
+                   stats=None, binarize=None):
+    """
+    Compile every image in source_folder into a new document (docx or pdf) in output_folder
+    without a display. Repeated screenshots of the same page are left out
+    unless keep_duplicates is set; with stitch, overlapping scrolling
+    screenshots are joined and re-paginated between staff systems, and with
+    binarize (a BINARIZE_METHODS name) pages become 1-bit black and white.
+    Decoding and analysis run on a process pool with one worker per core;
+    with a ScanCache only new or changed files are decoded.
+    A manifest of the source files is written next to the document so
+    update_compilation can extend it later. stats, a PipelineStats, collects
+    the busy time of each stage of the document build.
+    Returns (output_path, page_count, image_count, elapsed_seconds), with
+    image_count the images (or pages of multi-page files) scanned.
+    """
+    start = time.perf_counter()
+    entries = [(os.path.abspath(image_path), stat_result)
+               for image_path, stat_result in find_image_entries(source_folder)]
+    if not entries:
+        raise FileNotFoundError(f"No image files found in {source_folder}")
+    
+    image_data, analyses = select_pages(entries, cache=cache, workers=workers,
+                                        sheet_music_only=sheet_music_only, keep_duplicates=keep_duplicates)
+    
+    os.makedirs(output_folder, exist_ok=True)
+    output_path = os.path.join(output_folder, compilation_filename(output_format))
+    pages = image_data
+    with tempfile.TemporaryDirectory() as work_dir:
+        if stitch:
+            from stitching import stitch_screenshots
+            pages = stitch_screenshots(image_data, work_dir)
+        OUTPUT_BUILDERS[output_format](pages, output_path, crop=crop, dpi=dpi, workers=workers, stats=stats,
+                                       binarize=binarize)
+    
+    manifest = CompilationManifest(output_path, source_folder, len(pages))
+    _record_files(manifest, entries, image_data, analyses)
+    manifest.save()
+    
+    return output_path, len(pages), len(entries), time.perf_counter() - start
+
+@tracing.traced
+def update_compilation(source_folder, output_folder, workers=None, sheet_music_only=False, cache=None,
+                       crop=False, dpi=DEFAULT_DPI, output_format='docx', keep_duplicates=False, stitch=False,
+                       stats=None, binarize=None):
+    """
+    Append the new and changed images in source_folder to the most recent
+    compilation of that folder in output_folder, using its manifest to skip
+    everything already processed, so the cost grows with the new pages
+    only. Screenshots repeating a page already in the document are skipped
+    too. Without a previous compilation, compiles the folder from scratch.
+    Returns (output_path, pages_added, elapsed_seconds).
+    """
+    start = time.perf_counter()
+    manifest = latest_compilation(output_folder, source_folder, output_format)
+    if manifest is None:
+        output_path, pages, _, elapsed = compile_folder(
+            source_folder, output_folder, workers=workers, sheet_music_only=sheet_music_only, cache=cache,
+            crop=crop, dpi=dpi, output_format=output_format, keep_duplicates=keep_duplicates, stitch=stitch,
+            stats=stats, binarize=binarize)
+        return output_path, pages, elapsed
+    
+    entries = [(os.path.abspath(image_path), stat_result)
+               for image_path, stat_result in find_image_entries(source_folder)]
+    new_entries = [(image_path, stat_result) for image_path, stat_result in entries
+                   if not manifest.is_current(image_path, stat_result)]
+    if not new_entries:
+        return manifest.document_path, 0, time.perf_counter() - start
+    
+    if not keep_duplicates:
+        # Older manifests of compilations that kept duplicates have no hashes to compare against
+        unhashed = [image_path for image_path in manifest.unhashed_pages()
+                    if os.path.exists(page_source.source_path(image_path))]
+        for image_path, (_, dhash) in analyze_screenshots(unhashed, cache=cache, workers=workers).items():
+            manifest.set_hash(image_path, dhash)
+    
+    image_data, analyses = select_pages(new_entries, cache=cache, workers=workers,
+                                        sheet_music_only=sheet_music_only, keep_duplicates=keep_duplicates,
+                                        included_hashes=manifest.included_hashes(), prune=False)
+    pages = image_data
+    if image_data:
+        with tempfile.TemporaryDirectory() as work_dir:
+            if stitch:
+                from stitching import stitch_screenshots
+                pages = stitch_screenshots(image_data, work_dir)
+            OUTPUT_BUILDERS[output_format](pages, manifest.document_path, crop=crop, dpi=dpi,
+                                           workers=workers, append_after=manifest.page_count, stats=stats,
+                                           binarize=binarize)
+    
+    # Only record the files once their pages are safely in the document
+    _record_files(manifest, new_entries, image_data, analyses)
+    manifest.page_count += len(pages)
+    manifest.save()
+    
+    return manifest.document_path, len(pages), time.perf_counter() - start
+
+def _build_session(pages, output_path, output_format, crop, dpi, stitch, binarize=None, workers=1):
+    """
+    One session's document; runs in a worker process of build_sessions,
+    where its pages are prepared in that worker too (workers=1)
+    """
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            if stitch:
+                from stitching import stitch_screenshots
+                pages = stitch_screenshots(pages, work_dir)
+            OUTPUT_BUILDERS[output_format](pages, output_path, crop=crop, dpi=dpi, workers=workers,
+                                           binarize=binarize)
+        return output_path, len(pages)
+    finally:
+        tracing.flush()
+
+@tracing.traced
+def build_sessions(sessions, output_folder, output_format='docx', crop=False, dpi=DEFAULT_DPI, stitch=False,
+                   workers=None, progress=None, binarize=None):
+    """
+    Write one document per session (a list of (date_time, image_path)
+    pairs, see sessions.find_sessions) into output_folder, building the
+    documents concurrently on a process pool with one worker per core. The
+    largest sessions start first, so the batch takes about as long as the
+    largest document when there are enough cores.
+    progress, if given, is called with (finished, total) as documents are
+    done; an exception raised from it stops the documents not yet started
+    (finished ones are kept).
+    Returns [(output_path, page_count)] in session order.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    jobs = [(pages, os.path.join(output_folder, session_filename(pages, output_format)))
+            for pages in sessions if pages]
+    if len(jobs) <= 1:
+        # Nothing to run side by side; let the document use every core instead
+        results = [_build_session(pages, output_path, output_format, crop, dpi, stitch, binarize, workers)
+                   for pages, output_path in jobs]
+        if progress:
+            progress(len(jobs), len(jobs))
+        return results
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+        futures = {pool.submit(_build_session, pages, output_path, output_format, crop, dpi, stitch, binarize): i
+                   for i, (pages, output_path) in sorted(enumerate(jobs), key=lambda job: -len(job[1][0]))}
+        try:
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(len(results), len(jobs))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return [results[i] for i in range(len(jobs))]
+
+@tracing.traced
+def compile_sessions(source_folder, output_folder, workers=None, sheet_music_only=False, cache=None,
+                     crop=False, dpi=DEFAULT_DPI, output_format='docx', keep_duplicates=False, stitch=False,
+                     gap=SESSION_GAP, binarize=None):
+    """
+    Compile each session in source_folder (screenshots separated by pauses
+    longer than gap, or by long runs of screenshots that are not sheet
+    music) into a document of its own in output_folder; see build_sessions.
+    Pages are selected within each session as in compile_folder.
+    Returns ([(output_path, page_count)], elapsed_seconds).
+    """
+    start = time.perf_counter()
+    entries = [(os.path.abspath(image_path), stat_result)
+               for image_path, stat_result in find_image_entries(source_folder)]
+    if not entries:
+        raise FileNotFoundError(f"No image files found in {source_folder}")
+    
+    image_data = scan_images(entries, cache=cache)
+    image_data.sort(key=lambda x: x[0])
+    # The classifier scores refine the sessions, so they are needed either way
+    analyses = analyze_screenshots([image_path for _, image_path in image_data], cache=cache, workers=workers)
+    scores = {image_path: is_sheet_music_score(score) for image_path, (score, _) in analyses.items()}
+    sessions = [filter_pages(session, analyses, sheet_music_only, keep_duplicates)
+                for session in find_sessions(image_data, gap, scores)]
+    
+    documents = build_sessions(sessions, output_folder, output_format, crop=crop, dpi=dpi, stitch=stitch,
+                               workers=workers, binarize=binarize)
+    return documents, time.perf_counter() - start
+
+def watch_folder(source_folder, output_folder, poll_interval=None, **options):
+    """
+    Keep the latest compilation of source_folder up to date: update it
+    once, then again whenever files in the folder change (inotify on
+    Linux, polling elsewhere). options are passed to update_compilation.
+    Runs until interrupted.
+    """
+    from folder_watcher import FolderWatcher, POLL_INTERVAL
+    
+    watcher = FolderWatcher(source_folder, poll_interval or POLL_INTERVAL)
+    mode = "inotify" if watcher.uses_inotify else f"polling every {watcher.poll_interval:g}s"
+    print(f"Watching {source_folder} ({mode}); press Ctrl+C to stop")
+    try:
+        while True:
+            try:
+                output_path, added, elapsed = update_compilation(source_folder, output_folder, **options)
+            except FileNotFoundError:
+                # Nothing to compile yet
+                added = 0
+            if added:
+                print(f"Added {added} pages to {output_path} in {elapsed:.2f}s", flush=True)
+            watcher.wait()
+    finally:
+        watcher.close()
+
+def run_cli(argv):
+    """Entry point for `python -m screenshot_compiler compile|watch SRC OUT` (or `python -m compiler_core ...`)"""
+    parser = argparse.ArgumentParser(prog="screenshot_compiler",
+                                     description="Compile sheet music screenshots into a Word document")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    # Options shared by compile and watch
+    compile_parser = argparse.ArgumentParser(add_help=False)
+    compile_parser.add_argument("source", help="folder containing the screenshots")
+    compile_parser.add_argument("output", help="folder to write the document into")
+    compile_parser.add_argument("-f", "--format", choices=sorted(OUTPUT_BUILDERS), default="docx",
+                                help="output document format (default: docx)")
+    compile_parser.add_argument("-j", "--workers", type=int, default=None,
+                                help="number of worker processes (default: one per core)")
+    compile_parser.add_argument("--sheet-music-only", action="store_true",
+                                help="skip images that do not look like sheet music")
+    compile_parser.add_argument("--stitch", action="store_true",
+                                help="join overlapping scrolling screenshots and re-paginate them")
+    compile_parser.add_argument("--keep-duplicates", action="store_true",
+                                help="keep repeated screenshots of the same page")
+    compile_parser.add_argument("--no-cache", action="store_true",
+                                help="ignore the on-disk scan cache")
+    compile_parser.add_argument("--crop", action="store_true",
+                                help="trim space above and below the staves on each page")
+    compile_parser.add_argument("--binarize", action="store_true",
+                                help="convert pages to clean 1-bit black and white before embedding")
+    compile_parser.add_argument("--binarize-method", choices=BINARIZE_METHODS, default=DEFAULT_BINARIZE_METHOD,
+                                help="adaptive thresholds (sauvola) or one threshold per page (otsu) "
+                                     "(default: %(default)s)")
+    compile_parser.add_argument("--trace", metavar="FILE",
+                                help="record timings to FILE in Chrome trace format, with a summary table "
+                                     f"in FILE.summary.txt (or set {tracing.TRACE_ENV}=FILE)")
+    compile_parser.add_argument("--dpi", type=int, default=DEFAULT_DPI,
+                                help=f"print resolution pages are downsampled to (default: {DEFAULT_DPI}, "
+                                     "0 embeds the original files in a docx)")
+    
+    once_parser = subparsers.add_parser("compile", parents=[compile_parser],
+                                        help="compile a folder without opening the GUI")
+    once_parser.add_argument("--sessions", action="store_true",
+                             help="write one document per session (screenshots taken in one sitting), "
+                                  "building them in parallel")
+    once_parser.add_argument("--session-gap", type=float, default=SESSION_GAP.total_seconds() / 60,
+                             metavar="MINUTES", help="pause that starts a new session (default: %(default)g)")
+    watch_parser = subparsers.add_parser("watch", parents=[compile_parser],
+                                         help="append new screenshots to the latest compilation as they arrive")
+    watch_parser.add_argument("--interval", type=float, default=None,
+                              help="polling interval in seconds where inotify is unavailable")
+    
+    args = parser.parse_args(argv)
+    
+    if not os.path.isdir(args.source):
+        parser.error(f"source folder not found: {args.source}")
+    
+    if args.trace:
+        tracing.start(args.trace)
+    
+    cache = None if args.no_cache else ScanCache()
+    options = dict(workers=args.workers, sheet_music_only=args.sheet_music_only, cache=cache,
+                   crop=args.crop, dpi=args.dpi, output_format=args.format,
+                   keep_duplicates=args.keep_duplicates, stitch=args.stitch,
+                   binarize=args.binarize_method if args.binarize else None)
+    try:
+        if args.command == "watch":
+            try:
+                watch_folder(args.source, args.output, poll_interval=args.interval, **options)
+            except KeyboardInterrupt:
+                # Ctrl+C is how watching ends
+                pass
+            return 0
+        if args.sessions:
+            documents, elapsed = compile_sessions(args.source, args.output,
+                                                  gap=timedelta(minutes=args.session_gap), **options)
+            for output_path, pages in documents:
+                print(f"Compiled {pages} pages into {output_path}")
+            pages = sum(pages for _, pages in documents)
+            print(f"{len(documents)} sessions, {pages} pages in {elapsed:.2f}s")
+            return 0
+        from pipeline import PipelineStats
+        stats = PipelineStats()
+        output_path, pages, images, elapsed = compile_folder(args.source, args.output, stats=stats, **options)
+    except KeyboardInterrupt:
+        # An interrupted compile is a failure to scripts (128 + SIGINT, as a shell reports it)
+        print("Interrupted", file=sys.stderr)
+        return 130
+    except FileNotFoundError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        if cache is not None:
+            cache.close()
+    
+    image_rate = images / elapsed if elapsed > 0 else 0.0
+    page_rate = pages / elapsed if elapsed > 0 else 0.0
+    print(f"Compiled {pages} pages from {images} images into {output_path}")
+    print(f"Elapsed: {elapsed:.2f}s ({image_rate:.1f} images/s scanned, {page_rate:.1f} pages/s written)")
+    print(f"Pipeline: {stats.summary()}")
+    return 0
+
+def main(argv=None):
+    # Needed for the process pools in a frozen (PyInstaller) app
+    multiprocessing.freeze_support()
+    return run_cli(sys.argv[1:] if argv is None else argv)
+
+if __name__ == "__main__":
+    sys.exit(main())
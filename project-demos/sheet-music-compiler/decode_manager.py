@@ -0,0 +1,119 @@
+import threading
+from contextlib import contextmanager, nullcontext
+
+import tracing
+from page_source import open_source
+
+# Decoded pixel data allowed in flight at once in one process; the grid's
+# thumbnail threads and the preview prefetch threads share it. A 5K capture
+# needs about 90 MB (RGB plus one working copy), so two or three full-size
+# decodes run side by side and the rest wait. An image larger than the
+# whole budget still decodes, alone.
+MAX_DECODE_BYTES = 256 * 1024 * 1024
+
+# A decode usually makes one converted or reduced copy before the original
+# is released
+WORKING_COPIES = 2
+
+# Modes that reduce() and LANCZOS resizing handle directly
+REDUCIBLE_MODES = ('RGB', 'RGBA', 'L', 'LA')
+
+class DecodeBudget:
+    """
+    Counting semaphore over bytes of decoded pixels: reserve() blocks until
+    the decode fits next to the ones already running.
+    """
+    def __init__(self, max_bytes=MAX_DECODE_BYTES):
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        nbytes = min(nbytes, self.max_bytes)
+        with self.condition:
+            while self.in_use and self.in_use + nbytes > self.max_bytes:
+                self.condition.wait()
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_use -= nbytes
+                self.condition.notify_all()
+
+budget = DecodeBudget()
+
+def decode_cost(size, mode):
+    """Bytes to reserve for decoding an image of size and mode, working copy included"""
+    from PIL import Image
+    width, height = size
+    return width * height * Image.getmodebands(mode) * WORKING_COPIES
+
+def _normalize(image, mode):
+    """Convert to mode, or to a mode reduce() supports, keeping transparency"""
+    if mode is not None:
+        return image.convert(mode) if image.mode != mode else image
+    if image.mode not in REDUCIBLE_MODES:
+        return image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+def load_image(image_path, min_size=None, mode=None):
+    """
+    Decode image_path (a path or a page reference, see page_source) within
+    the shared memory budget and return (image, full_size): a loaded image
+    whose file is already closed, and the image's size before any reduction.
+
+    With min_size, a (width, height) or a function mapping the full size to
+    one, only as much resolution as that is decoded: JPEGs are decoded at
+    1/2..1/8 scale via draft(), and every format is then shrunk by the
+    largest integer factor with reduce() that keeps it at least min_size,
+    so the full-size pixels are released before this returns.
+    PDF pages are rendered at about min_size in the first place.
+    The image is converted to mode if given, otherwise to RGB/RGBA if its
+    mode cannot be reduced (palette, CMYK, 16-bit...).
+    """
+    with open_source(image_path, min_size) as (opened, full_size, reserved):
+        if callable(min_size):
+            min_size = min_size(*full_size)
+        if min_size:
+            # After draft() the size is what will actually be decoded
+            opened.draft(mode if mode in ('L', 'RGB') else 'RGB', min_size)
+
+        # A rendered PDF page is already reserved (see open_source)
+        with nullcontext() if reserved else budget.reserve(decode_cost(opened.size, opened.mode)):
+            with tracing.span("decode"):
+                opened.load()
+            tracing.count_decode(image_path, opened)
+            image = _normalize(opened, mode)
+            if min_size:
+                factor = min(image.width // min_size[0], image.height // min_size[1])
+                if factor > 1:
+                    image = image.reduce(factor)
+            if image is opened:
+                # Closing the file releases the pixels of the opened image
+                image = opened.copy()
+    return image, full_size
+
+@contextmanager
+def open_image(image_path, draft_size=None):
+    """
+    Context manager for consumers that need the full image (page
+    optimization, stitching): the image (a path, a page reference, or a
+    binary file object holding data the caller already read) is opened,
+    decoded (at reduced scale for JPEGs and PDF pages when draft_size, a
+    (width, height) or a function of the full size, is given) and kept
+    within the shared budget until the block exits, then closed.
+    """
+    with open_source(image_path, draft_size) as (image, full_size, reserved):
+        if callable(draft_size):
+            draft_size = draft_size(*full_size)
+        if draft_size:
+            image.draft('RGB', draft_size)
+        with nullcontext() if reserved else budget.reserve(decode_cost(image.size, image.mode)):
+            with tracing.span("decode"):
+                image.load()
+            tracing.count_decode(image_path, image)
+            yield image
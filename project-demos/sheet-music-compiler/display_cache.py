@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from thumbnail_cache import fit_dimensions, load_resized
+from page_source import source_stat
+
+# Memory for decoded preview images; a 750x550 RGB preview is about 1.2 MB
+MAX_DISPLAY_BYTES = 96 * 1024 * 1024
+
+# Background decoders for prefetching; previews are viewed one at a time,
+# so the neighbours on either side are all there is to prepare
+PREFETCH_WORKERS = 2
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+class DisplayImageCache:
+    """
+    In-memory LRU of preview images already resized to fit a display box,
+    keyed by path, size, mtime and box so an edited file is decoded again.
+    Entries are evicted least recently used first once they take more than
+    max_bytes. prefetch() decodes images on background threads so that
+    stepping to the next or previous image finds it ready; get() waits for
+    an image that is still being prefetched instead of decoding it twice.
+
+    Only PIL images are cached: Tk PhotoImages must be created on the
+    mainloop thread by the caller.
+    """
+    def __init__(self, max_bytes=MAX_DISPLAY_BYTES, workers=PREFETCH_WORKERS):
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()  # key -> PIL image
+        self.total_bytes = 0
+        self.pending = {}  # key -> Future of a prefetch
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='preview')
+
+    def key_for(self, image_path, box):
+        stat_result = source_stat(image_path)
+        return os.path.abspath(image_path), stat_result.st_size, stat_result.st_mtime_ns, tuple(box)
+
+    def get(self, image_path, box):
+        """Return image_path resized to fit box (width, height), decoding it on a miss"""
+        key = self.key_for(image_path, box)
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+                return image
+            future = self.pending.get(key)
+        if future is not None:
+            try:
+                return future.result()
+            except CancelledError:
+                # The prefetch was dropped before it started
+                pass
+        return self._load(key, image_path, box)
+
+    def prefetch(self, image_paths, box):
+        """
+        Decode image_paths in the background, in order. Prefetches that have
+        not started and are no longer wanted are dropped, so paging quickly
+        through a long list does not queue up decodes for skipped images.
+        """
+        keys = {}
+        for image_path in image_paths:
+            try:
+                keys[self.key_for(image_path, box)] = image_path
+            except OSError:
+                continue
+        with self.lock:
+            for key in [key for key in self.pending if key not in keys]:
+                if self.pending[key].cancel():
+                    del self.pending[key]
+            for key, image_path in keys.items():
+                if key not in self.images and key not in self.pending:
+                    self.pending[key] = self.executor.submit(self._load, key, image_path, box)
+
+    def _load(self, key, image_path, box):
+        try:
+            image = load_resized(image_path, lambda width, height: fit_dimensions(width, height, *box))
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+        with self.lock:
+            if key not in self.images:
+                self.images[key] = image
+                self.total_bytes += _image_bytes(image)
+                while self.total_bytes > self.max_bytes and len(self.images) > 1:
+                    _, evicted = self.images.popitem(last=False)
+                    self.total_bytes -= _image_bytes(evicted)
+        return image
+
+    def close(self):
+        """Stop prefetching; decodes already running finish in the background"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
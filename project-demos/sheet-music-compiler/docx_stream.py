@@ -0,0 +1,181 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+import docx
+from PIL import Image
+
+EMU_PER_INCH = 914400
+
+# PIL format -> (file extension, content type, zip compression)
+IMAGE_TYPES = {
+    'PNG': ('png', 'image/png', zipfile.ZIP_STORED),
+    'JPEG': ('jpeg', 'image/jpeg', zipfile.ZIP_STORED),
+    'GIF': ('gif', 'image/gif', zipfile.ZIP_STORED),
+    'BMP': ('bmp', 'image/bmp', zipfile.ZIP_DEFLATED),
+    'TIFF': ('tiff', 'image/tiff', zipfile.ZIP_DEFLATED),
+}
+
+IMAGE_RELATIONSHIP = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+PICTURE_XML = (
+    '<w:p><w:r><w:drawing>'
+    '<wp:inline xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{id}" name="Picture {id}"/>'
+    '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="{name}"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+    '<a:prstGeom prst="rect"/></pic:spPr></pic:pic>'
+    '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+)
+
+class StreamingDocxWriter:
+    """
+    Write a .docx page by page with flat memory use. Each picture is copied
+    into the zip as soon as it is added and the body XML is spooled to a
+    temporary file, so nothing proportional to the page count is held in
+    memory. Produces the same paragraph/heading/picture markup python-docx
+    would, on top of python-docx's default template (styles, theme, etc.).
+
+    The document is written to output_path + '.partial' and only moved into
+    place by close(); abort() discards it.
+
+    With base_path, writing starts from that document (usually output_path
+    itself) instead of an empty one: its content is kept and new content is
+    appended after it. Its pictures are copied over as they are.
+    """
+    def __init__(self, output_path, base_path=None):
+        self.output_path = output_path
+        self.partial_path = output_path + '.partial'
+        self.zip = zipfile.ZipFile(self.partial_path, 'w', zipfile.ZIP_DEFLATED)
+
+        if base_path is None:
+            # Render the empty default document once to reuse its parts
+            base = io.BytesIO()
+            docx.Document().save(base)
+        else:
+            base = base_path
+        with zipfile.ZipFile(base) as package:
+            special = {'word/document.xml', 'word/_rels/document.xml.rels', '[Content_Types].xml'}
+            for info in package.infolist():
+                if info.filename in special:
+                    continue
+                # Pictures are streamed across; everything else is small
+                with package.open(info) as source, self.zip.open(info, 'w') as part:
+                    shutil.copyfileobj(source, part, 1024 * 1024)
+            document_xml = package.read('word/document.xml').decode('utf-8')
+            self.relationships = package.read('word/_rels/document.xml.rels').decode('utf-8')
+            self.content_types = package.read('[Content_Types].xml').decode('utf-8')
+            self.image_count = sum(1 for name in package.namelist() if name.startswith('word/media/'))
+
+        body_start = document_xml.index('<w:body>') + len('<w:body>')
+        sect_start = document_xml.rindex('<w:sectPr')
+        self.document_head = document_xml[:body_start]
+        # Existing paragraphs (none for a new document), kept so replace_text can edit them
+        self.base_body = document_xml[body_start:sect_start]
+        self.document_tail = document_xml[sect_start:]
+
+        self.next_rel_id = max(int(rel_id) for rel_id in re.findall(r'Id="rId(\d+)"', self.relationships)) + 1
+        self.image_relationships = []
+        self.image_extensions = {}
+        self.body = tempfile.TemporaryFile()
+
+    def replace_text(self, old, new):
+        """Replace text in the paragraphs the document started with (e.g. a page total)"""
+        self.base_body = self.base_body.replace(f'>{escape(old)}<', f'>{escape(new)}<')
+
+    def _write_body(self, xml):
+        self.body.write(xml.encode('utf-8'))
+
+    def add_heading(self, text, level=1):
+        style = 'Title' if level == 0 else f'Heading{level}'
+        self._write_body(f'<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr>'
+                         f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+
+    def add_paragraph(self, text=''):
+        if text:
+            self._write_body(f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+        else:
+            self._write_body('<w:p/>')
+
+    def add_picture(self, image, width_inches, name='image'):
+        """
+        Embed an image (a path, bytes or a binary stream) scaled to
+        width_inches and stream its bytes straight into the package.
+        """
+        if isinstance(image, bytes):
+            image = io.BytesIO(image)
+        if isinstance(image, (str, os.PathLike)):
+            name = os.path.basename(image)
+            source = open(image, 'rb')
+        else:
+            source = image
+        try:
+            with Image.open(source) as header:
+                image_format = header.format
+                px_width, px_height = header.size
+            if image_format not in IMAGE_TYPES:
+                raise ValueError(f"Unsupported image format: {image_format}")
+            extension, content_type, compression = IMAGE_TYPES[image_format]
+
+            self.image_count += 1
+            rel_id = f'rId{self.next_rel_id}'
+            self.next_rel_id += 1
+            target = f'media/image{self.image_count}.{extension}'
+
+            info = zipfile.ZipInfo('word/' + target, date_time=time.localtime()[:6])
+            info.compress_type = compression
+            source.seek(0)
+            with self.zip.open(info, 'w') as part:
+                shutil.copyfileobj(source, part, 1024 * 1024)
+        finally:
+            if source is not image:
+                source.close()
+
+        self.image_relationships.append((rel_id, target))
+        self.image_extensions[extension] = content_type
+
+        cx = int(width_inches * EMU_PER_INCH)
+        cy = int(round(cx * px_height / px_width))
+        self._write_body(PICTURE_XML.format(cx=cx, cy=cy, id=self.image_count,
+                                            name=escape(name, {'"': '&quot;'}), rid=rel_id))
+
+    def close(self):
+        """Finish the package (document body, relationships, content types) and move it into place"""
+        with self.zip.open('word/document.xml', 'w') as part:
+            part.write(self.document_head.encode('utf-8'))
+            part.write(self.base_body.encode('utf-8'))
+            self.body.seek(0)
+            shutil.copyfileobj(self.body, part, 1024 * 1024)
+            part.write(self.document_tail.encode('utf-8'))
+        self.body.close()
+
+        rels = ''.join(f'<Relationship Id="{rel_id}" Type="{IMAGE_RELATIONSHIP}" Target="{target}"/>'
+                       for rel_id, target in self.image_relationships)
+        self.zip.writestr('word/_rels/document.xml.rels',
+                          self.relationships.replace('</Relationships>', rels + '</Relationships>'))
+
+        defaults = ''.join(f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+                           for extension, content_type in sorted(self.image_extensions.items())
+                           if f'Extension="{extension}"' not in self.content_types)
+        self.zip.writestr('[Content_Types].xml',
+                          self.content_types.replace('<Default ', defaults + '<Default ', 1))
+
+        # The zip's central directory is only written here
+        self.zip.close()
+        os.replace(self.partial_path, self.output_path)
+        return self.output_path
+
+    def abort(self):
+        """Discard the partially written document"""
+        self.body.close()
+        self.zip.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
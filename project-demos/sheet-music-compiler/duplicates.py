@@ -0,0 +1,95 @@
+import numpy as np
+
+# Gradient hash grid: HASH_SIZE x HASH_SIZE bits. Sheet music pages all look
+# alike at the classic 8x8, so use a finer grid to tell pages apart
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# Hashes at most this many bits apart are treated as the same page.
+# Re-screenshots at another zoom level with JPEG compression come within
+# 8 bits; distinct sheet music pages are 60+ bits apart. A duplicate is
+# dropped from the document, so the radius errs on the tight side
+DUPLICATE_DISTANCE = 10
+
+# Fixed shuffle of the hash bits, so each MultiIndexHashTable chunk samples
+# the whole page; otherwise blank margins make whole chunks match everywhere
+_BIT_ORDER = np.random.default_rng(0).permutation(HASH_BITS)
+
+def _block_means(batch, rows, cols):
+    """Shrink an N x H x W stack to N x rows x cols by averaging blocks"""
+    height, width = batch.shape[1:]
+    row_edges = np.linspace(0, height, rows + 1).astype(int)[:-1]
+    col_edges = np.linspace(0, width, cols + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(batch, row_edges, axis=1), col_edges, axis=2)
+    counts = np.outer(np.diff(np.append(row_edges, height)), np.diff(np.append(col_edges, width)))
+    return sums / counts
+
+def dhash_batch(batch):
+    """
+    Difference hashes for an N x H x W stack of grayscale images (or one
+    H x W image) in one vectorized pass: each bit says whether a block is
+    brighter than its right-hand neighbour. Returns a list of Python ints
+    with HASH_BITS bits each.
+    """
+    batch = np.asarray(batch, dtype=np.float32)
+    if batch.ndim == 2:
+        batch = batch[np.newaxis]
+    blocks = _block_means(batch, HASH_SIZE, HASH_SIZE + 1)
+    bits = (blocks[:, :, 1:] > blocks[:, :, :-1]).reshape(len(batch), HASH_BITS)[:, _BIT_ORDER]
+    packed = np.packbits(bits, axis=1)
+    return [int.from_bytes(row.tobytes(), 'big') for row in packed]
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return (a ^ b).bit_count()
+
+class MultiIndexHashTable:
+    """
+    Multi-index hashing for Hamming range queries. Each hash is split into
+    radius + 1 chunks with one exact-match table per chunk: two hashes at
+    most radius bits apart must agree exactly on at least one chunk
+    (pigeonhole), so a query only compares against the hashes sharing a
+    chunk with it instead of every hash seen so far.
+    """
+    def __init__(self, radius=DUPLICATE_DISTANCE, bits=HASH_BITS):
+        self.radius = radius
+        edges = np.linspace(0, bits, radius + 2).astype(int)
+        self.chunks = [(int(start), (1 << int(end - start)) - 1) for start, end in zip(edges[:-1], edges[1:])]
+        self.tables = [{} for _ in self.chunks]
+        self.values = {}
+
+    def _keys(self, value):
+        return [(value >> start) & mask for start, mask in self.chunks]
+
+    def add(self, value, item):
+        self.values[item] = value
+        for table, key in zip(self.tables, self._keys(value)):
+            table.setdefault(key, []).append(item)
+
+    def search(self, value):
+        """Return the items whose hash is within radius bits of value"""
+        candidates = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            candidates.update(table.get(key, ()))
+        return [item for item in candidates if hamming(value, self.values[item]) <= self.radius]
+
+def duplicate_groups(hashes, max_distance=DUPLICATE_DISTANCE):
+    """
+    Group near-identical images. hashes is a sequence of hash ints (None
+    for images that could not be hashed). Returns {index: keeper_index}
+    for every image within max_distance bits of an earlier kept image (the
+    closest one, the earliest on ties). Each image is compared with the
+    keepers only, never with other duplicates, so a chain of small
+    differences cannot join two pages that are far apart.
+    """
+    duplicates = {}
+    keepers = MultiIndexHashTable(max_distance)
+    for i, value in enumerate(hashes):
+        if value is None:
+            continue
+        matches = keepers.search(value)
+        if matches:
+            duplicates[i] = min(matches, key=lambda j: (hamming(value, keepers.values[j]), j))
+        else:
+            keepers.add(value, i)
+    return duplicates
@@ -0,0 +1,114 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+# Fallback polling interval when inotify is not available (macOS, Windows)
+POLL_INTERVAL = 2.0
+
+# A change only counts once the folder has been quiet this long, so
+# screenshots still being written are picked up complete
+SETTLE_SECONDS = 1.0
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+
+def _open_inotify(folder):
+    """Return an inotify file descriptor watching folder, or None where inotify is unavailable"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+class FolderWatcher:
+    """
+    Block until the files in a folder change. Uses inotify on Linux and
+    otherwise compares directory snapshots (names, sizes and mtimes) every
+    poll_interval seconds.
+    """
+    def __init__(self, folder, poll_interval=POLL_INTERVAL):
+        self.folder = folder
+        self.poll_interval = poll_interval
+        self.fd = _open_inotify(folder)
+        self.snapshot = self._snapshot() if self.fd is None else None
+
+    @property
+    def uses_inotify(self):
+        return self.fd is not None
+
+    def _snapshot(self):
+        snapshot = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                try:
+                    stat_result = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.name] = (stat_result.st_size, stat_result.st_mtime_ns)
+        return snapshot
+
+    def _drain_events(self, timeout):
+        """Wait up to timeout for inotify events; True if any were read"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def wait(self, timeout=None):
+        """
+        Block until something in the folder changed and the folder has
+        settled for SETTLE_SECONDS. Returns False if timeout (seconds)
+        passed without a change.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.fd is not None:
+                changed = self._drain_events(remaining)
+                if changed:
+                    while self._drain_events(SETTLE_SECONDS):
+                        pass
+                    return True
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                snapshot = self._snapshot()
+                if snapshot != self.snapshot:
+                    # Keep polling until files stop growing
+                    while True:
+                        time.sleep(SETTLE_SECONDS)
+                        settled = self._snapshot()
+                        if settled == snapshot:
+                            break
+                        snapshot = settled
+                    self.snapshot = snapshot
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,148 @@
+import struct
+
+# EXIF/TIFF tags we care about
+TAG_IMAGE_WIDTH = 0x0100
+TAG_IMAGE_LENGTH = 0x0101
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+
+# JPEG start-of-frame markers (C4, C8 and CC are DHT/JPG/DAC, not frames)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+               0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def read_header(image_path):
+    """
+    Read pixel dimensions and the EXIF date of an image from its header
+    only; pixel data is never decoded. Returns (width, height, date_string)
+    where any value may be None if the file does not provide it. The date
+    string is DateTimeOriginal if present, otherwise DateTime.
+    """
+    with open(image_path, 'rb') as f:
+        head = f.read(16)
+        f.seek(0)
+        if head.startswith(b'\xff\xd8'):
+            return _read_jpeg(f)
+        if head.startswith(PNG_SIGNATURE):
+            return _read_png(f)
+        if head[:4] in (b'II*\x00', b'MM\x00*'):
+            return _read_tiff(lambda offset, size: _read_at(f, offset, size))
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            width, height = struct.unpack('<HH', head[6:10])
+            return width, height, None
+        if head.startswith(b'BM'):
+            f.seek(18)
+            width, height = struct.unpack('<ii', f.read(8))
+            return width, abs(height), None
+    return None, None, None
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+def _read_jpeg(f):
+    """Walk JPEG segments up to the first scan, picking up APP1/Exif and SOF"""
+    width = height = date = None
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # Fill bytes
+            marker = f.read(1)
+        if not marker:
+            break
+        marker = marker[0]
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):  # End of image / start of scan
+            break
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker == 0xE1 and date is None:
+            payload = f.read(length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                tiff = payload[6:]
+                date = _read_tiff(lambda offset, size: tiff[offset:offset + size])[2]
+        elif marker in SOF_MARKERS:
+            payload = f.read(length - 2)
+            height, width = struct.unpack('>HH', payload[1:5])
+            # Exif always precedes the frame header, so we are done
+            break
+        else:
+            f.seek(length - 2, 1)
+    return width, height, date
+
+def _read_png(f):
+    """Walk PNG chunks up to the first IDAT, picking up IHDR and eXIf"""
+    width = height = date = None
+    f.seek(len(PNG_SIGNATURE))
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        length, chunk_type = struct.unpack('>I4s', chunk_header)
+        if chunk_type == b'IHDR':
+            width, height = struct.unpack('>II', f.read(8))
+            f.seek(length - 8 + 4, 1)
+        elif chunk_type == b'eXIf':
+            tiff = f.read(length)
+            if tiff.startswith(b'Exif\x00\x00'):
+                tiff = tiff[6:]
+            date = _read_tiff(lambda offset, size: tiff[offset:offset + size])[2]
+            f.seek(4, 1)
+        elif chunk_type in (b'IDAT', b'IEND'):
+            break
+        else:
+            f.seek(length + 4, 1)
+    return width, height, date
+
+def _read_tiff(read_at):
+    """
+    Parse a TIFF structure (a .tif file or an Exif block) through
+    read_at(offset, size) and return (width, height, date_string).
+    """
+    header = read_at(0, 8)
+    if len(header) < 8:
+        return None, None, None
+    endian = '<' if header[:2] == b'II' else '>'
+    ifd0 = struct.unpack(endian + 'I', header[4:8])[0]
+
+    tags = _read_ifd(read_at, endian, ifd0)
+    date_original = None
+    if TAG_EXIF_IFD in tags:
+        exif_tags = _read_ifd(read_at, endian, tags[TAG_EXIF_IFD])
+        date_original = exif_tags.get(TAG_DATETIME_ORIGINAL)
+
+    return (tags.get(TAG_IMAGE_WIDTH), tags.get(TAG_IMAGE_LENGTH),
+            date_original or tags.get(TAG_DATETIME))
+
+def _read_ifd(read_at, endian, offset):
+    """Return {tag: value} for the handful of tags read_header needs"""
+    wanted = (TAG_IMAGE_WIDTH, TAG_IMAGE_LENGTH, TAG_DATETIME,
+              TAG_EXIF_IFD, TAG_DATETIME_ORIGINAL)
+    values = {}
+    count_bytes = read_at(offset, 2)
+    if len(count_bytes) < 2:
+        return values
+    count = struct.unpack(endian + 'H', count_bytes)[0]
+    entries = read_at(offset + 2, count * 12)
+    for i in range(len(entries) // 12):
+        tag, field_type, n, raw = struct.unpack(endian + 'HHI4s', entries[i * 12:(i + 1) * 12])
+        if tag not in wanted:
+            continue
+        if field_type == 3:  # SHORT
+            values[tag] = struct.unpack(endian + 'H', raw[:2])[0]
+        elif field_type == 4:  # LONG
+            values[tag] = struct.unpack(endian + 'I', raw)[0]
+        elif field_type == 2:  # ASCII
+            data = raw[:n] if n <= 4 else read_at(struct.unpack(endian + 'I', raw)[0], n)
+            values[tag] = data.split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+    return values
@@ -0,0 +1,191 @@
+import io
+import os
+import numpy as np
+from PIL import Image
+
+from staff_detection import detect_staves, music_bounds
+from binarization import binarize_page
+from pdf_writer import encode_pdf_image
+from compiler_core import DEFAULT_DPI
+from decode_manager import open_image
+from pipeline import run_pipeline
+import tracing
+
+# Pages are embedded 7.5 inches wide in the document
+PAGE_WIDTH_INCHES = 7.5
+
+# Largest channel difference still treated as gray (tinted UI grays, JPEG noise)
+GRAY_TOLERANCE = 16
+
+# Pages with at most this share of colored pixels (toolbars, highlights) are
+# stored as grayscale
+MAX_COLOR_SHARE = 0.02
+
+# Grayscale pages with at most this share of mid-tone pixels are stored with
+# 16 gray levels (4-bit); the mid-tones are just antialiased edges
+MAX_MIDTONE_SHARE = 0.12
+
+def crop_to_music(image):
+    """
+    Trim screenshot chrome above and below the music, using the staff
+    systems found by staff_detection. Returns the cropped image, or the same
+    image if there is nothing worth trimming.
+    """
+    bounds = music_bounds(detect_staves(image.convert('L')), image.height)
+    if bounds is None or (bounds[1] - bounds[0]) > image.height * 0.95:
+        return image
+    return image.crop((0, bounds[0], image.width, bounds[1]))
+
+def resample_to_dpi(image, dpi):
+    """Downsample so the page is PAGE_WIDTH_INCHES wide at dpi (never upsamples)"""
+    target_width = int(PAGE_WIDTH_INCHES * dpi)
+    if not dpi or image.width <= target_width:
+        return image
+    target_height = max(1, round(image.height * target_width / image.width))
+    # reducing_gap lets Pillow box-reduce first and only LANCZOS the last step
+    return image.resize((target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+def normalize_mode(image):
+    """
+    Flatten transparency onto white paper and return the page as L when it
+    is (nearly) grayscale, otherwise as RGB. Done before resampling so gray
+    pages are resized as one channel instead of three.
+    """
+    if image.mode in ('RGBA', 'LA', 'P') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, rgba)
+    if image.mode == 'L':
+        return image
+    image = image.convert('RGB')
+
+    # Every 4th pixel in each direction is plenty to judge the content
+    pixels = np.asarray(image)[::4, ::4]
+    spread = pixels.max(axis=2).astype(np.int16) - pixels.min(axis=2)
+    if np.count_nonzero(spread > GRAY_TOLERANCE) <= spread.size * MAX_COLOR_SHARE:
+        return image.convert('L')
+    return image
+
+def is_near_bilevel(image):
+    """True for an L image that is essentially black on white (plus antialiasing)"""
+    gray = np.asarray(image)[::4, ::4]
+    midtones = np.count_nonzero((gray > 64) & (gray < 192)) / gray.size
+    return midtones <= MAX_MIDTONE_SHARE
+
+def reduce_colors(image):
+    """
+    Pick the most compact pixel format the content allows: grayscale pages
+    that are essentially black on white get a 16-level palette, images with
+    few colors get a palette, everything else (1-bit pages included) is
+    left as it is.
+    """
+    if image.mode == '1':
+        return image
+    if image.mode == 'RGB':
+        if image.getcolors(256) is not None:
+            return image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        return image
+
+    if is_near_bilevel(image):
+        # Fixed 16-level gray palette, applied with a lookup table
+        levels = image.point([value * 16 // 256 for value in range(256)])
+        paletted = Image.frombytes('P', levels.size, levels.tobytes())
+        paletted.putpalette([component for level in range(16) for component in (level * 17,) * 3])
+        return paletted
+    return image
+
+def encode_smallest(image):
+    """Encode as PNG, and also as JPEG for continuous-tone images; keep the smaller"""
+    candidates = []
+
+    png = io.BytesIO()
+    image.save(png, format='PNG')
+    candidates.append(png.getvalue())
+
+    if image.mode in ('RGB', 'L'):
+        jpeg = io.BytesIO()
+        image.save(jpeg, format='JPEG', quality=85, optimize=True)
+        candidates.append(jpeg.getvalue())
+
+    return min(candidates, key=len)
+
+def _prepare_page(image, dpi, crop, binarize=None):
+    """
+    The steps shared by both output formats: crop, grayscale conversion,
+    downsampling and, with binarize (a binarization method), thresholding
+    to 1 bit at the output resolution
+    """
+    if crop:
+        with tracing.span("crop_to_music"):
+            image = crop_to_music(image)
+    with tracing.span("resample"):
+        image = resample_to_dpi(normalize_mode(image), dpi)
+    if binarize:
+        with tracing.span("binarize", method=binarize):
+            image = binarize_page(image, binarize)
+        tracing.count("pixels_binarized", image.width * image.height)
+    return image
+
+def optimize_page(image_path, dpi=DEFAULT_DPI, crop=False, binarize=None, data=None):
+    """
+    Prepare one page for embedding: optional crop, grayscale conversion,
+    DPI-targeted downsampling, optional binarization (binarize names the
+    method, see binarization.METHODS), color reduction and re-encoding.
+    data, if given, is the file's content already read by the pipeline.
+    Returns (image_bytes, None), or (None, error_message) if the page could
+    not be processed.
+    """
+    # JPEGs can be decoded straight at (close to) the target size
+    draft_size = None
+    if dpi and not crop:
+        target_width = int(PAGE_WIDTH_INCHES * dpi)
+        draft_size = lambda width, height: (target_width, height * target_width // width)
+    try:
+        with tracing.span("optimize_page", file=os.path.basename(image_path)), \
+                open_image(image_path if data is None else io.BytesIO(data), draft_size) as image:
+            page = _prepare_page(image, dpi, crop, binarize)
+            with tracing.span("encode"):
+                return encode_smallest(reduce_colors(page)), None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        tracing.flush()
+
+def optimize_pdf_page(image_path, dpi=DEFAULT_DPI, crop=False, binarize=None, data=None):
+    """
+    Prepare one page for the PDF writer: the same crop, grayscale, DPI and
+    binarization steps as optimize_page, then near-bilevel pages are
+    thresholded to 1 bit (CCITT G4) and continuous-tone pages go to JPEG.
+    Returns (PdfImage, None), or (None, error_message).
+    """
+    try:
+        with tracing.span("optimize_pdf_page", file=os.path.basename(image_path)), \
+                open_image(image_path if data is None else io.BytesIO(data)) as image:
+            page = _prepare_page(image, dpi, crop, binarize)
+            with tracing.span("encode"):
+                if page.mode == '1':
+                    return encode_pdf_image(page), None
+                if page.mode == 'L' and is_near_bilevel(page):
+                    page = page.point([0 if value < 128 else 255 for value in range(256)]).convert('1')
+                    return encode_pdf_image(page), None
+                # Photos and grayscale artwork compress far better as JPEG
+                continuous = page.mode == 'L' or page.getcolors(256) is None
+                return encode_pdf_image(page, jpeg=continuous), None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        tracing.flush()
+
+def optimize_pages(image_paths, dpi=DEFAULT_DPI, crop=False, workers=None, prepare=optimize_page, stats=None,
+                   binarize=None):
+    """
+    Yield prepare(image_path, dpi, crop, binarize) results (optimize_page
+    by default, optimize_pdf_page for PDF output) for image_paths in order.
+    Files are read ahead on threads and pages prepared in parallel on a process pool
+    with one worker per core, with at most two pages per worker in flight,
+    so finished pages never pile up in memory ahead of a slower consumer
+    (see pipeline.run_pipeline; stats collects each stage's busy time).
+    With workers=1 (as inside a session build, which already runs in a
+    worker) pages are prepared in this process instead.
+    """
+    return run_pipeline(image_paths, prepare, (dpi, crop, binarize), workers=workers, stats=stats)
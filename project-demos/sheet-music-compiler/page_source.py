@@ -0,0 +1,201 @@
+import functools
+import io
+import os
+import threading
+from contextlib import contextmanager, ExitStack
+
+# A page of a multi-page file is referred to as "<file path>#page=<number>"
+# wherever a single image's path would go (image_data, caches, catalog,
+# manifests). Numbers are zero-padded so the pages of a file sort in order
+# by path
+PAGE_MARKER = "#page="
+PAGE_DIGITS = 4
+
+# Files that may hold more than one page; a TIFF with a single page keeps
+# its plain path
+MULTI_PAGE_EXTENSIONS = {'.tif', '.tiff', '.pdf'}
+PDF_EXTENSIONS = {'.pdf'}
+
+# PDF pages have no pixel size of their own; this is their "full size"
+# (previews zoomed to 100%, --dpi 0). Smaller requests render at less
+PDF_RENDER_DPI = 300
+
+# Multi-page files whose page count is remembered by path, size and mtime
+PAGE_COUNT_CACHE_SIZE = 1024
+
+# PDFium must not be called from two threads at once
+_pdf_lock = threading.Lock()
+
+def _pdfium():
+    """The optional pypdfium2 module, or None if it is not installed (PDFs are then skipped)"""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    return pypdfium2
+
+def page_ref(path, index):
+    """Reference to page index (0-based) of the multi-page file at path"""
+    return f"{path}{PAGE_MARKER}{index + 1:0{PAGE_DIGITS}d}"
+
+def split_page_ref(image_path):
+    """(file path, 0-based page index) of a page reference; (image_path, None) for a plain file"""
+    if isinstance(image_path, str):
+        path, marker, number = image_path.rpartition(PAGE_MARKER)
+        if marker and number.isdigit():
+            return path, int(number) - 1
+    return image_path, None
+
+def source_path(image_path):
+    """The file holding image_path (a path or page reference)"""
+    return split_page_ref(image_path)[0]
+
+def is_page_ref(image_path):
+    return split_page_ref(image_path)[1] is not None
+
+def is_pdf(path):
+    return os.path.splitext(path)[1].lower() in PDF_EXTENSIONS
+
+def display_name(image_path):
+    """Short name for messages and labels, e.g. 'scan.tif' or 'scan.tif (page 12)'"""
+    path, index = split_page_ref(image_path)
+    name = os.path.basename(path)
+    return name if index is None else f"{name} (page {index + 1})"
+
+def source_stat(image_path):
+    """os.stat of the file holding image_path; pages share their file's size and mtime"""
+    return os.stat(source_path(image_path))
+
+@functools.lru_cache(maxsize=PAGE_COUNT_CACHE_SIZE)
+def _page_count(path, size, mtime_ns):
+    if is_pdf(path):
+        pdfium = _pdfium()
+        if pdfium is None:
+            return 0
+        with _pdf_lock:
+            document = pdfium.PdfDocument(path)
+            try:
+                return len(document)
+            finally:
+                document.close()
+    from PIL import Image
+    with Image.open(path) as image:
+        # Walks the chain of page directories; no page is decoded
+        return getattr(image, 'n_frames', 1)
+
+def page_count(path, stat_result=None):
+    """Number of pages in the file at path without decoding any (0 if it cannot be read)"""
+    try:
+        if stat_result is None:
+            stat_result = os.stat(path)
+        return _page_count(path, stat_result.st_size, stat_result.st_mtime_ns)
+    except Exception:
+        return 0
+
+def expand_entry(path, stat_result):
+    """
+    The (image_path, stat_result) entries for the file at path: one per page
+    of a multi-page TIFF or PDF, the file itself otherwise. An unreadable
+    TIFF is listed as is so the error is reported where it is decoded; a
+    PDF that cannot be read (or without pypdfium2) is left out.
+    """
+    if os.path.splitext(path)[1].lower() not in MULTI_PAGE_EXTENSIONS:
+        return [(path, stat_result)]
+    count = page_count(path, stat_result)
+    if not is_pdf(path) and count <= 1:
+        return [(path, stat_result)]
+    return [(page_ref(path, index), stat_result) for index in range(count)]
+
+def _pdf_page_size(document, index):
+    """Size of a PDF page in pixels at PDF_RENDER_DPI"""
+    width, height = document[index].get_size()  # Points
+    return (max(1, round(width * PDF_RENDER_DPI / 72)), max(1, round(height * PDF_RENDER_DPI / 72)))
+
+def image_size(image_path):
+    """(width, height) of an image or page from its header; no pixels are decoded"""
+    from PIL import Image
+
+    path, index = split_page_ref(image_path)
+    if index is not None and is_pdf(path):
+        pdfium = _pdfium()
+        if pdfium is None:
+            raise OSError(f"pypdfium2 is needed to read {os.path.basename(path)}")
+        with _pdf_lock:
+            document = pdfium.PdfDocument(path)
+            try:
+                return _pdf_page_size(document, index)
+            finally:
+                document.close()
+    with Image.open(path) as image:
+        if index is not None:
+            image.seek(index)
+        return image.size
+
+@contextmanager
+def open_source(image_path, min_size=None):
+    """
+    Open an image, page reference or binary file object and yield
+    (image, full_size, reserved) with the pixels not yet decoded, for the
+    decode manager to load. A TIFF page is selected with seek(), so only
+    that page is decoded. A PDF page is rendered here, at just enough
+    resolution for min_size (a (width, height) or a function of the full
+    size) or at PDF_RENDER_DPI without it; its pixels are reserved in the
+    shared decode budget until the block exits, and reserved is True so
+    the decode manager does not reserve them again.
+    """
+    from PIL import Image
+
+    path, index = split_page_ref(image_path)
+    if index is None or not is_pdf(path):
+        with Image.open(path) as image:
+            if index is not None:
+                image.seek(index)
+            yield image, image.size, False
+        return
+
+    import tracing
+    from decode_manager import budget, decode_cost
+
+    pdfium = _pdfium()
+    if pdfium is None:
+        raise OSError(f"pypdfium2 is needed to read {os.path.basename(path)}")
+    with ExitStack() as stack:
+        with _pdf_lock:
+            document = pdfium.PdfDocument(path)
+            try:
+                full_size = _pdf_page_size(document, index)
+                if callable(min_size):
+                    min_size = min_size(*full_size)
+                scale = 1.0
+                if min_size:
+                    scale = min(1.0, max(min_size[0] / full_size[0], min_size[1] / full_size[1]))
+                size = (max(1, round(full_size[0] * scale)), max(1, round(full_size[1] * scale)))
+                stack.enter_context(budget.reserve(decode_cost(size, 'RGB')))
+                with tracing.span("render_pdf_page", page=index + 1):
+                    bitmap = document[index].render(scale=scale * PDF_RENDER_DPI / 72)
+                    image = bitmap.to_pil()
+            finally:
+                document.close()
+        try:
+            yield image, full_size, True
+        finally:
+            image.close()
+
+def page_bytes(image_path):
+    """
+    A page as an encoded image file (PNG) for embedding unchanged; plain
+    files are read as they are
+    """
+    path, index = split_page_ref(image_path)
+    if index is None:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    from decode_manager import open_image
+
+    buffer = io.BytesIO()
+    with open_image(image_path) as image:
+        if image.mode not in ('1', 'L', 'P', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        image.save(buffer, format='PNG')
+    return buffer.getvalue()
@@ -0,0 +1,249 @@
+import io
+import os
+import re
+import zlib
+from collections import namedtuple
+from PIL import Image, features
+
+# US Letter with half-inch margins leaves the same 7.5" picture width as the docx
+PAGE_WIDTH_PT = 612
+PAGE_HEIGHT_PT = 792
+MARGIN_PT = 36
+HEADING_SIZE_PT = 14
+HEADING_GAP_PT = 10
+
+# An image ready to be written as a PDF XObject
+PdfImage = namedtuple("PdfImage", ["width", "height", "color_space", "bits", "filter", "decode_parms", "data"])
+
+def _ccitt_g4(image):
+    """Encode a mode '1' image as raw CCITT Group 4 data (via libtiff), or None if unavailable"""
+    if not features.check('libtiff'):
+        return None
+    buffer = io.BytesIO()
+    # One strip for the whole page, so the strip is the complete G4 stream
+    image.save(buffer, format='TIFF', compression='group4', tiffinfo={278: image.height})
+    with Image.open(io.BytesIO(buffer.getvalue())) as tiff:
+        offsets = tiff.tag_v2.get(273)
+        counts = tiff.tag_v2.get(279)
+    if not offsets or len(offsets) != 1:
+        return None
+    return buffer.getvalue()[offsets[0]:offsets[0] + counts[0]]
+
+def encode_pdf_image(image, jpeg=False):
+    """
+    Encode a '1', 'L' or 'RGB' image for embedding. Bilevel images use CCITT
+    G4 (Flate on the packed bits if libtiff is missing); with jpeg the image
+    is stored with DCTDecode, otherwise Flate on the raw samples.
+    """
+    width, height = image.size
+    if image.mode == '1':
+        data = _ccitt_g4(image)
+        if data is not None:
+            # Pillow writes mode '1' TIFFs as BlackIsZero, so G4 '1' bits are black
+            parms = f"<< /K -1 /Columns {width} /Rows {height} /BlackIs1 true >>"
+            return PdfImage(width, height, "/DeviceGray", 1, "/CCITTFaxDecode", parms, data)
+        return PdfImage(width, height, "/DeviceGray", 1, "/FlateDecode", None,
+                        zlib.compress(image.tobytes(), 6))
+
+    color_space = "/DeviceGray" if image.mode == 'L' else "/DeviceRGB"
+    if jpeg:
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=85, optimize=True)
+        return PdfImage(width, height, color_space, 8, "/DCTDecode", None, buffer.getvalue())
+    return PdfImage(width, height, color_space, 8, "/FlateDecode", None,
+                    zlib.compress(image.tobytes(), 6))
+
+def _pdf_text(text):
+    """Escape text for a PDF string literal (standard fonts cover Latin-1)"""
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+class PdfWriter:
+    """
+    Minimal PDF writer that appends each page to disk as soon as it is
+    added: only the object offsets are kept in memory. Text uses the
+    built-in Helvetica fonts, so nothing needs embedding.
+
+    Like StreamingDocxWriter, the file is written to output_path +
+    '.partial' and only moved into place by close(); abort() discards it.
+
+    With append, pages are added to an existing PDF written by this class
+    as an incremental update: new objects, the page tree and a new
+    cross-reference section go after the current end of the file, so the
+    existing pages are neither read nor rewritten. abort() truncates the
+    file back to its original length.
+    """
+    def __init__(self, output_path, append=False):
+        self.output_path = output_path
+        self.offsets = {}
+        self.append = append
+        if append:
+            self.partial_path = None
+            self.file = open(output_path, 'r+b')
+            self.original_size = self.file.seek(0, os.SEEK_END)
+            self.previous_xref, self.previous_offsets, size = self._read_xref()
+            self.page_ids = [int(page) for page in
+                             re.findall(rb'(\d+) 0 R', self._read_object(2).split(b'/Kids', 1)[1].split(b']', 1)[0])]
+            self.next_id = size
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(b'\n')
+        else:
+            self.partial_path = output_path + '.partial'
+            self.file = open(self.partial_path, 'wb')
+            self.page_ids = []
+            # Objects 1 and 2 (catalog and page tree) are written last
+            self.next_id = 3
+            self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+        self.regular_font = self._write_object(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                                               b'/Encoding /WinAnsiEncoding >>')
+        self.bold_font = self._write_object(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold '
+                                            b'/Encoding /WinAnsiEncoding >>')
+
+    def _read_xref(self):
+        """
+        Follow the cross-reference sections from the end of the file back
+        through /Prev. Returns (last xref offset, {object_id: offset}, /Size).
+        """
+        self.file.seek(max(0, self.original_size - 1024))
+        tail = self.file.read()
+        start = int(re.findall(rb'startxref\s+(\d+)', tail)[-1])
+        offsets = {}
+        size = None
+        position = start
+        while position is not None:
+            # Every section is followed by its trailer and a startxref line
+            table, trailer = self._read_until(position, b'startxref').split(b'trailer', 1)
+            lines = table.split(b'\n')[1:]
+            i = 0
+            while i < len(lines) and lines[i].strip():
+                first, count = (int(value) for value in lines[i].split())
+                for object_id in range(first, first + count):
+                    entry = lines[i + 1 + object_id - first]
+                    if entry.strip().endswith(b'n'):
+                        offsets.setdefault(object_id, int(entry[:10]))
+                i += count + 1
+            if size is None:
+                size = int(re.search(rb'/Size (\d+)', trailer).group(1))
+            previous = re.search(rb'/Prev (\d+)', trailer.split(b'>>', 1)[0])
+            position = int(previous.group(1)) if previous else None
+        return start, offsets, size
+
+    def _read_until(self, position, marker):
+        """Read from position until marker has been read (or the end of the file)"""
+        # Reads must not move the write position at the end of the file
+        write_position = self.file.tell()
+        self.file.seek(position)
+        data = b''
+        while marker not in data:
+            chunk = self.file.read(4096)
+            if not chunk:
+                break
+            data += chunk
+        self.file.seek(write_position)
+        return data
+
+    def _read_object(self, object_id):
+        return self._read_until(self.previous_offsets[object_id], b'endobj').split(b'endobj', 1)[0]
+
+    def replace_text(self, old, new):
+        """Append mode: replace a line of text on the first page (e.g. the title page's page total)"""
+        page = self._read_object(self.page_ids[0])
+        content_id = int(re.search(rb'/Contents (\d+) 0 R', page).group(1))
+        stream = self._read_object(content_id)
+        data = stream[stream.index(b'stream\n') + len(b'stream\n'):stream.rindex(b'\nendstream')]
+        data = data.replace(f'({_pdf_text(old)})'.encode('latin-1'), f'({_pdf_text(new)})'.encode('latin-1'))
+        self._write_stream('', data, content_id)
+
+    def _write_object(self, body, object_id=None):
+        if object_id is None:
+            object_id = self.next_id
+            self.next_id += 1
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f'{object_id} 0 obj\n'.encode('ascii'))
+        self.file.write(body)
+        self.file.write(b'\nendobj\n')
+        return object_id
+
+    def _write_stream(self, dictionary, data, object_id=None):
+        return self._write_object(f'<< {dictionary} /Length {len(data)} >>\nstream\n'.encode('ascii')
+                                  + data + b'\nendstream', object_id)
+
+    def _text_ops(self, lines, top):
+        """Content stream operators for (text, size, bold) lines starting at top"""
+        ops = []
+        y = top
+        for text, size, bold in lines:
+            y -= size
+            font = 'F2' if bold else 'F1'
+            ops.append(f'BT /{font} {size} Tf {MARGIN_PT} {y:.2f} Td ({_pdf_text(text)}) Tj ET')
+            y -= size * 0.6
+        return ops, y
+
+    def _write_page(self, ops, xobjects=''):
+        content = self._write_stream('', '\n'.join(ops).encode('latin-1'))
+        resources = (f'<< /Font << /F1 {self.regular_font} 0 R /F2 {self.bold_font} 0 R >> '
+                     f'/XObject << {xobjects} >> >>')
+        page = self._write_object(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH_PT} {PAGE_HEIGHT_PT}] '
+            f'/Resources {resources} /Contents {content} 0 R >>'.encode('ascii'))
+        self.page_ids.append(page)
+
+    def add_text_page(self, lines):
+        """Add a page of (text, size, bold) lines, e.g. the title page"""
+        ops, _ = self._text_ops(lines, PAGE_HEIGHT_PT - MARGIN_PT)
+        self._write_page(ops)
+
+    def add_image_page(self, heading, image):
+        """Add a page with a heading and a PdfImage scaled to the page width (or height)"""
+        dictionary = (f'/Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} '
+                      f'/ColorSpace {image.color_space} /BitsPerComponent {image.bits} '
+                      f'/Filter {image.filter}')
+        if image.decode_parms:
+            dictionary += f' /DecodeParms {image.decode_parms}'
+        xobject = self._write_stream(dictionary, image.data)
+
+        ops, y = self._text_ops([(heading, HEADING_SIZE_PT, True)], PAGE_HEIGHT_PT - MARGIN_PT)
+        available_width = PAGE_WIDTH_PT - 2 * MARGIN_PT
+        available_height = y - HEADING_GAP_PT - MARGIN_PT
+        scale = min(available_width / image.width, available_height / image.height)
+        draw_width, draw_height = image.width * scale, image.height * scale
+        top = y - HEADING_GAP_PT
+        ops.append(f'q {draw_width:.2f} 0 0 {draw_height:.2f} {MARGIN_PT} {top - draw_height:.2f} cm /Im0 Do Q')
+        self._write_page(ops, f'/Im0 {xobject} 0 R')
+
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer, then move the file into place"""
+        kids = ' '.join(f'{page} 0 R' for page in self.page_ids)
+        self._write_object(f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>'.encode('ascii'), 2)
+        if not self.append:
+            self._write_object(b'<< /Type /Catalog /Pages 2 0 R >>', 1)
+
+        xref_offset = self.file.tell()
+        count = self.next_id
+        if self.append:
+            # Only the new and replaced objects, one subsection each
+            self.file.write(b'xref\n')
+            for object_id in sorted(self.offsets):
+                self.file.write(f'{object_id} 1\n{self.offsets[object_id]:010d} 00000 n \n'.encode('ascii'))
+            trailer = f'<< /Size {count} /Root 1 0 R /Prev {self.previous_xref} >>'
+        else:
+            self.file.write(f'xref\n0 {count}\n0000000000 65535 f \n'.encode('ascii'))
+            for object_id in range(1, count):
+                self.file.write(f'{self.offsets[object_id]:010d} 00000 n \n'.encode('ascii'))
+            trailer = f'<< /Size {count} /Root 1 0 R >>'
+        self.file.write(f'trailer\n{trailer}\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii'))
+        self.file.close()
+        if not self.append:
+            os.replace(self.partial_path, self.output_path)
+        return self.output_path
+
+    def abort(self):
+        """Discard the partially written file (or, when appending, the partial update)"""
+        if self.append:
+            self.file.truncate(self.original_size)
+            self.file.close()
+            return
+        self.file.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
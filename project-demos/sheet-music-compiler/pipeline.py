@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import page_source
+import tracing
+
+# Threads reading source files ahead of the workers; reading is I/O bound,
+# and two keep a local disk busy without thrashing a network drive
+READ_THREADS = 2
+
+# Pages being prepared or waiting for the writer, per worker. Files read
+# ahead are capped at the same number, so about twice this many pages per
+# worker are held in memory at most
+IN_FLIGHT_PER_WORKER = 2
+
+# Stages in pipeline order
+STAGES = ('read', 'prepare', 'write')
+
+class PipelineStats:
+    """
+    Busy time of each stage of a pipelined build: the reader threads, the
+    prepare workers and the single writer. A stage busy close to 100% of
+    the time is the bottleneck; the others spend their time waiting on it.
+    """
+    def __init__(self):
+        self.busy = dict.fromkeys(STAGES, 0.0)
+        self.items = dict.fromkeys(STAGES, 0)
+        self.slots = {'read': READ_THREADS, 'prepare': 1, 'write': 1}
+        self.wall = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.busy[stage] += seconds
+            self.items[stage] += 1
+
+    def utilization(self):
+        """{stage: share of the wall time its threads/workers were busy (0..1)}"""
+        if self.wall <= 0:
+            return dict.fromkeys(STAGES, 0.0)
+        return {stage: min(1.0, self.busy[stage] / (self.wall * self.slots[stage])) for stage in STAGES}
+
+    def bottleneck(self):
+        utilization = self.utilization()
+        return max(STAGES, key=utilization.get)
+
+    def summary(self):
+        """One line, e.g. 'read 6% of 2 threads, prepare 97% of 4 workers, write 11% - bottleneck: prepare'"""
+        utilization = self.utilization()
+        parts = [f"read {utilization['read']:.0%} of {self.slots['read']} threads"]
+        if self.items['prepare']:
+            workers = self.slots['prepare']
+            parts.append(f"prepare {utilization['prepare']:.0%} of {workers} worker{'s' if workers != 1 else ''}")
+        parts.append(f"write {utilization['write']:.0%}")
+        return ", ".join(parts) + f" - bottleneck: {self.bottleneck()}"
+
+def _read(image_path, whole_pages):
+    """
+    Reader thread: the file's bytes (None if unreadable; prepare reports the
+    error) and the time taken. Pages of multi-page files are not read here,
+    so a 300-page scan is not loaded once per page: prepare opens the page
+    itself (None), or with whole_pages the page is encoded on its own.
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.span("read_file", file=page_source.display_name(image_path)):
+            if page_source.is_page_ref(image_path):
+                data = page_source.page_bytes(image_path) if whole_pages else None
+            else:
+                with open(image_path, 'rb') as f:
+                    data = f.read()
+        if data is not None:
+            tracing.count("bytes_read", len(data))
+    except OSError:
+        data = None
+    return data, time.perf_counter() - start
+
+def _timed(prepare, image_path, data, args):
+    """Worker: prepare(image_path, *args, data=data) and the time it took"""
+    start = time.perf_counter()
+    result = prepare(image_path, *args, data=data)
+    return result, time.perf_counter() - start
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def run_pipeline(image_paths, prepare=None, args=(), workers=None, stats=None):
+    """
+    Yield prepare(image_path, *args, data=file_bytes) for every path, in
+    order, with the stages overlapping: reader threads load files ahead,
+    a process pool (one worker per core) prepares pages, and the caller
+    consumes the results as the single ordered writer. Each stage hands
+    over through a bounded queue, so a slow writer stalls the workers and
+    readers instead of letting pages pile up in memory.
+    Without prepare, (file_bytes, None) is yielded for each path (the path
+    itself if the file could not be read); a page of a multi-page file is
+    yielded as a PNG of that page. With workers=1, pages are
+    prepared in this process. Stage busy times are added to stats (a
+    PipelineStats) if given.
+    """
+    image_paths = list(image_paths)
+    stats = stats if stats is not None else PipelineStats()
+    workers = workers or os.cpu_count() or 1
+    inline = prepare is None or workers == 1 or len(image_paths) <= 1
+    stats.slots['prepare'] = 1 if inline else workers
+    limit = workers * IN_FLIGHT_PER_WORKER
+    start = time.perf_counter()
+
+    readers = ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix="read")
+    pool = None if inline else ProcessPoolExecutor(max_workers=workers)
+    reads = deque()  # (image_path, future of (data, seconds))
+    pending = deque()  # futures of (result, seconds), in page order
+    try:
+        next_index = 0
+        while next_index < len(image_paths) or reads or pending:
+            # Readers run at most limit files ahead of the workers
+            while next_index < len(image_paths) and len(reads) < limit:
+                image_path = image_paths[next_index]
+                reads.append((image_path, readers.submit(_read, image_path, prepare is None)))
+                next_index += 1
+
+            # Hand read files to the workers while they have room; only wait
+            # for a read when the workers would otherwise run dry
+            while reads and len(pending) < limit and (reads[0][1].done() or not pending):
+                image_path, read = reads.popleft()
+                data, seconds = read.result()
+                stats.add('read', seconds)
+                if prepare is None:
+                    pending.append(_done(((image_path if data is None else data, None), 0.0)))
+                elif inline:
+                    pending.append(_done(_timed(prepare, image_path, data, args)))
+                else:
+                    pending.append(pool.submit(_timed, prepare, image_path, data, args))
+
+            if pending:
+                result, seconds = pending.popleft().result()
+                if prepare is not None:
+                    stats.add('prepare', seconds)
+                write_start = time.perf_counter()
+                yield result
+                stats.add('write', time.perf_counter() - write_start)
+    finally:
+        # The consumer stopped early (cancelled or failed): drop queued work
+        for _, read in reads:
+            read.cancel()
+        for future in pending:
+            future.cancel()
+        readers.shutdown(wait=True)
+        if pool is not None:
+            pool.shutdown(wait=True)
+        stats.wall += time.perf_counter() - start
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".sheet_music_compiler")
+
+# Entries not seen by any scan for this long are dropped
+MAX_AGE_DAYS = 90
+
+ScanEntry = namedtuple("ScanEntry", ["date_time", "width", "height", "is_sheet", "score", "dhash"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    date_time TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    is_sheet INTEGER,
+    score REAL,
+    dhash TEXT,
+    last_seen REAL NOT NULL
+)
+"""
+
+# Columns added after the first release, created on older cache files
+ADDED_COLUMNS = {"dhash": "TEXT"}
+
+class ScanCache:
+    """
+    On-disk cache of per-image scan results (resolved date, pixel size and
+    sheet-music verdict), keyed by path and validated against file size and
+    mtime so unchanged files never need to be opened again.
+    """
+    def __init__(self, db_path=None, max_age_days=MAX_AGE_DAYS):
+        if db_path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            db_path = os.path.join(CACHE_DIR, "scan_cache.sqlite3")
+        self.db_path = db_path
+        self.max_age_days = max_age_days
+        # The GUI scans on a background thread; calls never overlap
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(scan)")}
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE scan ADD COLUMN {column} {column_type}")
+        self.conn.commit()
+
+    def get(self, image_path, stat_result):
+        """Return the cached ScanEntry, or None if missing or stale"""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, date_time, width, height, is_sheet, score, dhash FROM scan WHERE path = ?",
+            (image_path,)).fetchone()
+        if row is None:
+            return None
+
+        size, mtime_ns, date_time, width, height, is_sheet, score, dhash = row
+        if size != stat_result.st_size or mtime_ns != stat_result.st_mtime_ns:
+            # File changed since it was cached
+            self.conn.execute("DELETE FROM scan WHERE path = ?", (image_path,))
+            return None
+
+        return ScanEntry(datetime.fromisoformat(date_time), width, height,
+                         None if is_sheet is None else bool(is_sheet), score,
+                         None if dhash is None else int(dhash, 16))
+
+    def get_many(self, items):
+        """Look up (image_path, stat_result) pairs; returns {path: ScanEntry} for fresh hits"""
+        hits = {}
+        for image_path, stat_result in items:
+            entry = self.get(image_path, stat_result)
+            if entry is not None:
+                hits[image_path] = entry
+        self.conn.commit()
+        return hits
+
+    def put_many(self, items):
+        """Store (image_path, stat_result, date_time, width, height) tuples"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO scan (path, size, mtime_ns, date_time, width, height, "
+            "is_sheet, score, dhash, last_seen) VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, NULL, ?)",
+            [(image_path, st.st_size, st.st_mtime_ns, date_time.isoformat(), width, height, now)
+             for image_path, st, date_time, width, height in items])
+        self.conn.commit()
+
+    def put_classification(self, items):
+        """Store (image_path, is_sheet, score, dhash) results for already cached paths"""
+        # Hashes are wider than SQLite integers, so they are stored as hex
+        self.conn.executemany(
+            "UPDATE scan SET is_sheet = ?, score = ?, dhash = ? WHERE path = ?",
+            [(int(is_sheet), score, None if dhash is None else format(dhash, 'x'), image_path)
+             for image_path, is_sheet, score, dhash in items])
+        self.conn.commit()
+
+    def touch(self, image_paths):
+        """Mark paths as seen by the current scan"""
+        now = time.time()
+        self.conn.executemany("UPDATE scan SET last_seen = ? WHERE path = ?",
+                              [(now, image_path) for image_path in image_paths])
+        self.conn.commit()
+
+    def prune(self, folder=None, seen=()):
+        """
+        Drop entries under folder that the latest scan did not see (deleted or
+        renamed files), plus anything not seen for max_age_days.
+        """
+        if folder is not None:
+            prefix = os.path.join(os.path.abspath(folder), "")
+            seen = set(seen)
+            stale = [(path,) for (path,) in self.conn.execute(
+                         "SELECT path FROM scan WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+                     if path not in seen and os.path.dirname(path) == prefix[:-1]]
+            self.conn.executemany("DELETE FROM scan WHERE path = ?", stale)
+
+        cutoff = time.time() - self.max_age_days * 86400
+        self.conn.execute("DELETE FROM scan WHERE last_seen < ?", (cutoff,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -1,105 +1,359 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
-from datetime import datetime
-from PIL import Image, ImageTk
-from PIL.ExifTags import TAGS
-import docx
-from docx.shared import Inches
-import glob
-import numpy as np
-from collections import Counter
+import sys
+import queue
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter, OrderedDict
+from scan_cache import ScanCache
+from thumbnail_cache import ThumbnailCache
+from display_cache import DisplayImageCache
+from tile_pyramid import TileStore
+from catalog import Catalog, CatalogRange, date_range, parse_date
+from compiler_core import (find_image_files, get_image_date, is_sheet_music_score, build_sessions,
+                           CompileCancelled, OUTPUT_BUILDERS, DEFAULT_BINARIZE_METHOD, compilation_filename,
+                           run_cli)
+from sessions import find_sessions
+from page_source import display_name, image_size
+import tracing
 
-def is_sheet_music(image_path):
+# The processing itself lives in compiler_core, which runs without a display
+
+# Virtualized thumbnail grid layout
+GRID_COLUMNS = 3
+GRID_CELL_HEIGHT = 250
+GRID_OVERSCAN_ROWS = 2  # Rows built above/below the viewport
+THUMBNAIL_WORKERS = min(8, os.cpu_count() or 1)
+THUMBNAILS_IN_MEMORY = 600  # Decoded thumbnails kept for scrolling back
+
+# Boxes that preview images are scaled to fit
+FULL_PREVIEW_SIZE = (750, 550)
+REVIEW_PREVIEW_SIZE = (600, 400)
+
+# Zoom limits relative to full size, and the step of one wheel notch or +/- press
+MAX_ZOOM = 4.0
+ZOOM_STEP = 1.25
+
+class ThumbnailCell:
+    """One reusable grid cell; bound to a different image as the grid scrolls"""
+    def __init__(self, grid):
+        self.grid = grid
+        self.index = None
+        self.var = tk.BooleanVar()
+        
+        self.frame = tk.Frame(grid.canvas, bg='#404040', relief='raised', bd=2)
+        self.checkbox = ttk.Checkbutton(self.frame, text="Include", variable=self.var,
+                                        command=self.toggled)
+        self.checkbox.pack(pady=2)
+        
+        self.img_label = tk.Label(self.frame, bg='#404040', fg='white', height=180 // 16)
+        self.img_label.pack(pady=5)
+        self.img_label.bind('<Button-1>', lambda e: self.grid.show_full_size_preview(self.index))
+        
+        self.info_label = tk.Label(self.frame, bg='#404040', fg='white', font=('Arial', 8))
+        self.info_label.pack(pady=2)
+        
+        self.window_id = grid.canvas.create_window(0, 0, window=self.frame, anchor='nw')
+    
+    def bind(self, index):
+        self.index = index
+        date_time, image_path = self.grid.image_data[index]
+        self.var.set(self.grid.selected[index])
+        caption = f"Screenshot {index+1}\n{date_time.strftime('%m/%d %H:%M')}"
+        if index in self.grid.duplicates:
+            caption += f" - duplicate of {self.grid.duplicates[index] + 1}"
+        self.info_label.config(text=caption, fg='orange' if index in self.grid.duplicates else 'white')
+        self.show_thumbnail()
+    
+    def show_thumbnail(self):
+        """Show the decoded thumbnail, a placeholder, or the load error"""
+        thumbnails = self.grid.thumbnails
+        if self.index not in thumbnails:
+            self.img_label.config(image='', text="Loading...", fg='white', height=180 // 16)
+            self.img_label.image = None
+            self.checkbox.config(state='normal')
+        elif thumbnails[self.index] is None:
+            image_path = self.grid.image_data[self.index][1]
+            self.img_label.config(image='', text=f"Error loading\n{display_name(image_path)}",
+                                  fg='red', height=180 // 16)
+            self.img_label.image = None
+            self.checkbox.config(state='disabled')
+        else:
+            from PIL import ImageTk  # Loaded with the first thumbnail, not at startup
+            photo = ImageTk.PhotoImage(thumbnails[self.index])
+            self.img_label.config(image=photo, text='', height=0)
+            self.img_label.image = photo  # Keep reference
+            self.checkbox.config(state='normal')
+    
+    def toggled(self):
+        self.grid.selected[self.index] = self.var.get()
+        self.grid.update_selection(self.index, self.var)
+    
+    def place(self, x, y, width):
+        self.grid.canvas.coords(self.window_id, x, y)
+        self.grid.canvas.itemconfigure(self.window_id, width=width,
+                                       height=GRID_CELL_HEIGHT - 10, state='normal')
+    
+    def hide(self):
+        self.index = None
+        self.img_label.config(image='')
+        self.img_label.image = None
+        self.grid.canvas.itemconfigure(self.window_id, state='hidden')
+
+class ZoomView:
     """
-    Detect if an image is likely to be sheet music based on visual characteristics.
-    Returns True if the image appears to be sheet music, False otherwise.
+    Zoom and pan for one image on a canvas. The fitted preview comes from
+    the display cache; once zoomed in, the view is drawn from a tile
+    pyramid (see tile_pyramid), and only the tiles in view are loaded, on a
+    background thread, so large stitched pages stay smooth.
+    The mouse wheel zooms around the pointer and +/- around the centre,
+    dragging pans, and a double click or 0 returns to the fitted view.
     """
-    try:
-        # Open and convert image to grayscale for analysis
-        image = Image.open(image_path)
-        
-        # Convert to grayscale for analysis
-        gray_image = image.convert('L')
-        
-        # Resize to standard size for analysis (faster processing)
-        gray_image = gray_image.resize((400, 600), Image.Resampling.LANCZOS)
-        
-        # Convert to numpy array
-        img_array = np.array(gray_image)
-        
-        # Calculate some basic characteristics
-        height, width = img_array.shape
-        
-        # Check aspect ratio (sheet music is typically taller than wide)
-        aspect_ratio = height / width
-        if aspect_ratio < 1.2:  # Too wide, probably not sheet music
-            return False
-        
-        # Analyze pixel distribution
-        # Sheet music typically has:
-        # 1. High contrast (black notes/staff lines on white background)
-        # 2. Many horizontal lines (staff lines)
-        # 3. Small black elements (notes, symbols)
-        
-        # Calculate contrast
-        pixel_std = np.std(img_array)
-        if pixel_std < 30:  # Low contrast, probably not sheet music
-            return False
-        
-        # Look for horizontal lines (staff lines)
-        # Apply horizontal edge detection
-        horizontal_edges = np.abs(np.diff(img_array, axis=1))
-        horizontal_strength = np.mean(horizontal_edges)
-        
-        # Look for vertical elements (note stems, bar lines)
-        vertical_edges = np.abs(np.diff(img_array, axis=0))
-        vertical_strength = np.mean(vertical_edges)
-        
-        # Sheet music should have more horizontal structure (staff lines)
-        if horizontal_strength > vertical_strength * 1.2:
-            return True
-        
-        # Additional check: look for repetitive horizontal patterns
-        # Sample horizontal lines and check for staff-like patterns
-        sample_lines = []
-        for i in range(0, height, height // 10):
-            line = img_array[i, :]
-            sample_lines.append(line)
-        
-        # Check if we have the typical 5-line staff pattern
-        staff_pattern_score = 0
-        for line in sample_lines:
-            # Look for lines with alternating light/dark patterns
-            line_variation = np.std(line)
-            if line_variation > 20:  # Significant variation suggests staff lines
-                staff_pattern_score += 1
-        
-        if staff_pattern_score >= 3:  # Multiple lines with staff-like patterns
-            return True
-        
-        # If we get here, it's probably not sheet music
-        return False
-        
-    except Exception as e:
-        # If we can't analyze the image, assume it might be sheet music
-        # (better to include than exclude)
-        return True
+    def __init__(self, canvas, box, display_cache, tile_store):
+        self.canvas = canvas
+        self.box = box
+        self.display_cache = display_cache
+        self.tile_store = tile_store
+        self.image_path = None
+        self.pyramid = None
+        self.fit_photo = None
+        self.full_size = (1, 1)
+        self.fit_scale = 1.0
+        self.scale = 1.0  # Display pixels per image pixel
+        self.left = self.top = 0.0  # Image pixel at the canvas origin
+        self.drag_start = None
+        
+        # Tiles are loaded (and levels built) off the mainloop, newest request first
+        self.photos = {}  # (level, col, row) -> PhotoImage at the current scale
+        self.failed = set()  # (level, col, row) that could not be loaded
+        self.requested = set()
+        self.request_queue = queue.LifoQueue()
+        self.result_queue = queue.Queue()
+        self.closed = False
+        threading.Thread(target=self.tile_worker, daemon=True).start()
+        
+        canvas.bind('<MouseWheel>', lambda e: self.on_wheel(e, 1 if e.delta > 0 else -1))
+        canvas.bind('<Button-4>', lambda e: self.on_wheel(e, 1))  # X11 wheel
+        canvas.bind('<Button-5>', lambda e: self.on_wheel(e, -1))
+        canvas.bind('<ButtonPress-1>', self.on_press)
+        canvas.bind('<B1-Motion>', self.on_drag)
+        canvas.bind('<Double-Button-1>', lambda e: self.fit())
+        canvas.bind('<Configure>', lambda e: self.render())
+        canvas.bind('<Destroy>', self.on_destroy)
+        top = canvas.winfo_toplevel()
+        for key in ('<plus>', '<equal>', '<KP_Add>'):
+            top.bind(key, lambda e: self.zoom(ZOOM_STEP))
+        for key in ('<minus>', '<KP_Subtract>'):
+            top.bind(key, lambda e: self.zoom(1 / ZOOM_STEP))
+        top.bind('<Key-0>', lambda e: self.fit())
+        canvas.after(30, self.poll_tiles)
+    
+    def view_size(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        return (width, height) if width > 1 and height > 1 else self.box
+    
+    def show(self, image_path):
+        """Show image_path fitted to the view; raises if it cannot be loaded"""
+        from PIL import ImageTk
+        self.image_path = None
+        display_image = self.display_cache.get(image_path, self.box)
+        self.full_size = image_size(image_path)  # Header only
+        self.fit_photo = ImageTk.PhotoImage(display_image)
+        self.image_path = image_path
+        self.pyramid = None
+        self.photos.clear()
+        self.failed.clear()
+        self.fit()
+    
+    def fit(self):
+        if self.image_path is None:
+            return
+        width, height = self.full_size
+        self.fit_scale = self.fit_photo.width() / width
+        self.set_view(self.fit_scale, *self.centered(self.fit_scale))
+    
+    def centered(self, scale):
+        view_width, view_height = self.view_size()
+        width, height = self.full_size
+        return width / 2 - view_width / 2 / scale, height / 2 - view_height / 2 / scale
+    
+    def zoom(self, factor, x=None, y=None):
+        """Zoom by factor, keeping the image point under canvas position (x, y) in place"""
+        if self.image_path is None:
+            return
+        view_width, view_height = self.view_size()
+        x = view_width / 2 if x is None else x
+        y = view_height / 2 if y is None else y
+        scale = min(MAX_ZOOM, max(self.fit_scale, self.scale * factor))
+        # The image point under the pointer before and after
+        image_x, image_y = self.left + x / self.scale, self.top + y / self.scale
+        self.set_view(scale, image_x - x / scale, image_y - y / scale)
+    
+    def set_view(self, scale, left, top):
+        """Move to scale and origin, keeping the image on screen (centered when smaller than the view)"""
+        view_width, view_height = self.view_size()
+        width, height = self.full_size
+        visible_width, visible_height = view_width / scale, view_height / scale
+        left = (width - visible_width) / 2 if visible_width >= width else min(max(0, left), width - visible_width)
+        top = (height - visible_height) / 2 if visible_height >= height else min(max(0, top), height - visible_height)
+        if scale != self.scale:
+            self.photos.clear()
+        self.scale, self.left, self.top = scale, left, top
+        self.render()
+    
+    def on_wheel(self, event, direction):
+        self.zoom(ZOOM_STEP if direction > 0 else 1 / ZOOM_STEP, event.x, event.y)
+        return 'break'  # Keep the grid behind from scrolling too
+    
+    def on_press(self, event):
+        self.drag_start = (event.x, event.y, self.left, self.top)
+    
+    def on_drag(self, event):
+        if self.drag_start is None or self.image_path is None:
+            return
+        x, y, left, top = self.drag_start
+        self.set_view(self.scale, left - (event.x - x) / self.scale, top - (event.y - y) / self.scale)
+    
+    def render(self):
+        """Redraw the view: the fitted preview, or the tiles of the level matching the zoom"""
+        if self.image_path is None or self.closed:
+            return
+        self.canvas.delete('all')
+        view_width, view_height = self.view_size()
+        if abs(self.scale - self.fit_scale) < 1e-6:
+            self.canvas.create_image(view_width // 2, view_height // 2, image=self.fit_photo)
+            return
+        
+        if self.pyramid is None:
+            self.pyramid = self.tile_store.pyramid(self.image_path)
+        pyramid = self.pyramid
+        level = pyramid.level_for_scale(self.scale)
+        level_scale = 2 ** level
+        tile_span = pyramid.tile_size * level_scale  # Image pixels covered by one tile
+        missing = False
+        visible = pyramid.visible_tiles(level, self.left, self.top, self.left + view_width / self.scale,
+                                        self.top + view_height / self.scale)
+        # Only the tiles in view keep their PhotoImages
+        for key in [key for key in self.photos if key[0] != level or key[1:] not in visible]:
+            del self.photos[key]
+        for col, row in visible:
+            if (level, col, row) in self.failed:
+                continue
+            x = round((col * tile_span - self.left) * self.scale)
+            y = round((row * tile_span - self.top) * self.scale)
+            photo = self.photos.get((level, col, row))
+            if photo is None:
+                tile = pyramid.cached_tile(level, col, row)
+                if tile is not None:
+                    photo = self.tile_photo(tile, level)
+                    self.photos[(level, col, row)] = photo
+                else:
+                    missing = True
+                    self.request((self.image_path, self.scale, level, col, row))
+                    continue
+            self.canvas.create_image(x, y, image=photo, anchor='nw')
+        if missing:
+            self.canvas.create_text(view_width // 2, view_height // 2, text="Loading...", fill='gray')
+        zoom_text = f"{self.scale:.0%}"
+        self.canvas.create_text(view_width - 8, view_height - 8, text=zoom_text, anchor='se', fill='gray')
+    
+    def tile_photo(self, tile, level):
+        from PIL import Image, ImageTk
+        factor = self.scale * 2 ** level
+        size = (max(1, round(tile.width * factor)), max(1, round(tile.height * factor)))
+        if size != tile.size:
+            tile = tile.resize(size, Image.Resampling.BILINEAR)
+        return ImageTk.PhotoImage(tile)
+    
+    def request(self, key):
+        if key not in self.requested:
+            self.requested.add(key)
+            self.request_queue.put((key, self.pyramid))
+    
+    def tile_worker(self):
+        """Background thread: load (or build the level of) requested tiles"""
+        while not self.closed:
+            try:
+                key, pyramid = self.request_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            image_path, scale, level, col, row = key
+            if (image_path, scale) != (self.image_path, self.scale):
+                # Zoomed or moved on to another image before we got to it
+                self.result_queue.put(key)
+                continue
+            try:
+                with tracing.span("tile", level=level):
+                    pyramid.tile(level, col, row)
+            except Exception:
+                self.failed.add((level, col, row))
+            self.result_queue.put(key)
+    
+    def poll_tiles(self):
+        """Mainloop side of the worker: redraw once requested tiles are in memory"""
+        if self.closed:
+            return
+        finished = False
+        while True:
+            try:
+                key = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.requested.discard(key)
+            finished = True
+        if finished:
+            self.render()
+        self.canvas.after(30, self.poll_tiles)
+    
+    def on_destroy(self, event):
+        if event.widget is self.canvas:
+            self.closed = True
 
 class GridPreviewWindow:
-    def __init__(self, parent, image_data, callback):
+    def __init__(self, parent, image_data, callback, thumbnail_cache=None, preselected=None,
+                 duplicates=None, display_cache=None, tile_store=None):
         self.parent = parent
-        self.image_data = image_data.copy()
+        # A list or a CatalogRange (rows fetched page by page); only ever indexed, never modified
+        self.image_data = image_data
         self.callback = callback
-        self.selected_images = {}  # Track which images are selected
+        # Track which images are selected (pages that look like sheet music start checked)
+        self.selected = list(preselected) if preselected else [False] * len(self.image_data)
+        # Repeated screenshots: index -> index of the first copy; never selected in bulk
+        self.duplicates = duplicates or {}
+        self.thumbnail_cache = thumbnail_cache or ThumbnailCache()
+        # Decoded full-size previews, shared with the main window
+        self.display_cache = display_cache or DisplayImageCache()
+        # Zoom tiles of the full-size preview
+        self.tile_store = tile_store or TileStore()
+        
+        # Only cells near the viewport exist; they are recycled while scrolling
+        self.active_cells = {}  # index -> ThumbnailCell
+        self.free_cells = []
+        self.visible_indices = range(0)
+        
+        # Thumbnails are decoded by worker threads and handed over through a queue
+        self.thumbnails = OrderedDict()  # index -> PIL image, or None on error
+        self.requested = set()
+        self.request_queue = queue.Queue()
+        self.result_queue = queue.Queue()
+        self.closed = False
         
         self.preview_window = tk.Toplevel(parent)
         self.preview_window.title("Select Sheet Music Pages")
         self.preview_window.geometry("1000x700")
         self.preview_window.configure(bg='#2b2b2b')
+        self.preview_window.bind('<Destroy>', self.on_destroy)
         
         self.setup_grid_ui()
+        self.update_selection(0, None)
+        
+        for _ in range(THUMBNAIL_WORKERS):
+            threading.Thread(target=self.thumbnail_worker, daemon=True).start()
+        
         self.display_thumbnails()
+        self.preview_window.after(30, self.poll_thumbnails)
         
     def setup_grid_ui(self):
         # Title
@@ -108,7 +362,12 @@ class GridPreviewWindow:
         title_label.pack(pady=10)
         
         # Info label
-        self.info_label = ttk.Label(self.preview_window, text=f"Found {len(self.image_data)} screenshots - Select which ones to include")
+        info_text = f"Found {len(self.image_data)} screenshots - Select which ones to include"
+        if any(self.selected):
+            info_text += f"\n{sum(self.selected)} that look like sheet music are already selected"
+        if self.duplicates:
+            info_text += f"\n{len(self.duplicates)} repeated screenshots are marked and left out"
+        self.info_label = ttk.Label(self.preview_window, text=info_text, justify='center')
         self.info_label.pack(pady=5)
         
         # Selection controls
@@ -120,23 +379,29 @@ class GridPreviewWindow:
         ttk.Button(selection_frame, text="Select None", 
                   command=self.select_none).pack(side='left', padx=5)
         
-        # Create scrollable frame for thumbnails
-        canvas = tk.Canvas(self.preview_window, bg='#2b2b2b')
-        scrollbar = ttk.Scrollbar(self.preview_window, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas, bg='#2b2b2b')
+        # Action buttons (packed before the canvas so they keep their space)
+        button_frame = tk.Frame(self.preview_window, bg='#2b2b2b')
+        button_frame.pack(side='bottom', pady=10)
+        
+        self.compile_button = ttk.Button(button_frame, text="Compile Selected Pages (0)", 
+                                        command=self.compile_selected, state='disabled')
+        self.compile_button.pack(side='left', padx=10)
+        ttk.Button(button_frame, text="Cancel", 
+                  command=self.preview_window.destroy).pack(side='left', padx=10)
         
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        # Scrollable canvas; cells are canvas windows placed at absolute positions
+        canvas = tk.Canvas(self.preview_window, bg='#2b2b2b', highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.preview_window, orient="vertical", command=canvas.yview)
         
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        def _on_scroll(first, last):
+            scrollbar.set(first, last)
+            self.refresh_visible()
+        canvas.configure(yscrollcommand=_on_scroll)
+        canvas.bind('<Configure>', lambda e: self.display_thumbnails())
         
         canvas.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         scrollbar.pack(side="right", fill="y")
         
-        self.thumbnail_frame = scrollable_frame
         self.canvas = canvas
         
         # Bind mousewheel to canvas
@@ -144,84 +409,106 @@ class GridPreviewWindow:
             canvas.yview_scroll(int(-1*(event.delta/120)), "units")
         canvas.bind_all("<MouseWheel>", _on_mousewheel)
         
-        # Action buttons
-        button_frame = tk.Frame(self.preview_window, bg='#2b2b2b')
-        button_frame.pack(pady=10)
-        
-        self.compile_button = ttk.Button(button_frame, text="Compile Selected Pages (0)", 
-                                        command=self.compile_selected, state='disabled')
-        self.compile_button.pack(side='left', padx=10)
-        ttk.Button(button_frame, text="Cancel", 
-                  command=self.preview_window.destroy).pack(side='left', padx=10)
-        
+    @tracing.traced
     def display_thumbnails(self):
-        """Display thumbnails of all screenshots with checkboxes"""
-        # Clear existing thumbnails
-        for widget in self.thumbnail_frame.winfo_children():
-            widget.destroy()
-        
-        # Create grid of thumbnails
-        cols = 3  # 3 columns
-        for i, (date_time, image_path) in enumerate(self.image_data):
-            row = i // cols
-            col = i % cols
-            
-            # Create thumbnail frame
-            thumb_frame = tk.Frame(self.thumbnail_frame, bg='#404040', relief='raised', bd=2)
-            thumb_frame.grid(row=row, column=col, padx=5, pady=5, sticky='nsew')
+        """Lay out the virtual grid and build cells for the visible rows"""
+        rows = (len(self.image_data) + GRID_COLUMNS - 1) // GRID_COLUMNS
+        width = max(self.canvas.winfo_width(), GRID_COLUMNS)
+        self.canvas.configure(scrollregion=(0, 0, width, rows * GRID_CELL_HEIGHT),
+                              yscrollincrement=GRID_CELL_HEIGHT // 5)
+        
+        # Re-place every active cell for the current width
+        for index, cell in self.active_cells.items():
+            self.place_cell(cell, index)
+        self.refresh_visible()
+    
+    def place_cell(self, cell, index):
+        cell_width = max(self.canvas.winfo_width(), GRID_COLUMNS) // GRID_COLUMNS
+        row, col = divmod(index, GRID_COLUMNS)
+        cell.place(col * cell_width + 5, row * GRID_CELL_HEIGHT + 5, cell_width - 10)
+    
+    def refresh_visible(self):
+        """Bind cells to the rows in (or near) the viewport and recycle the rest"""
+        if self.closed or not self.image_data:
+            return
+        
+        top = self.canvas.canvasy(0)
+        bottom = top + max(self.canvas.winfo_height(), GRID_CELL_HEIGHT)
+        rows = (len(self.image_data) + GRID_COLUMNS - 1) // GRID_COLUMNS
+        first_row = max(0, int(top // GRID_CELL_HEIGHT) - GRID_OVERSCAN_ROWS)
+        last_row = min(rows - 1, int(bottom // GRID_CELL_HEIGHT) + GRID_OVERSCAN_ROWS)
+        visible = range(first_row * GRID_COLUMNS,
+                        min(len(self.image_data), (last_row + 1) * GRID_COLUMNS))
+        if visible == self.visible_indices:
+            return
+        self.visible_indices = visible
+        
+        for index in [index for index in self.active_cells if index not in visible]:
+            cell = self.active_cells.pop(index)
+            cell.hide()
+            self.free_cells.append(cell)
+        
+        for index in visible:
+            if index in self.active_cells:
+                continue
+            cell = self.free_cells.pop() if self.free_cells else ThumbnailCell(self)
+            cell.bind(index)
+            self.place_cell(cell, index)
+            self.active_cells[index] = cell
             
+            if index in self.thumbnails:
+                self.thumbnails.move_to_end(index)
+            elif index not in self.requested:
+                self.requested.add(index)
+                self.request_queue.put(index)
+    
+    def thumbnail_worker(self):
+        """Background thread: decode (or fetch cached) thumbnails for requested cells"""
+        while not self.closed:
             try:
-                # Load and resize image for thumbnail
-                image = Image.open(image_path)
-                
-                # Calculate thumbnail size
-                thumb_size = 180
-                img_width, img_height = image.size
-                aspect_ratio = img_width / img_height
-                
-                if aspect_ratio > 1:
-                    thumb_width = thumb_size
-                    thumb_height = int(thumb_size / aspect_ratio)
-                else:
-                    thumb_height = thumb_size
-                    thumb_width = int(thumb_size * aspect_ratio)
-                
-                # Add checkbox first
-                var = tk.BooleanVar()
-                checkbox = ttk.Checkbutton(thumb_frame, text="Include", variable=var,
-                                         command=lambda idx=i, v=var: self.update_selection(idx, v))
-                checkbox.pack(pady=2)
-                
-                # Store the checkbox variable
-                self.selected_images[i] = var
-                
-                # Resize image
-                thumb_image = image.resize((thumb_width, thumb_height), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(thumb_image)
-                
-                # Create image label
-                img_label = tk.Label(thumb_frame, image=photo, bg='#404040')
-                img_label.image = photo  # Keep reference
-                img_label.pack(pady=5)
-                
-                # Add page info
-                info_text = f"Screenshot {i+1}\n{date_time.strftime('%m/%d %H:%M')}"
-                info_label = tk.Label(thumb_frame, text=info_text, bg='#404040', 
-                                    fg='white', font=('Arial', 8))
-                info_label.pack(pady=2)
-                
-                # Add click handler for full-size preview
-                img_label.bind('<Button-1>', lambda e, idx=i: self.show_full_size_preview(idx))
-                
-            except Exception as e:
-                # Show error thumbnail
-                error_label = tk.Label(thumb_frame, text=f"Error loading\n{os.path.basename(image_path)}", 
-                                     bg='#404040', fg='red')
-                error_label.pack(pady=20)
+                index = self.request_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if index not in self.visible_indices:
+                # Scrolled away before we got to it; it is re-requested if it comes back
+                self.result_queue.put((index, False))
+                continue
+            try:
+                with tracing.span("thumbnail", index=index):
+                    thumbnail = self.thumbnail_cache.get(self.image_data[index][1])
+            except Exception:
+                thumbnail = None
+            self.result_queue.put((index, thumbnail))
+    
+    def poll_thumbnails(self):
+        """Mainloop side of the worker queue: hand finished thumbnails to their cells"""
+        if self.closed:
+            return
         
-        # Configure grid weights
-        for i in range(cols):
-            self.thumbnail_frame.columnconfigure(i, weight=1)
+        while True:
+            try:
+                index, thumbnail = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.requested.discard(index)
+            if thumbnail is False:
+                if index in self.active_cells:
+                    self.requested.add(index)
+                    self.request_queue.put(index)
+                continue
+            
+            self.thumbnails[index] = thumbnail
+            while len(self.thumbnails) > THUMBNAILS_IN_MEMORY:
+                self.thumbnails.popitem(last=False)
+            if index in self.active_cells:
+                self.active_cells[index].show_thumbnail()
+        
+        self.preview_window.after(30, self.poll_thumbnails)
+    
+    def on_destroy(self, event):
+        if event.widget is self.preview_window:
+            self.closed = True
+            self.canvas.unbind_all("<MouseWheel>")
     
     def show_full_size_preview(self, index):
         """Show full-size preview of selected image"""
@@ -233,41 +520,25 @@ class GridPreviewWindow:
         preview.geometry("800x600")
         
         try:
-            image = Image.open(image_path)
-            
-            # Calculate display size
-            canvas_width = 750
-            canvas_height = 550
-            
-            img_width, img_height = image.size
-            aspect_ratio = img_width / img_height
-            
-            if aspect_ratio > canvas_width / canvas_height:
-                display_width = canvas_width
-                display_height = int(canvas_width / aspect_ratio)
-            else:
-                display_height = canvas_height
-                display_width = int(canvas_height * aspect_ratio)
-            
-            # Resize image
-            display_image = image.resize((display_width, display_height), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(display_image)
-            
-            # Create canvas with scrollbars
+            # Fitted at first; wheel to zoom in, drag to pan
+            canvas_width, canvas_height = FULL_PREVIEW_SIZE
             canvas = tk.Canvas(preview, width=canvas_width, height=canvas_height, bg='white')
-            canvas.pack(padx=10, pady=10)
-            
-            canvas.create_image(canvas_width//2, canvas_height//2, image=photo)
-            canvas.image = photo  # Keep reference
+            zoom_view = ZoomView(canvas, FULL_PREVIEW_SIZE, self.display_cache, self.tile_store)
+            zoom_view.show(image_path)
+            canvas.pack(padx=10, pady=10, fill='both', expand=True)
             
         except Exception as e:
             error_label = tk.Label(preview, text=f"Error loading image:\n{str(e)}", 
                                  fg='red', font=('Arial', 12))
             error_label.pack(pady=50)
+        
+        # Neighbouring pages are the likeliest to be opened next
+        neighbours = [self.image_data[i][1] for i in (index + 1, index - 1) if 0 <= i < len(self.image_data)]
+        self.display_cache.prefetch(neighbours, FULL_PREVIEW_SIZE)
     
     def update_selection(self, index, var):
         """Update the selection count and button state"""
-        selected_count = sum(1 for v in self.selected_images.values() if v.get())
+        selected_count = sum(self.selected)
         self.compile_button.config(text=f"Compile Selected Pages ({selected_count})")
         
         if selected_count > 0:
@@ -275,24 +546,23 @@ class GridPreviewWindow:
         else:
             self.compile_button.config(state='disabled')
     
+    def set_all(self, value):
+        self.selected = [value and i not in self.duplicates for i in range(len(self.image_data))]
+        for index, cell in self.active_cells.items():
+            cell.var.set(self.selected[index])
+        self.update_selection(0, None)
+    
     def select_all(self):
         """Select all images"""
-        for var in self.selected_images.values():
-            var.set(True)
-        self.update_selection(0, None)
+        self.set_all(True)
     
     def select_none(self):
         """Deselect all images"""
-        for var in self.selected_images.values():
-            var.set(False)
-        self.update_selection(0, None)
+        self.set_all(False)
     
     def compile_selected(self):
         """Compile only the selected images in chronological order"""
-        selected_data = []
-        for i, var in self.selected_images.items():
-            if var.get():
-                selected_data.append(self.image_data[i])
+        selected_data = [item for item, selected in zip(self.image_data, self.selected) if selected]
         
         if selected_data:
             self.callback(selected_data)
@@ -301,11 +571,13 @@ class GridPreviewWindow:
             messagebox.showwarning("No Images", "No images selected for compilation")
 
 class PreviewWindow:
-    def __init__(self, parent, image_data, callback):
+    def __init__(self, parent, image_data, callback, display_cache=None, tile_store=None):
         self.parent = parent
         self.image_data = image_data.copy()
         self.original_data = image_data.copy()
         self.callback = callback
+        self.display_cache = display_cache or DisplayImageCache()
+        self.tile_store = tile_store or TileStore()
         
         self.preview_window = tk.Toplevel(parent)
         self.preview_window.title("Review Sheet Music Images")
@@ -333,21 +605,19 @@ class PreviewWindow:
         image_frame = tk.Frame(self.preview_window, bg='#2b2b2b')
         image_frame.pack(pady=10, padx=20, fill='both', expand=True)
         
-        # Image label with scrollbars
-        canvas_frame = tk.Frame(image_frame, bg='#2b2b2b')
-        canvas_frame.pack(fill='both', expand=True)
-        
-        self.canvas = tk.Canvas(canvas_frame, bg='white', width=600, height=400)
-        self.canvas.pack(side='left', fill='both', expand=True)
-        
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(canvas_frame, orient='vertical', command=self.canvas.yview)
-        v_scrollbar.pack(side='right', fill='y')
-        self.canvas.configure(yscrollcommand=v_scrollbar.set)
+        # Image canvas; wheel or +/- to zoom, drag to pan, double click to fit
+        canvas_width, canvas_height = REVIEW_PREVIEW_SIZE
+        self.canvas = tk.Canvas(image_frame, bg='white', width=canvas_width, height=canvas_height)
+        self.canvas.pack(fill='both', expand=True)
+        self.zoom_view = ZoomView(self.canvas, REVIEW_PREVIEW_SIZE, self.display_cache, self.tile_store)
         
-        h_scrollbar = ttk.Scrollbar(image_frame, orient='horizontal', command=self.canvas.xview)
-        h_scrollbar.pack(side='bottom', fill='x')
-        self.canvas.configure(xscrollcommand=h_scrollbar.set)
+        zoom_frame = tk.Frame(image_frame, bg='#2b2b2b')
+        zoom_frame.pack(pady=5)
+        ttk.Button(zoom_frame, text="Zoom In",
+                   command=lambda: self.zoom_view.zoom(ZOOM_STEP)).pack(side='left', padx=5)
+        ttk.Button(zoom_frame, text="Zoom Out",
+                   command=lambda: self.zoom_view.zoom(1 / ZOOM_STEP)).pack(side='left', padx=5)
+        ttk.Button(zoom_frame, text="Fit", command=self.zoom_view.fit).pack(side='left', padx=5)
         
         # Navigation controls
         nav_frame = tk.Frame(self.preview_window, bg='#2b2b2b')
@@ -382,45 +652,20 @@ class PreviewWindow:
         self.info_label.config(text=f"Image {self.current_index + 1} of {len(self.image_data)} - {date_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
         try:
-            # Load and resize image for display
-            image = Image.open(image_path)
-            
-            # Calculate display size while maintaining aspect ratio
-            canvas_width = 600
-            canvas_height = 400
-            
-            img_width, img_height = image.size
-            aspect_ratio = img_width / img_height
-            
-            if aspect_ratio > canvas_width / canvas_height:
-                # Image is wider
-                display_width = canvas_width
-                display_height = int(canvas_width / aspect_ratio)
-            else:
-                # Image is taller
-                display_height = canvas_height
-                display_width = int(canvas_height * aspect_ratio)
-            
-            # Resize image
-            display_image = image.resize((display_width, display_height), Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage
-            photo = ImageTk.PhotoImage(display_image)
-            
-            # Clear canvas and add image
-            self.canvas.delete("all")
-            self.canvas.create_image(canvas_width//2, canvas_height//2, image=photo)
-            
-            # Update scroll region
-            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-            
-            # Keep reference to prevent garbage collection
-            self.canvas.image = photo
+            # Resized images are cached, so moving back and forth (or
+            # reordering) does not decode them again; zooming in loads tiles
+            self.zoom_view.show(image_path)
             
         except Exception as e:
+            self.zoom_view.image_path = None
             self.canvas.delete("all")
             self.canvas.create_text(300, 200, text=f"Error loading image:\n{str(e)}", 
                                    fill="red", font=('Arial', 12))
+        
+        # Decode the next and previous images while this one is looked at
+        neighbours = [self.image_data[i][1] for i in (self.current_index + 1, self.current_index - 1)
+                      if 0 <= i < len(self.image_data)]
+        self.display_cache.prefetch(neighbours, REVIEW_PREVIEW_SIZE)
     
     def prev_image(self):
         if self.current_index > 0:
@@ -468,7 +713,7 @@ class ScreenshotCompiler:
     def __init__(self, root):
         self.root = root
         self.root.title("Sheet Music Compiler")
-        self.root.geometry("500x300")
+        self.root.geometry("500x615")
         self.root.configure(bg='#2b2b2b')
         
         # Configure style for dark theme
@@ -477,12 +722,34 @@ class ScreenshotCompiler:
         style.configure('TButton', background='#404040', foreground='white')
         style.configure('TLabel', background='#2b2b2b', foreground='white')
         style.configure('TCheckbutton', background='#2b2b2b', foreground='white')
+        style.configure('TRadiobutton', background='#2b2b2b', foreground='white')
         
         # Fixed folder paths
         self.source_folder = "/Users/sondrahealyhathaway/Desktop/Screenshots"
         self.output_folder = "/Users/sondrahealyhathaway/Documents/Personal/Sheet Music"
         
+        # Cache of dates/dimensions so unchanged screenshots are not reopened
+        self.scan_cache = ScanCache()
+        
+        # Every source folder's screenshots by capture time; the grid pages through one date range
+        self.catalog = Catalog()
+        
+        # Grid thumbnails persist between runs too
+        self.thumbnail_cache = ThumbnailCache()
+        
+        # Resized preview images, kept in memory across selection windows
+        self.display_cache = DisplayImageCache()
+        
+        # Zoomed-in previews are drawn from tiles stored in ~/.sheet_music_compiler/tiles
+        self.tile_store = TileStore()
+        
+        # Scanning and compiling run on a worker thread (see run_task)
+        self.task = None
+        self.task_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def setup_ui(self):
         # Main title
@@ -508,158 +775,258 @@ class ScreenshotCompiler:
         output_label = ttk.Label(folder_frame, text="Output: Documents/Personal/Sheet Music")
         output_label.pack(pady=5)
         
+        # More archive folders can be added; all of them are searched recursively
+        self.folders_label = ttk.Label(folder_frame, text=self.folders_text())
+        self.folders_label.pack(pady=5)
+        ttk.Button(folder_frame, text="Add Folder...", command=self.add_folder).pack(pady=5)
+        
+        # Date range to review (blank = no limit)
+        range_frame = tk.Frame(self.root, bg='#2b2b2b')
+        range_frame.pack(pady=5)
+        ttk.Label(range_frame, text="From:").pack(side='left', padx=5)
+        self.first_day_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.first_day_var, width=11).pack(side='left')
+        ttk.Label(range_frame, text="To:").pack(side='left', padx=5)
+        self.last_day_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.last_day_var, width=11).pack(side='left')
+        ttk.Label(range_frame, text="(YYYY-MM-DD)").pack(side='left', padx=5)
+        
+        # Page options
+        self.crop_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.root, text="Trim space above and below the music",
+                        variable=self.crop_var).pack(pady=5)
+        self.stitch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.root, text="Join overlapping scrolling screenshots",
+                        variable=self.stitch_var).pack(pady=5)
+        self.sessions_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.root, text="One document per session (pauses over 30 minutes)",
+                        variable=self.sessions_var).pack(pady=5)
+        self.binarize_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.root, text="Clean up to black and white (photos and scans)",
+                        variable=self.binarize_var).pack(pady=5)
+        
+        format_frame = tk.Frame(self.root, bg='#2b2b2b')
+        format_frame.pack(pady=5)
+        self.format_var = tk.StringVar(value='docx')
+        ttk.Label(format_frame, text="Save as:").pack(side='left', padx=5)
+        ttk.Radiobutton(format_frame, text="Word document", value='docx',
+                        variable=self.format_var).pack(side='left', padx=5)
+        ttk.Radiobutton(format_frame, text="PDF", value='pdf',
+                        variable=self.format_var).pack(side='left', padx=5)
+        
         # Compile button
         self.compile_button = ttk.Button(self.root, text="Load & Review Screenshots", 
                                        command=self.load_screenshots)
         self.compile_button.pack(pady=20)
         
         # Progress bar
-        self.progress = ttk.Progressbar(self.root, mode='indeterminate')
+        self.progress = ttk.Progressbar(self.root, mode='determinate')
         self.progress.pack(pady=10, padx=50, fill='x')
         
+        # Cancel button (only enabled while scanning or compiling)
+        self.cancel_button = ttk.Button(self.root, text="Cancel", command=self.cancel_task,
+                                        state='disabled')
+        self.cancel_button.pack(pady=5)
+        
         # Status label
-        self.status_label = ttk.Label(self.root, text="Ready to load screenshots")
+        self.status_label = ttk.Label(self.root, text="Ready to load screenshots", wraplength=450,
+                                      justify='center')
         self.status_label.pack(pady=10)
         
+    def run_task(self, work, on_done, status):
+        """
+        Run work(report) on a worker thread so the window stays responsive.
+        work calls report(done, total, text) to move the progress bar and
+        update the status line; once Cancel is pressed, report raises
+        CompileCancelled instead. on_done(result) runs on the Tk thread.
+        """
+        self.cancel_event = threading.Event()
+        self.task_queue = queue.Queue()
+        self.compile_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.progress.config(value=0, maximum=1)
+        self.status_label.config(text=status)
+        
+        def report(done, total, text):
+            if self.cancel_event.is_set():
+                raise CompileCancelled()
+            self.task_queue.put(('progress', (done, total, text)))
+        
+        def run():
+            try:
+                result = work(report)
+            except CompileCancelled:
+                self.task_queue.put(('cancelled', None))
+            except Exception as e:
+                self.task_queue.put(('error', e))
+            else:
+                self.task_queue.put(('done', result))
+        
+        self.task = threading.Thread(target=run, daemon=True)
+        self.task.start()
+        self.root.after(50, self.poll_task, on_done)
+    
+    def poll_task(self, on_done):
+        """Apply the worker's latest progress, or finish once it is done"""
+        latest = None
+        while True:
+            try:
+                kind, payload = self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                latest = payload
+                continue
+            
+            self.task = None
+            self.compile_button.config(state='normal')
+            self.cancel_button.config(state='disabled')
+            if kind == 'done':
+                self.progress.config(value=self.progress['maximum'])
+                on_done(payload)
+            elif kind == 'cancelled':
+                self.progress.config(value=0)
+                self.status_label.config(text="Cancelled")
+            else:
+                self.progress.config(value=0)
+                self.status_label.config(text="Error occurred")
+                messagebox.showerror("Error", f"An error occurred: {str(payload)}")
+            return
+        
+        if latest is not None:
+            done, total, text = latest
+            self.progress.config(value=done, maximum=max(total, 1))
+            self.status_label.config(text=text)
+        self.root.after(50, self.poll_task, on_done)
+    
+    def cancel_task(self):
+        """Ask the running task to stop at its next progress report"""
+        if self.task is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state='disabled')
+            self.status_label.config(text="Cancelling...")
+    
+    def on_close(self):
+        # Let a running compile remove its partial file before exiting
+        if self.task is not None:
+            self.cancel_event.set()
+            self.task.join()
+        self.display_cache.close()
+        self.catalog.close()
+        self.root.destroy()
+    
+    def folders_text(self):
+        extra = [folder for folder in self.catalog.roots() if folder != os.path.abspath(self.source_folder)]
+        return f"Also searching: {len(extra)} more folder(s)" if extra else "Subfolders are searched too"
+    
+    def add_folder(self):
+        """Add another folder of screenshots to the catalog"""
+        folder = filedialog.askdirectory(title="Add a folder of screenshots")
+        if folder:
+            self.catalog.add_root(folder)
+            self.folders_label.config(text=self.folders_text())
+    
+    def selected_range(self):
+        """[start, end) from the From/To fields; raises ValueError for an unreadable date"""
+        first_day, last_day = (parse_date(var.get()).date() if var.get().strip() else None
+                               for var in (self.first_day_var, self.last_day_var))
+        return date_range(first_day, last_day)
+    
     def load_screenshots(self):
-        """Load screenshots from the fixed source folder"""
-        # Start progress bar
-        self.progress.start()
-        self.status_label.config(text="Loading screenshots...")
-        self.root.update()
+        """Load the screenshots of the selected dates from the source folders"""
+        # Check if source folder exists
+        if not os.path.exists(self.source_folder):
+            messagebox.showerror("Error", f"Source folder not found:\n{self.source_folder}")
+            return
         
         try:
-            # Check if source folder exists
-            if not os.path.exists(self.source_folder):
-                messagebox.showerror("Error", f"Source folder not found:\n{self.source_folder}")
-                self.progress.stop()
-                self.status_label.config(text="Ready to load screenshots")
-                return
-            
-            # Find all image files
-            image_files = self.find_image_files(self.source_folder)
+            start, end = self.selected_range()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter dates as YYYY-MM-DD")
+            return
+        self.catalog.add_root(self.source_folder)
+        
+        @tracing.traced
+        def load_screenshots(report):
+            # Only new and changed files are read and analyzed; the rest comes from the catalog
+            self.catalog.index(cache=self.scan_cache, progress=report)
+            image_data = CatalogRange(self.catalog, start, end)
+            if not image_data:
+                return None
             
-            if not image_files:
-                messagebox.showwarning("No Images", "No image files found in the screenshots folder")
-                self.progress.stop()
+            # Pre-select the pages that look like sheet music, except repeated screenshots
+            # (scores and hashes are stored in the catalog, so no file is opened here)
+            from duplicates import duplicate_groups
+            analyses = image_data.analyses()
+            duplicates = duplicate_groups([dhash for _, dhash in analyses])
+            preselected = [is_sheet_music_score(score) and i not in duplicates
+                           for i, (score, _) in enumerate(analyses)]
+            return image_data, preselected, duplicates
+        
+        def open_selection(result):
+            if result is None:
+                messagebox.showwarning("No Images", "No screenshots found in the selected dates")
                 self.status_label.config(text="Ready to load screenshots")
                 return
             
-            self.status_label.config(text=f"Found {len(image_files)} images. Sorting by date...")
-            self.root.update()
-            
-            # Sort images by date/time
-            image_data = []
-            for image_path in image_files:
-                date_time = self.get_image_date(image_path)
-                image_data.append((date_time, image_path))
-            
-            # Sort by date/time (chronological order)
-            image_data.sort(key=lambda x: x[0])
-            
-            # Stop progress bar
-            self.progress.stop()
-            self.status_label.config(text="Opening selection window...")
-            self.root.update()
-            
-            # Open grid preview window
-            GridPreviewWindow(self.root, image_data, self.compile_from_preview)
-            
+            image_data, preselected, duplicates = result
+            GridPreviewWindow(self.root, image_data, self.compile_from_preview,
+                              thumbnail_cache=self.thumbnail_cache, preselected=preselected,
+                              duplicates=duplicates, display_cache=self.display_cache,
+                              tile_store=self.tile_store)
             self.status_label.config(text="Ready to load screenshots")
-                
-        except Exception as e:
-            self.progress.stop()
-            self.status_label.config(text="Error occurred")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+        
+        self.run_task(load_screenshots, open_selection, "Loading screenshots...")
             
     def get_image_date(self, image_path):
         """Extract date/time from image metadata or file modification time"""
-        try:
-            # Try to get EXIF data first
-            image = Image.open(image_path)
-            exif_data = image._getexif()
-            
-            if exif_data:
-                for tag_id, value in exif_data.items():
-                    tag = TAGS.get(tag_id, tag_id)
-                    if tag == 'DateTime':
-                        return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-                    elif tag == 'DateTimeOriginal':
-                        return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-            
-            # Fall back to file modification time
-            timestamp = os.path.getmtime(image_path)
-            return datetime.fromtimestamp(timestamp)
-            
-        except Exception as e:
-            # If all else fails, use file modification time
-            timestamp = os.path.getmtime(image_path)
-            return datetime.fromtimestamp(timestamp)
+        return get_image_date(image_path)
     
     def find_image_files(self, folder):
         """Find all image files in the specified folder"""
-        image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.gif']
-        image_files = []
-        
-        for extension in image_extensions:
-            image_files.extend(glob.glob(os.path.join(folder, extension)))
-            image_files.extend(glob.glob(os.path.join(folder, extension.upper())))
-        
-        return image_files
-    
+        return find_image_files(folder)
     
     def compile_from_preview(self, image_data):
-        """Compile the selected images into a Word document"""
+        """Compile the selected images into a Word document or PDF (or one per session) on a worker thread"""
         if not image_data:
             messagebox.showwarning("No Images", "No images selected for compilation")
             return
+        if self.task is not None:
+            messagebox.showwarning("Busy", "Please wait for the current task to finish or cancel it")
+            return
             
         # Create output folder if it doesn't exist
         os.makedirs(self.output_folder, exist_ok=True)
-            
-        # Start progress bar
-        self.progress.start()
-        self.status_label.config(text="Creating Word document...")
-        self.root.update()
         
-        try:
-            # Create Word document
-            doc = docx.Document()
-            doc.add_heading('Sheet Music Compilation', 0)
-            doc.add_paragraph(f'Compiled on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
-            doc.add_paragraph(f'Total pages: {len(image_data)}')
-            doc.add_paragraph('')
-            
-            # Add images to document in chronological order
-            for i, (date_time, image_path) in enumerate(image_data):
-                self.status_label.config(text=f"Adding page {i+1} of {len(image_data)}...")
-                self.root.update()
-                
-                try:
-                    # Add page number
-                    doc.add_heading(f'Page {i+1}', level=2)
-                    
-                    # Add the image
-                    doc.add_picture(image_path, width=Inches(7.5))  # Larger for sheet music
-                    
-                    # Add some space
-                    doc.add_paragraph('')
-                    
-                except Exception as e:
-                    doc.add_paragraph(f'Error loading page: {os.path.basename(image_path)} - {str(e)}')
-            
-            # Save document
-            output_filename = f"Sheet_Music_Compilation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-            output_path = os.path.join(self.output_folder, output_filename)
-            
-            self.status_label.config(text="Saving document...")
-            self.root.update()
-            
-            doc.save(output_path)
-            
-            # Stop progress bar
-            self.progress.stop()
-            self.status_label.config(text="Compilation complete!")
+        output_format = self.format_var.get()
+        output_filename = compilation_filename(output_format)
+        output_path = os.path.join(self.output_folder, output_filename)
+        crop = self.crop_var.get()
+        stitch = self.stitch_var.get()
+        binarize = DEFAULT_BINARIZE_METHOD if self.binarize_var.get() else None
+        from pipeline import PipelineStats
+        stats = PipelineStats()
+        
+        @tracing.traced
+        def compile_from_preview(report):
+            with tempfile.TemporaryDirectory() as work_dir:
+                pages = image_data
+                if stitch:
+                    from stitching import stitch_screenshots
+                    pages = stitch_screenshots(
+                        image_data, work_dir,
+                        progress=lambda done, total: report(done, total,
+                                                            f"Joining screenshots ({done} of {total})..."))
+                # A cancelled build removes its partial file before CompileCancelled reaches run_task
+                OUTPUT_BUILDERS[output_format](
+                    pages, output_path, crop=crop, stats=stats, binarize=binarize,
+                    progress=lambda page, total: report(page - 1, total, f"Adding page {page} of {total}..."))
+            return output_filename
+        
+        def show_result(output_filename):
+            # How busy reading, page preparation and writing were, to show what limits the speed
+            self.status_label.config(text=f"Compilation complete!\n{stats.summary()}"
+                                     if stats.wall else "Compilation complete!")
             
             # Show success message
             result = messagebox.askyesno("Success", 
@@ -670,16 +1037,34 @@ class ScreenshotCompiler:
             
             if result:
                 os.system(f'open "{self.output_folder}"')
-                
-        except Exception as e:
-            self.progress.stop()
-            self.status_label.config(text="Error occurred")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+        
+        if self.sessions_var.get():
+            sessions = find_sessions(image_data)
+            
+            @tracing.traced
+            def compile_sessions(report):
+                # Each session becomes its own document, built side by side in worker processes
+                documents = build_sessions(
+                    sessions, self.output_folder, output_format, crop=crop, stitch=stitch, binarize=binarize,
+                    progress=lambda done, total: report(done, total, f"Finished {done} of {total} documents..."))
+                return f"{len(documents)} documents, one per session"
+            
+            self.run_task(compile_sessions, show_result, f"Creating {len(sessions)} documents...")
+            return
+        
+        self.run_task(compile_from_preview, show_result, "Creating document...")
 
-def main():
+def main(argv=None):
+    # Needed for the process pools in a frozen (PyInstaller) app
+    multiprocessing.freeze_support()
+    
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_cli(argv)
+    
     root = tk.Tk()
     app = ScreenshotCompiler(root)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
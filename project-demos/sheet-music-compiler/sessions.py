@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+# A pause this long between two screenshots starts a new session (a
+# separate piece or sitting)
+SESSION_GAP = timedelta(minutes=30)
+
+# With classifier scores, this many screenshots in a row that are not sheet
+# music also end a session, however close together they were taken
+BREAK_RUN = 5
+
+def find_sessions(image_data, gap=SESSION_GAP, scores=None, break_run=BREAK_RUN):
+    """
+    Split image_data, (date_time, image_path) pairs in chronological order,
+    into sessions: lists of consecutive pairs with no pause longer than gap.
+    With scores ({image_path: is_sheet_music}), runs of break_run or more
+    screenshots that are not sheet music split a session as well,
+    screenshots that are not sheet music are trimmed from the start and end
+    of each session, and sessions without any sheet music are dropped.
+    """
+    sessions = []
+    current = []
+    previous_time = None
+    for date_time, image_path in image_data:
+        if previous_time is not None and date_time - previous_time > gap:
+            sessions.append(current)
+            current = []
+        current.append((date_time, image_path))
+        previous_time = date_time
+    if current:
+        sessions.append(current)
+
+    if scores is None:
+        return sessions
+    return [refined for session in sessions for refined in _split_on_breaks(session, scores, break_run)]
+
+def _split_on_breaks(session, scores, break_run):
+    """Sessions left from session after cutting at long runs of non-sheet-music screenshots"""
+    result = []
+    current = []
+    run = []  # Non-sheet-music screenshots since the last sheet music page
+    for item in session:
+        if scores.get(item[1]):
+            if current and len(run) < break_run:
+                current.extend(run)
+            elif current:
+                result.append(current)
+                current = []
+            run = []
+            current.append(item)
+        else:
+            run.append(item)
+    if current:
+        result.append(current)
+    return result
+
+def session_label(session):
+    """Short description of a session's time span, e.g. '2025-01-06 09:00-10:15'"""
+    first, last = session[0][0], session[-1][0]
+    if first.date() == last.date():
+        return f"{first:%Y-%m-%d %H:%M}-{last:%H:%M}"
+    return f"{first:%Y-%m-%d %H:%M} - {last:%Y-%m-%d %H:%M}"
@@ -0,0 +1,145 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+from staff_detection import row_profiles, line_rows, geometry_from_mask
+from duplicates import dhash_batch
+from decode_manager import load_image
+import tracing
+
+# Every image is analyzed at this size so a batch stacks into one array
+ANALYSIS_SIZE = (400, 600)  # (width, height)
+
+# Scores at or above this are treated as sheet music
+SHEET_MUSIC_THRESHOLD = 0.6
+
+# Images per worker task; large enough to amortize the vectorized math
+BATCH_SIZE = 16
+
+def load_analysis_image(image_path):
+    """
+    Decode an image as an ANALYSIS_SIZE grayscale array using reduced-
+    resolution decoding (draft() for JPEG, reduce() otherwise).
+    Returns (array, aspect_ratio) where aspect_ratio is height / width of the
+    original image.
+    """
+    gray, (width, height) = load_image(image_path, ANALYSIS_SIZE, mode='L')
+    gray = gray.resize(ANALYSIS_SIZE, Image.Resampling.BILINEAR)
+    return np.asarray(gray, dtype=np.uint8), height / width
+
+def _ramp(values, low, high):
+    """Map values linearly onto 0..1 between low and high"""
+    return np.clip((values - low) / (high - low), 0.0, 1.0)
+
+def score_batch(arrays, aspect_ratios):
+    """
+    Score a stack of ANALYSIS_SIZE grayscale images (shape N x H x W) in one
+    vectorized pass. Sheet music typically has:
+    1. A portrait page shape
+    2. High contrast (black notes/staff lines on white background)
+    3. Mostly light pixels (paper) with sparse dark ink
+    4. Strong horizontal structure (staff lines), i.e. more change going
+       down the page than across it
+    5. Many rows whose pixels vary a lot (rows crossing notes and symbols)
+    6. Thin rows that are almost entirely ink (the staff lines themselves),
+       evenly spaced in groups of five
+    Returns an array of confidence scores in 0..1.
+    """
+    batch = np.asarray(arrays, dtype=np.float32)
+    aspect_ratios = np.asarray(aspect_ratios, dtype=np.float32)
+
+    contrast = batch.std(axis=(1, 2))
+    brightness = batch.mean(axis=(1, 2))
+
+    # Mean absolute gradient down the page vs across it
+    vertical_change = np.abs(np.diff(batch, axis=1)).mean(axis=(1, 2))
+    horizontal_change = np.abs(np.diff(batch, axis=2)).mean(axis=(1, 2))
+    line_ratio = vertical_change / np.maximum(horizontal_change, 1e-6)
+
+    # Share of rows with staff-like light/dark variation
+    varied_rows = (batch.std(axis=2) > 20).mean(axis=1)
+
+    # Staff lines from the horizontal projection profiles: the share of rows
+    # that are thin ink rules, and how many five-line staves they form
+    masks = line_rows(row_profiles(batch))
+    line_share = masks.mean(axis=1)
+    staff_counts = np.array([len(geometry_from_mask(mask).staves) for mask in masks])
+
+    score = (0.10 * _ramp(aspect_ratios, 1.0, 1.3)
+             + 0.10 * _ramp(contrast, 20, 50)
+             + 0.10 * _ramp(brightness, 150, 210)
+             + 0.10 * _ramp(line_ratio, 0.9, 1.5)
+             + 0.05 * _ramp(varied_rows, 0.05, 0.3)
+             + 0.20 * _ramp(line_share, 0.01, 0.04)
+             + 0.35 * _ramp(staff_counts, 0, 2))
+    return score
+
+def _analyze_paths(image_paths):
+    """
+    Process pool task: decode a chunk of images once and return a
+    (score, dhash) pair for each, scoring and hashing the chunk together
+    """
+    results = [(None, None)] * len(image_paths)
+    arrays, aspects, positions = [], [], []
+    with tracing.span("decode_for_analysis", images=len(image_paths)):
+        for i, image_path in enumerate(image_paths):
+            try:
+                array, aspect = load_analysis_image(image_path)
+            except Exception:
+                # Unreadable images get no score and are left for the user to decide
+                continue
+            arrays.append(array)
+            aspects.append(aspect)
+            positions.append(i)
+
+    if arrays:
+        with tracing.span("score_and_hash", images=len(arrays)):
+            for i, score, dhash in zip(positions, score_batch(arrays, aspects), dhash_batch(arrays)):
+                results[i] = (float(score), dhash)
+    tracing.flush()
+    return results
+
+def _collect_results(batch_results, total, progress):
+    results = []
+    for batch in batch_results:
+        results.extend(batch)
+        if progress:
+            progress(len(results), total)
+    return results
+
+def analyze_images(image_paths, workers=None, pool=None, progress=None):
+    """
+    Return a (score, dhash) pair for each path, in order: the sheet-music
+    confidence (0..1) and the perceptual hash used for duplicate detection,
+    both None if the image could not be read. Batches are spread over a
+    process pool, one worker per core unless an existing pool is passed in.
+    progress, if given, is called with (analyzed, total) after each batch.
+    """
+    image_paths = list(image_paths)
+    if not image_paths:
+        return []
+
+    batches = [image_paths[i:i + BATCH_SIZE] for i in range(0, len(image_paths), BATCH_SIZE)]
+    if len(batches) == 1 and pool is None:
+        return _collect_results([_analyze_paths(batches[0])], len(image_paths), progress)
+
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            return _collect_results(pool.map(_analyze_paths, batches), len(image_paths), progress)
+    return _collect_results(pool.map(_analyze_paths, batches), len(image_paths), progress)
+
+def sheet_music_scores(image_paths, workers=None, pool=None, progress=None):
+    """
+    Return a sheet-music confidence score (0..1, or None if the image could
+    not be read) for each path, in order (see analyze_images).
+    """
+    return [score for score, _ in analyze_images(image_paths, workers, pool, progress)]
+
+def is_sheet_music(image_path):
+    """
+    Detect if an image is likely to be sheet music based on visual characteristics.
+    Returns True if the image appears to be sheet music, False otherwise.
+    """
+    score = _analyze_paths([image_path])[0][0]
+    return score is not None and score >= SHEET_MUSIC_THRESHOLD
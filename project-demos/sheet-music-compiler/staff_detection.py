@@ -0,0 +1,105 @@
+from collections import namedtuple
+import numpy as np
+
+# A row is a line candidate if it is this much darker (0..1 ink coverage)
+# than the lightest row within PEAK_RADIUS rows on either side
+PEAK_CONTRAST = 0.25
+PEAK_RADIUS = 2
+
+# Line spacings within one staff may differ from their median by this fraction
+SPACING_TOLERANCE = 0.25
+MIN_LINE_SPACING = 2  # rows
+
+# Staves closer than this many line spacings belong to the same system
+SYSTEM_GAP = 5
+
+Staff = namedtuple("Staff", ["top", "bottom", "line_spacing", "lines"])
+StaffGeometry = namedtuple("StaffGeometry", ["staves", "systems", "line_spacing"])
+
+def row_profiles(batch):
+    """
+    Horizontal projection profiles: the mean ink coverage (0 = white,
+    1 = black) of every row. Accepts one H x W grayscale array or an
+    N x H x W stack and returns H or N x H values in one vectorized pass.
+    """
+    batch = np.asarray(batch)
+    return 1.0 - batch.mean(axis=-1, dtype=np.float32) / 255.0
+
+def line_rows(profiles):
+    """
+    Boolean mask (same shape as profiles) of rows that are local maxima of
+    ink coverage and stand out from their surroundings: thin horizontal rules
+    such as staff lines.
+    """
+    profiles = np.asarray(profiles, dtype=np.float32)
+    height = profiles.shape[-1]
+    padded = np.pad(profiles, [(0, 0)] * (profiles.ndim - 1) + [(PEAK_RADIUS, PEAK_RADIUS)],
+                    mode='edge')
+    windows = np.stack([padded[..., i:i + height] for i in range(2 * PEAK_RADIUS + 1)])
+    is_max = profiles >= windows.max(axis=0)
+    return is_max & (profiles - windows.min(axis=0) >= PEAK_CONTRAST)
+
+def _line_centers(mask):
+    """Collapse runs of adjacent line rows into one center row each"""
+    rows = np.flatnonzero(mask)
+    if rows.size == 0:
+        return rows
+    breaks = np.flatnonzero(np.diff(rows) > 1) + 1
+    return np.array([run.mean() for run in np.split(rows, breaks)])
+
+def _group_staves(centers):
+    """Greedily take runs of five evenly spaced lines as staves"""
+    staves = []
+    i = 0
+    while i + 5 <= len(centers):
+        lines = centers[i:i + 5]
+        gaps = np.diff(lines)
+        spacing = float(np.median(gaps))
+        if spacing >= MIN_LINE_SPACING and np.all(np.abs(gaps - spacing) <= spacing * SPACING_TOLERANCE):
+            staves.append(Staff(int(lines[0]), int(np.ceil(lines[-1])), spacing,
+                                tuple(float(y) for y in lines)))
+            i += 5
+        else:
+            i += 1
+    return staves
+
+def _group_systems(staves):
+    """Merge staves separated by less than SYSTEM_GAP line spacings (e.g. grand staves)"""
+    systems = []
+    for staff in staves:
+        if systems and staff.top - systems[-1][1] < SYSTEM_GAP * staff.line_spacing:
+            systems[-1] = (systems[-1][0], staff.bottom)
+        else:
+            systems.append((staff.top, staff.bottom))
+    return systems
+
+def geometry_from_mask(mask):
+    """Build StaffGeometry from one image's line_rows mask"""
+    staves = _group_staves(_line_centers(mask))
+    spacing = float(np.median([staff.line_spacing for staff in staves])) if staves else None
+    return StaffGeometry(staves, _group_systems(staves), spacing)
+
+def detect_staves(gray):
+    """
+    Find the staves in an H x W grayscale array. Returns StaffGeometry with
+    the staves (top/bottom rows, line spacing, line positions), the staff
+    systems as (top, bottom) row ranges and the median line spacing
+    (None if no staff was found).
+    """
+    return geometry_from_mask(line_rows(row_profiles(gray)))
+
+def detect_staves_batch(batch):
+    """detect_staves for an N x H x W stack, sharing the vectorized profile pass"""
+    return [geometry_from_mask(mask) for mask in line_rows(row_profiles(batch))]
+
+def music_bounds(geometry, height, margin_spacings=8):
+    """
+    Row range (top, bottom) covering all systems plus a margin of
+    margin_spacings line spacings for ledger lines, titles and lyrics.
+    Returns None when no staff was found.
+    """
+    if not geometry.systems:
+        return None
+    margin = int(margin_spacings * geometry.line_spacing)
+    return (max(0, geometry.systems[0][0] - margin),
+            min(height, geometry.systems[-1][1] + margin))
@@ -0,0 +1,223 @@
+import os
+from collections import namedtuple
+import numpy as np
+from PIL import Image
+
+from staff_detection import row_profiles, line_rows, geometry_from_mask
+from decode_manager import load_image, open_image
+from page_source import image_size
+import tracing
+
+# Consecutive screenshots must share at least this share of their scrolling
+# area (and MIN_OVERLAP_ROWS); blank rows at the edges of the content are
+# often identical in both shots and get counted as chrome, so keep it small
+MIN_OVERLAP = 0.02
+MIN_OVERLAP_ROWS = 16
+
+# Rows that change less than this (mean absolute difference, 0..255) between
+# two shots at the same position are fixed chrome (toolbars, status bars)
+STATIC_ROW_DIFFERENCE = 0.5
+
+# Overlaps are compared on the ink: pixels darker than INK_LEVEL in either
+# shot. At most MAX_INK_MISMATCH of them may differ by more than
+# PIXEL_TOLERANCE, and the overlap needs MIN_INK_SHARE ink to be trusted
+# (blank paper matches at any offset)
+INK_LEVEL = 128
+PIXEL_TOLERANCE = 32
+MAX_INK_MISMATCH = 0.05
+MIN_INK_SHARE = 0.002
+
+# Correlation peaks verified pixel by pixel; staves repeat down the page, so
+# the highest peak is not always the true scroll offset
+CANDIDATE_OFFSETS = 10
+
+# Stitched pages are cut to at most this height:width ratio, i.e. what fits
+# below the heading at the 7.5" picture width
+MAX_PAGE_ASPECT = 9.0 / 7.5
+
+# Rows [top, bottom) of one image, in the order they appear in a strip
+Segment = namedtuple("Segment", ["image_index", "top", "bottom"])
+
+def scrolling_band(a, b):
+    """
+    Rows [top, bottom) that differ between two same-sized grayscale shots,
+    i.e. everything except the fixed chrome above and below the scrolling
+    content. Returns None if the shots are identical.
+    """
+    row_difference = np.abs(a.astype(np.int16) - b).mean(axis=1)
+    changed = np.flatnonzero(row_difference > STATIC_ROW_DIFFERENCE)
+    if changed.size == 0:
+        return None
+    return int(changed[0]), int(changed[-1]) + 1
+
+def find_scroll_offset(a, b):
+    """
+    Find how far the content scrolled between grayscale shots a and b (same
+    size). The row profiles of the scrolling band are cross-correlated with
+    an FFT, and the strongest peaks are verified on the pixels; of the
+    offsets that match, the one with the longest overlap wins.
+    Returns (offset, top, bottom) where b's row y shows a's row y + offset
+    within the band [top, bottom), or None if the shots do not overlap.
+    """
+    band = scrolling_band(a, b)
+    if band is None:
+        return None
+    top, bottom = band
+    height = bottom - top
+    min_overlap = max(MIN_OVERLAP_ROWS, int(height * MIN_OVERLAP))
+    if height <= min_overlap:
+        return None
+
+    profile_a = row_profiles(a[top:bottom]).astype(np.float64)
+    profile_b = row_profiles(b[top:bottom]).astype(np.float64)
+    profile_a -= profile_a.mean()
+    profile_b -= profile_b.mean()
+
+    # correlation[d] = sum(profile_a[i + d] * profile_b[i]), normalized by the
+    # energy of the overlapping parts so short overlaps are not penalized
+    size = 2 * height
+    correlation = np.fft.irfft(np.fft.rfft(profile_a, size) * np.conj(np.fft.rfft(profile_b, size)),
+                               size)[:height]
+    energy_a = np.cumsum((profile_a ** 2)[::-1])[::-1]
+    energy_b = np.cumsum(profile_b ** 2)
+    overlap = height - np.arange(height)
+    score = correlation / (np.sqrt(energy_a * energy_b[overlap - 1]) + 1e-9)
+    score[0] = -np.inf  # Not scrolled: a duplicate, not a continuation
+    score[overlap < min_overlap] = -np.inf
+
+    peaks = np.flatnonzero((score[1:-1] >= score[:-2]) & (score[1:-1] >= score[2:])) + 1
+    peaks = peaks[np.isfinite(score[peaks])]
+    for offset in np.sort(peaks[np.argsort(score[peaks])[::-1][:CANDIDATE_OFFSETS]]):
+        mismatch = _ink_mismatch(a[top + offset:bottom], b[top:bottom - offset])
+        if mismatch is not None and mismatch <= MAX_INK_MISMATCH:
+            return int(offset), top, bottom
+    return None
+
+def _ink_mismatch(a, b):
+    """Share of ink pixels that differ between two same-sized regions, None if there is too little ink"""
+    # Every 2nd row and column is plenty to confirm the match
+    a = a[::2, ::2]
+    b = b[::2, ::2]
+    ink = (a < INK_LEVEL) | (b < INK_LEVEL)
+    ink_count = np.count_nonzero(ink)
+    if ink_count < ink.size * MIN_INK_SHARE:
+        return None
+    different = np.abs(a.astype(np.int16) - b) > PIXEL_TOLERANCE
+    return np.count_nonzero(different & ink) / ink_count
+
+def _load_gray(image_path):
+    try:
+        gray, _ = load_image(image_path, mode='L')
+        return np.asarray(gray)
+    except Exception:
+        # Unreadable images never overlap; the builders report them
+        return None
+
+def plan_strips(image_paths, progress=None):
+    """
+    Chain consecutive overlapping screenshots into strips. Returns a list of
+    (segments, profile) pairs: the Segments making up each strip from top
+    to bottom (repeated rows and chrome between shots removed) and the
+    strip's row profile. Only two decoded images are held at a time.
+    progress, if given, is called with (analyzed, total) after each image.
+    """
+    strips = []  # [segments, {image_index: row profile}]
+    previous = None
+    for i, image_path in enumerate(image_paths):
+        gray = _load_gray(image_path)
+        overlap = None
+        if previous is not None and gray is not None and previous.shape == gray.shape:
+            overlap = find_scroll_offset(previous, gray)
+
+        if overlap is None:
+            strips.append([[Segment(i, 0, 0 if gray is None else gray.shape[0])], {}])
+        else:
+            offset, top, bottom = overlap
+            segments = strips[-1][0]
+            # Drop the previous shot's bottom chrome, then add only the rows
+            # of this shot that scrolled into view
+            last = segments[-1]
+            segments[-1] = last._replace(bottom=max(last.top, min(last.bottom, bottom)))
+            segments.append(Segment(i, bottom - offset, gray.shape[0]))
+        if gray is not None:
+            strips[-1][1][i] = row_profiles(gray)
+
+        previous = gray
+        if progress:
+            progress(i + 1, len(image_paths))
+
+    return [(segments, np.concatenate([profiles[segment.image_index][segment.top:segment.bottom]
+                                       for segment in segments]) if len(segments) > 1 else None)
+            for segments, profiles in strips]
+
+def page_breaks(profile, width, max_aspect=MAX_PAGE_ASPECT):
+    """
+    Split a strip (given by its row profile) into pages of at most
+    width * max_aspect rows. Cuts go midway between staff systems; a
+    stretch with no system gap in reach is cut at the maximum height.
+    Returns (start, end) row ranges.
+    """
+    height = len(profile)
+    max_height = max(1, int(width * max_aspect))
+    systems = geometry_from_mask(line_rows(profile)).systems
+    gaps = [(above[1] + below[0]) // 2 for above, below in zip(systems, systems[1:])]
+
+    pages = []
+    start = 0
+    while height - start > max_height:
+        cuts = [gap for gap in gaps if start < gap <= start + max_height]
+        end = cuts[-1] if cuts else start + max_height
+        pages.append((start, end))
+        start = end
+    pages.append((start, height))
+    return pages
+
+def render_rows(image_paths, segments, start, end):
+    """Paste strip rows [start, end) together from the source images"""
+    images = []
+    offset = 0
+    for segment in segments:
+        length = segment.bottom - segment.top
+        if offset < end and offset + length > start:
+            images.append((segment, max(start, offset) - offset, min(end, offset + length) - offset,
+                           max(start, offset) - start))
+        offset += length
+
+    page = None
+    for segment, first, last, y in images:
+        with open_image(image_paths[segment.image_index]) as image:
+            if page is None:
+                mode = 'L' if image.mode == 'L' else 'RGB'
+                page = Image.new(mode, (image.width, end - start), 'white')
+            rows = image.crop((0, segment.top + first, image.width, segment.top + last))
+            page.paste(rows.convert(page.mode), (0, y))
+    return page
+
+@tracing.traced
+def stitch_screenshots(image_data, output_dir, progress=None):
+    """
+    Replace runs of overlapping scrolling screenshots in image_data (a list
+    of (date_time, image_path) in chronological order) with non-redundant
+    pages cut at staff-system boundaries. Stitched pages are written to
+    output_dir as PNG; screenshots that overlap nothing are passed through.
+    Returns the new (date_time, image_path) list.
+    progress, if given, is called with (analyzed, total) while comparing.
+    """
+    image_paths = [image_path for _, image_path in image_data]
+    result = []
+    with tracing.span("plan_strips", images=len(image_paths)):
+        strips = plan_strips(image_paths, progress)
+    for segments, profile in strips:
+        if profile is None:
+            result.append(image_data[segments[0].image_index])
+            continue
+
+        width = image_size(image_paths[segments[0].image_index])[0]
+        for start, end in page_breaks(profile, width):
+            with tracing.span("render_stitched_page", rows=end - start):
+                page = render_rows(image_paths, segments, start, end)
+            page_path = os.path.join(output_dir, f"stitched_{len(result) + 1:04d}.png")
+            # Temporary file; speed matters more than size here
+            page.save(page_path, compress_level=1)
+            result.append((image_data[segments[0].image_index][0], page_path))
+    return result
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Share of each kind of screenshot in a generated corpus
+DEFAULT_MIX = {'sheet': 0.6, 'photo': 0.2, 'ui': 0.2}
+
+# Portrait size of the sheet music pages (roughly a Retina-width screenshot);
+# photos and UI screenshots use the same dimensions turned landscape
+DEFAULT_SIZE = (1600, 2000)
+
+# Capture times start here and advance one minute per image
+START_TIME = datetime(2025, 1, 6, 9, 0, 0)
+
+# Written into the corpus folder so an existing corpus can be reused
+CORPUS_INFO = 'corpus.json'
+
+# Bumped whenever the drawing changes, so older corpora are regenerated
+GENERATOR_VERSION = 2
+
+def _draw_sheet(rng, width, height):
+    """A page of notation: title, then systems of five-line staves with notes, stems and bar lines"""
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    margin = width // 12
+    spacing = max(5, height // 110)  # Distance between staff lines
+    line = max(2, spacing // 6)
+
+    # Title and composer as blocks of "text"
+    draw.rectangle((width // 3, height // 40, 2 * width // 3, height // 40 + 3 * spacing), fill=40)
+    draw.rectangle((2 * width // 3, height // 40 + 5 * spacing, width - margin, height // 40 + 6 * spacing), fill=90)
+
+    y = height // 8
+    staff_height = 4 * spacing
+    while y + staff_height < height - margin:
+        for k in range(5):
+            draw.rectangle((margin, y + k * spacing, width - margin, y + k * spacing + line - 1), fill=0)
+        # Bar lines
+        bars = rng.integers(3, 6)
+        for x in np.linspace(margin, width - margin, bars + 1).astype(int):
+            draw.rectangle((x, y, x + line, y + staff_height), fill=0)
+        # Notes: filled heads on lines and spaces with stems
+        for x in np.sort(rng.integers(margin + 3 * spacing, width - margin - spacing, rng.integers(12, 28))):
+            head_y = y + rng.integers(-2, 10) * spacing // 2
+            draw.ellipse((x, head_y - spacing // 2, x + int(spacing * 1.3), head_y + spacing // 2), fill=0)
+            if rng.random() < 0.5:
+                draw.rectangle((x + int(spacing * 1.3) - line, head_y - 3 * spacing, x + int(spacing * 1.3), head_y),
+                               fill=0)
+            else:
+                draw.rectangle((x, head_y, x + line, head_y + 3 * spacing), fill=0)
+        y += staff_height + int(spacing * rng.uniform(5, 8))
+    return image.convert('RGB')
+
+def _draw_photo(rng, width, height):
+    """Smooth colour gradients, soft blobs and sensor noise, like a camera photo"""
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = []
+    for _ in range(3):
+        angle = rng.uniform(0, np.pi)
+        ramp = (np.cos(angle) * xs / width + np.sin(angle) * ys / height)
+        channel = 60 + 120 * ramp + rng.uniform(-30, 30)
+        for _ in range(4):
+            cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+            radius = rng.uniform(0.1, 0.4) * width
+            channel += rng.uniform(-80, 80) * np.exp(-((xs - cx) ** 2 + (ys - cy) ** 2) / (2 * radius ** 2))
+        channels.append(channel)
+    pixels = np.stack(channels, axis=2) + rng.normal(0, 6, (height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB')
+
+def _draw_ui(rng, width, height):
+    """An application window: toolbar, sidebar, panels, buttons and lines of text"""
+    dark = rng.random() < 0.5
+    background, panel, ink = ((30, 30, 34), (48, 48, 54), 210) if dark else ((245, 245, 247), (255, 255, 255), 40)
+    image = Image.new('RGB', (width, height), background)
+    draw = ImageDraw.Draw(image)
+    bar = height // 14
+    draw.rectangle((0, 0, width, bar), fill=tuple(int(c * 0.8) for c in panel))
+    for x in range(width // 40, width // 3, width // 16):
+        draw.rounded_rectangle((x, bar // 4, x + width // 24, 3 * bar // 4), radius=bar // 8,
+                               fill=tuple(int(v) for v in rng.integers(60, 220, 3)))
+    sidebar = width // 5
+    draw.rectangle((0, bar, sidebar, height), fill=panel)
+    text_height = max(3, height // 90)
+    for y in range(bar + 2 * text_height, height - text_height, 3 * text_height):
+        draw.rectangle((width // 50, y, width // 50 + int(rng.uniform(0.3, 0.8) * sidebar), y + text_height),
+                       fill=(ink,) * 3)
+    for y in range(bar + height // 20, height - height // 6, height // 5):
+        draw.rounded_rectangle((sidebar + width // 30, y, width - width // 30, y + height // 6),
+                               radius=height // 60, fill=panel)
+        for row in range(3):
+            ty = y + height // 40 + row * 3 * text_height
+            draw.rectangle((sidebar + width // 20, ty, sidebar + width // 20 + int(rng.uniform(0.2, 0.6) * width),
+                            ty + text_height), fill=(ink,) * 3)
+    return image
+
+DRAWERS = {'sheet': _draw_sheet, 'photo': _draw_photo, 'ui': _draw_ui}
+
+def _exif_for(date_time):
+    exif = Image.Exif()
+    exif[0x0132] = date_time.strftime('%Y:%m:%d %H:%M:%S')  # DateTime
+    exif.get_ifd(0x8769)[0x9003] = date_time.strftime('%Y:%m:%d %H:%M:%S')  # DateTimeOriginal
+    return exif
+
+def corpus_kinds(count, mix=DEFAULT_MIX, seed=0):
+    """The kind of each of count images, shuffled deterministically"""
+    kinds = []
+    names = list(mix)
+    for name in names:
+        kinds.extend([name] * int(round(count * mix[name] / sum(mix.values()))))
+    kinds = (kinds + [names[0]] * count)[:count]
+    order = np.random.default_rng(seed).permutation(count)
+    return [kinds[i] for i in order]
+
+def generate_corpus(output_dir, count=60, size=DEFAULT_SIZE, mix=DEFAULT_MIX, exif_share=0.5, seed=0):
+    """
+    Write count synthetic screenshots to output_dir: sheet music pages
+    (PNG), photos (JPEG) and UI screenshots (PNG) in the proportions of mix.
+    About exif_share of the images carry an EXIF capture date; every file's
+    modification time is set to its capture time as well, so dates are the
+    same either way. The same arguments always produce the same images.
+    Returns a list of (image_path, kind).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    width, height = size
+    images = []
+    for i, kind in enumerate(corpus_kinds(count, mix, seed)):
+        page_size = (width, height) if kind == 'sheet' else (height, width)
+        image = DRAWERS[kind](rng, *page_size)
+        date_time = START_TIME + timedelta(minutes=i)
+        extension = '.jpg' if kind == 'photo' else '.png'
+        image_path = os.path.join(output_dir, f"{kind}_{i:04d}{extension}")
+
+        options = {'quality': 88} if extension == '.jpg' else {'compress_level': 6}
+        if rng.random() < exif_share:
+            options['exif'] = _exif_for(date_time)
+        image.save(image_path, **options)
+        timestamp = date_time.timestamp()
+        os.utime(image_path, (timestamp, timestamp))
+        images.append((image_path, kind))
+
+    info = {'version': GENERATOR_VERSION, 'count': count, 'size': list(size), 'mix': mix, 'exif_share': exif_share, 'seed': seed,
+            'files': [[os.path.basename(image_path), kind] for image_path, kind in images]}
+    with open(os.path.join(output_dir, CORPUS_INFO), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=1)
+    return images
+
+def load_corpus(output_dir, count=60, size=DEFAULT_SIZE, mix=DEFAULT_MIX, exif_share=0.5, seed=0):
+    """
+    Reuse the corpus in output_dir if it was generated with the same
+    arguments and is complete; otherwise (re)generate it.
+    Returns a list of (image_path, kind).
+    """
+    try:
+        with open(os.path.join(output_dir, CORPUS_INFO), encoding='utf-8') as f:
+            info = json.load(f)
+        images = [(os.path.join(output_dir, name), kind) for name, kind in info['files']]
+        if ((info.get('version'), info['count'], info['size'], info['mix'], info['exif_share'], info['seed'])
+                == (GENERATOR_VERSION, count, list(size), mix, exif_share, seed)
+                and all(os.path.exists(image_path) for image_path, _ in images)):
+            return images
+    except (OSError, ValueError, KeyError):
+        pass
+    for entry in os.scandir(output_dir) if os.path.isdir(output_dir) else ():
+        if entry.name.split('_')[0] in DRAWERS:
+            os.remove(entry.path)
+    return generate_corpus(output_dir, count, size, mix, exif_share, seed)
+
+def parse_size(text):
+    width, height = (int(value) for value in text.lower().split('x'))
+    return width, height
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic screenshots for benchmarking")
+    parser.add_argument('output', help="folder to write the images to")
+    parser.add_argument('-n', '--count', type=int, default=60, help="number of images (default 60)")
+    parser.add_argument('--size', type=parse_size, default=DEFAULT_SIZE,
+                        help="page size as WIDTHxHEIGHT (default %dx%d)" % DEFAULT_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    images = generate_corpus(args.output, args.count, args.size, seed=args.seed)
+    counts = {kind: sum(1 for _, image_kind in images if image_kind == kind) for kind in DRAWERS}
+    print(f"Wrote {len(images)} images to {args.output} "
+          + ", ".join(f"{count} {kind}" for kind, count in counts.items()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+
+from scan_cache import CACHE_DIR
+from decode_manager import load_image
+from page_source import source_stat
+
+THUMBNAIL_SIZE = 180
+
+# Total size of the thumbnail store before least recently used entries are evicted
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+def thumbnail_dimensions(width, height, thumb_size=THUMBNAIL_SIZE):
+    """Fit (width, height) into a thumb_size square, keeping the aspect ratio"""
+    aspect_ratio = width / height
+    if aspect_ratio > 1:
+        return thumb_size, max(1, int(thumb_size / aspect_ratio))
+    return max(1, int(thumb_size * aspect_ratio)), thumb_size
+
+def fit_dimensions(width, height, box_width, box_height):
+    """Largest size with the aspect ratio of (width, height) that fits in the box"""
+    aspect_ratio = width / height
+    if aspect_ratio > box_width / box_height:
+        return box_width, max(1, int(box_width / aspect_ratio))
+    return max(1, int(box_height * aspect_ratio)), box_height
+
+def load_resized(image_path, target_size):
+    """
+    Decode image_path straight to a smaller size through the decode manager
+    (JPEGs decoded at a 1/2..1/8 scale, other formats shrunk by an integer
+    factor) before the final LANCZOS resize. target_size maps the full
+    (width, height) to the wanted size.
+    """
+    # Pillow is loaded on first use; the app starts before any image is shown
+    from PIL import Image
+
+    target = None
+
+    def min_size(width, height):
+        nonlocal target
+        target = target_size(width, height)
+        # Keep at least 2x the target so the final LANCZOS pass stays sharp
+        return target[0] * 2, target[1] * 2
+
+    image, _ = load_image(image_path, min_size)
+    return image.resize(target, Image.Resampling.LANCZOS)
+
+def make_thumbnail(image_path, thumb_size=THUMBNAIL_SIZE):
+    """Build a grid thumbnail using reduced-resolution decoding (see load_resized)"""
+    return load_resized(image_path, lambda width, height: thumbnail_dimensions(width, height, thumb_size))
+
+class ThumbnailCache:
+    """
+    Persistent store of grid thumbnails keyed by path, size and mtime, so
+    reopening the grid on an unchanged folder needs no image decoding.
+    Entries are evicted least recently used first once the store grows past
+    max_bytes; a hit refreshes the entry's mtime to record the access.
+    """
+    def __init__(self, cache_dir=None, max_bytes=MAX_CACHE_BYTES, thumb_size=THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "thumbnails")
+        self.max_bytes = max_bytes
+        self.thumb_size = thumb_size
+        self.lock = threading.Lock()  # get() is called from grid worker threads
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                               if entry.is_file())
+
+    def key_for(self, image_path, stat_result=None):
+        if stat_result is None:
+            stat_result = source_stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{stat_result.st_size}|{stat_result.st_mtime_ns}|{self.thumb_size}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, image_path, stat_result=None):
+        """Return the thumbnail as a PIL image, generating and storing it on a miss"""
+        cached_path = os.path.join(self.cache_dir, self.key_for(image_path, stat_result) + ".png")
+        try:
+            thumbnail, _ = load_image(cached_path)
+            os.utime(cached_path)  # Mark as recently used
+            return thumbnail
+        except (OSError, ValueError):
+            pass
+
+        thumbnail = make_thumbnail(image_path, self.thumb_size)
+        self.store(cached_path, thumbnail)
+        return thumbnail
+
+    def store(self, cached_path, thumbnail):
+        temp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            thumbnail.save(temp_path, format="PNG", optimize=False)
+            os.replace(temp_path, cached_path)
+        except OSError:
+            # Caching is best effort; the thumbnail itself is still returned
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self.lock:
+            self.total_bytes += os.path.getsize(cached_path)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Delete least recently used thumbnails until the store is 90% of max_bytes"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+
+        self.total_bytes = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self.total_bytes <= limit:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= size
+            except OSError:
+                pass
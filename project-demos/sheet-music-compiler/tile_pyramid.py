@@ -0,0 +1,179 @@
+import hashlib
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from scan_cache import CACHE_DIR
+from decode_manager import load_image
+from page_source import image_size, source_stat
+import tracing
+
+# Edge length of a square tile in pixels
+TILE_SIZE = 256
+
+# Total size of the on-disk tile store before the least recently viewed
+# images' pyramids are removed
+MAX_TILE_CACHE_BYTES = 512 * 1024 * 1024
+
+# Decoded tiles kept in memory per pyramid; a 256x256 RGB tile is 192 KB,
+# and a full-screen view at any zoom shows a few dozen
+TILES_IN_MEMORY = 160
+
+# Written into a level's folder once all of its tiles are on disk
+LEVEL_DONE = "done"
+
+class TileStore:
+    """
+    On-disk home of the tile pyramids, one folder per image keyed by path,
+    size and mtime (so an edited file gets a new pyramid). Whole pyramids
+    are evicted least recently viewed first once the store grows past
+    max_bytes.
+    """
+    def __init__(self, cache_dir=None, max_bytes=MAX_TILE_CACHE_BYTES):
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "tiles")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(self, image_path, tile_size=TILE_SIZE):
+        stat_result = source_stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{stat_result.st_size}|{stat_result.st_mtime_ns}|{tile_size}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def pyramid(self, image_path, tile_size=TILE_SIZE):
+        """The TilePyramid of image_path, reusing tiles stored by earlier views"""
+        folder = os.path.join(self.cache_dir, self.key_for(image_path, tile_size))
+        os.makedirs(folder, exist_ok=True)
+        os.utime(folder)  # Mark as recently viewed
+        return TilePyramid(image_path, folder, tile_size, store=self)
+
+    def added(self, keep_folder):
+        """Called after a level was written; evicts other pyramids if the store is too big"""
+        with self.lock:
+            pyramids = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if not entry.is_dir():
+                    continue
+                size = sum(level_entry.stat().st_size
+                           for level in os.scandir(entry.path) if level.is_dir()
+                           for level_entry in os.scandir(level.path))
+                pyramids.append((entry.stat().st_mtime, size, entry.path))
+                total += size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(pyramids):
+                if total <= self.max_bytes * 0.9:
+                    break
+                if path != keep_folder:
+                    shutil.rmtree(path, ignore_errors=True)
+                    total -= size
+
+class TilePyramid:
+    """
+    Multi-resolution tiles of one image for zooming and panning: level 0 is
+    full size, each further level halves it, down to one tile. A level is
+    built the first time one of its tiles is needed (the image is decoded
+    once, at that level's resolution, and cut into tiles on disk); after
+    that, only the tiles in view are read, so zooming into a 6000 px page
+    never holds more than the visible tiles in memory.
+    """
+    def __init__(self, image_path, folder, tile_size=TILE_SIZE, store=None):
+        self.image_path = image_path
+        self.folder = folder
+        self.tile_size = tile_size
+        self.store = store
+        self.width, self.height = image_size(image_path)
+        self.levels = 1 + max(0, math.ceil(math.log2(max(self.width, self.height) / tile_size)))
+        self.tiles = OrderedDict()  # (level, col, row) -> PIL image
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def level_size(self, level):
+        """(width, height) of level"""
+        return max(1, math.ceil(self.width / 2 ** level)), max(1, math.ceil(self.height / 2 ** level))
+
+    def level_for_scale(self, scale):
+        """
+        The level to draw at scale (display pixels per image pixel): the
+        smallest one with at least as many pixels as the display needs.
+        """
+        if scale >= 1:
+            return 0
+        return min(self.levels - 1, int(math.floor(math.log2(1 / scale))))
+
+    def grid(self, level):
+        """(columns, rows) of tiles in level"""
+        width, height = self.level_size(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def tile_path(self, level, col, row):
+        return os.path.join(self.folder, str(level), f"{col}_{row}.png")
+
+    def cached_tile(self, level, col, row):
+        """The tile if it is in memory, else None; never touches the disk"""
+        with self.lock:
+            return self.tiles.get((level, col, row))
+
+    def tile(self, level, col, row):
+        """The tile at col, row of level as a PIL image, building the level on first use"""
+        key = (level, col, row)
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+        if not os.path.exists(os.path.join(self.folder, str(level), LEVEL_DONE)):
+            self._build_level(level)
+            tile = self.cached_tile(level, col, row)
+            if tile is not None:
+                return tile
+        tile, _ = load_image(self.tile_path(level, col, row))
+        self._remember(key, tile)
+        return tile
+
+    def _remember(self, key, tile):
+        with self.lock:
+            self.tiles[key] = tile
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > TILES_IN_MEMORY:
+                self.tiles.popitem(last=False)
+
+    @tracing.traced
+    def _build_level(self, level):
+        from PIL import Image
+
+        with self.build_lock:
+            level_folder = os.path.join(self.folder, str(level))
+            if os.path.exists(os.path.join(level_folder, LEVEL_DONE)):
+                return  # Built by another thread while we waited
+            size = self.level_size(level)
+            image, _ = load_image(self.image_path, size)
+            if image.size != size:
+                image = image.resize(size, Image.Resampling.LANCZOS)
+
+            os.makedirs(level_folder, exist_ok=True)
+            columns, rows = self.grid(level)
+            for row in range(rows):
+                for col in range(columns):
+                    box = (col * self.tile_size, row * self.tile_size,
+                           min(size[0], (col + 1) * self.tile_size), min(size[1], (row + 1) * self.tile_size))
+                    tile = image.crop(box)
+                    # Tiles are re-read often and thrown away with the pyramid; speed over size
+                    tile.save(self.tile_path(level, col, row), format="PNG", compress_level=1)
+                    self._remember((level, col, row), tile)
+            open(os.path.join(level_folder, LEVEL_DONE), 'w').close()
+        if self.store is not None:
+            self.store.added(self.folder)
+
+    def visible_tiles(self, level, left, top, right, bottom):
+        """(col, row) of the tiles of level overlapping the box, given in full-size image pixels"""
+        scale = 2 ** level
+        columns, rows = self.grid(level)
+        first_col = max(0, int(left / scale) // self.tile_size)
+        last_col = min(columns - 1, int(right / scale) // self.tile_size)
+        first_row = max(0, int(top / scale) // self.tile_size)
+        last_row = min(rows - 1, int(bottom / scale) // self.tile_size)
+        return [(col, row) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
@@ -0,0 +1,260 @@
+import atexit
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# Set to a file path to record a trace of the run in Chrome trace format
+# (open it in chrome://tracing or ui.perfetto.dev); a summary table is
+# written next to it as <path>.summary.txt. Process pool workers inherit it.
+TRACE_ENV = "SHEET_MUSIC_TRACE"
+
+_trace_path = None
+_events = []
+_counters = {}  # name -> running total in this process
+_thread_names = {}
+# Merged from the workers' .part files by export()
+_worker_counters = {}
+_worker_thread_names = {}  # (pid, native thread id) -> name
+_lock = threading.Lock()
+
+class _NullSpan:
+    """What span() returns while tracing is off: entering and leaving it does nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        thread = threading.get_native_id()
+        event = {"name": self.name, "ph": "X", "ts": self.start / 1000, "dur": (end - self.start) / 1000,
+                 "pid": os.getpid(), "tid": thread}
+        if self.args:
+            event["args"] = self.args
+        with _lock:
+            _thread_names.setdefault(thread, threading.current_thread().name)
+            _events.append(event)
+            # Counter tracks: running totals and peak memory as of this span's end
+            if _counters:
+                _events.append({"name": "counters", "ph": "C", "ts": end / 1000, "pid": os.getpid(),
+                                "args": dict(_counters)})
+            rss = peak_rss_mb()
+            if rss is not None:
+                _events.append({"name": "peak RSS (MB)", "ph": "C", "ts": end / 1000, "pid": os.getpid(),
+                                "args": {"peak_rss_mb": rss}})
+        return False
+
+def enabled():
+    return _trace_path is not None
+
+def span(name, **args):
+    """
+    Context manager timing a stage of the work as a Chrome trace "complete"
+    event; args are shown with the event. Costs one check while tracing is off.
+    """
+    if _trace_path is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+def traced(func):
+    """Decorator recording every call of func as a span named after it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _trace_path is None:
+            return func(*args, **kwargs)
+        with _Span(func.__name__, None):
+            return func(*args, **kwargs)
+    return wrapper
+
+def count(name, value=1):
+    """Add value to a counter (e.g. bytes_read); totals are recorded with each span"""
+    if _trace_path is None:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def count_decode(image_path, image):
+    """Count a decoded image: its file size as bytes_read and its (possibly reduced) pixels"""
+    if _trace_path is None:
+        return
+    try:
+        count("bytes_read", os.path.getsize(image_path))
+    except (OSError, TypeError):
+        pass
+    count("pixels_decoded", image.width * image.height)
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _is_worker():
+    return multiprocessing.parent_process() is not None
+
+def flush():
+    """
+    Process pool tasks call this when they finish: a worker's events are
+    appended to <trace>.<pid>.part for the main process to merge on export.
+    Does nothing in the main process or while tracing is off.
+    """
+    if _trace_path is None or not _is_worker():
+        return
+    with _lock:
+        events = _events[:]
+        _events.clear()
+        totals = dict(_counters)
+        _counters.clear()
+        thread_names = dict(_thread_names)
+    if peak_rss_mb() is not None:
+        totals["worker_peak_rss_mb"] = peak_rss_mb()
+    with open(f"{_trace_path}.{os.getpid()}.part", "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+        f.write(json.dumps({"counters": totals, "thread_names": thread_names}) + "\n")
+
+def _gather_worker_events():
+    """Read (and remove) the events flushed by pool workers, merging their counters and thread names"""
+    events = []
+    totals, thread_names = _worker_counters, _worker_thread_names
+    for part_path in glob.glob(glob.escape(_trace_path) + ".*.part"):
+        pid = int(part_path.rsplit(".", 2)[1])
+        with open(part_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "counters" not in record:
+                    events.append(record)
+                    continue
+                for name, value in record["counters"].items():
+                    if name == "worker_peak_rss_mb":
+                        totals[name] = max(totals.get(name, 0), value)
+                    else:
+                        totals[name] = totals.get(name, 0) + value
+                for thread, name in record["thread_names"].items():
+                    thread_names[(pid, int(thread))] = name
+        os.remove(part_path)
+    return events
+
+def summary_table(events, totals):
+    """Per-stage totals (calls, total/mean/max time, share of the traced wall time) and counters as text"""
+    spans = [event for event in events if event["ph"] == "X"]
+    if not spans:
+        return "No spans recorded\n"
+    wall = max(event["ts"] + event["dur"] for event in spans) - min(event["ts"] for event in spans)
+    stages = {}
+    for event in spans:
+        stage = stages.setdefault(event["name"], [0, 0.0, 0.0])
+        stage[0] += 1
+        stage[1] += event["dur"]
+        stage[2] = max(stage[2], event["dur"])
+
+    lines = [f"{'stage':28} {'calls':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9} {'% wall':>7}"]
+    for name, (calls, total, longest) in sorted(stages.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{name:28} {calls:7d} {total / 1000:11.1f} {total / calls / 1000:9.2f} "
+                     f"{longest / 1000:9.1f} {100 * total / wall if wall else 0:6.1f}%")
+    lines.append(f"wall time: {wall / 1e6:.2f}s (stages overlap across threads and processes)")
+    for name, value in sorted(totals.items()):
+        if name == "bytes_read":
+            lines.append(f"{name}: {value / (1024 * 1024):.1f} MB")
+        elif name == "pixels_decoded":
+            lines.append(f"{name}: {value / 1e6:.1f} MP")
+        elif name == "pixels_binarized":
+            # Throughput over the time spent in the binarize stage itself
+            seconds = stages.get("binarize", (0, 0.0))[1] / 1e6
+            rate = f" ({value / 1e6 / seconds:.1f} MP/s)" if seconds else ""
+            lines.append(f"{name}: {value / 1e6:.1f} MP{rate}")
+        else:
+            lines.append(f"{name}: {value}")
+    return "\n".join(lines) + "\n"
+
+def export(path=None):
+    """
+    Write everything recorded so far, including the events flushed by
+    workers, to path (the trace path by default) as Chrome trace JSON and
+    the summary table to path + '.summary.txt'. Returns the summary.
+    """
+    path = path or _trace_path
+    worker_events = _gather_worker_events()
+    totals = dict(_worker_counters)
+    thread_names = dict(_worker_thread_names)
+    with _lock:
+        events = _events + worker_events
+        _events[:] = events  # Keep the merged events for a later export
+        for name, value in _counters.items():
+            totals[name] = totals.get(name, 0) + value
+        for thread, name in _thread_names.items():
+            thread_names[(os.getpid(), thread)] = name
+    rss = peak_rss_mb()
+    if rss is not None:
+        totals["peak_rss_mb"] = rss
+
+    metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}}
+                for (pid, thread), name in thread_names.items()]
+    metadata.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "main"}})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms",
+                   "otherData": {"counters": totals}}, f)
+    summary = summary_table(events, totals)
+    with open(path + ".summary.txt", "w", encoding="utf-8") as f:
+        f.write(summary)
+    return summary
+
+def _export_at_exit():
+    if _is_worker():
+        # A spawned worker imported this module before it knew it was one
+        flush()
+        return
+    summary = export()
+    print(f"Trace written to {_trace_path}\n{summary}", file=sys.stderr, end="")
+
+def start(path):
+    """
+    Turn tracing on for this process and the worker processes it starts
+    later; the trace is exported when the program exits.
+    """
+    global _trace_path
+    if _trace_path is None and not _is_worker():
+        atexit.register(_export_at_exit)
+    _trace_path = os.path.abspath(path)
+    os.environ[TRACE_ENV] = _trace_path
+
+def _reset_in_child():
+    # A forked worker starts with a copy of the parent's events (and maybe a
+    # lock held by another thread); drop them
+    global _lock
+    _lock = threading.Lock()
+    _events.clear()
+    _counters.clear()
+    _thread_names.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_in_child)
+
+if os.environ.get(TRACE_ENV):
+    start(os.environ[TRACE_ENV])